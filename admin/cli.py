@@ -1,10 +1,11 @@
-from prompt_toolkit.shortcuts import PromptSession, radiolist_dialog
+from prompt_toolkit.shortcuts import PromptSession, checkboxlist_dialog, radiolist_dialog
 from prompt_toolkit.application import create_app_session
 from prompt_toolkit.patch_stdout import patch_stdout
 from rich.console import Console
+from rich.progress import BarColumn, Progress, TextColumn, TimeRemainingColumn
 from rich.table import Table
 from sqlalchemy.orm import Session
-from lib.database import SessionLocal
+from lib.database import SessionLocal, engine
 import sys
 import os
 import asyncio
@@ -69,6 +70,7 @@ async def list_approved_users(db: Session):
     """List all users with approved KYC."""
     try:
         from backend.app.models.user import User
+        from backend.app.services.balances import format_eth, get_balance_service
         users = db.query(User).filter(User.kyc == True).all()
         
         if not users:
@@ -78,9 +80,19 @@ async def list_approved_users(db: Session):
                 "There are no KYC-approved users in the system."
             )]
         else:
+            # One batched RPC round trip for every wallet on the list
+            try:
+                balances = await get_balance_service().get_balances(
+                    [user.wallet_address for user in users if user.wallet_address]
+                )
+            except Exception as e:
+                console.print(f"[yellow]Could not fetch balances: {e}[/yellow]")
+                balances = {}
+            shown = {address: f"{format_eth(wei)} ETH" for address, wei in balances.items()}
             choices = [(user, f"@{user.username}\n"
                              f"Full Name: {user.full_name}\n"
                              f"Wallet: {user.wallet_address}\n"
+                             f"Balance: {shown.get(user.wallet_address, 'unknown')}\n"
                              f"Telegram ID: {user.telegram_id}")
                       for user in users]
         
@@ -115,67 +127,80 @@ def check_server():
     except:
         return False
 
+APPROVE_CHUNK_SIZE = 200  # Users per bulk-approve request, one progress step each
+
+
 async def approve_kyc(db: Session):
-    """Approve KYC for a selected user."""
+    """Approve KYC for the selected users through the bulk-approve endpoint."""
     try:
         if not check_server():
             console.print("[red]Error: Backend server is not running. Please start it with './dev.sh start'[/red]")
             return
 
         from backend.app.models.user import User
-        users = db.query(User).filter(User.kyc == False).all()
-        
+        users = db.query(User).filter(User.kyc == False).order_by(User.id).all()
         if not users:
-            choices = [(
-                "no_users",
-                "No Pending KYC Requests\n"
-                "There are no users awaiting KYC verification."
-            )]
-        else:
-            choices = [(user, f"@{user.username}\n"
-                             f"Full Name: {user.full_name}\n"
-                             f"Telegram ID: {user.telegram_id}")
-                      for user in users]
-        
-        dialog = radiolist_dialog(
-            title="Select User for KYC Approval",
-            text="Choose a user to approve KYC:",
+            console.print("[yellow]No Pending KYC Requests: there are no users awaiting KYC verification.[/yellow]")
+            return
+
+        choices = [("all", f"All {len(users)} pending users")]
+        choices += [(user.telegram_id, f"@{user.username} | {user.full_name} | Telegram ID: {user.telegram_id}")
+                    for user in users]
+        dialog = checkboxlist_dialog(
+            title="Select Users for KYC Approval",
+            text="Space selects, Enter confirms:",
             values=choices
         )
-        
+
         with create_app_session():
             with patch_stdout():
                 result = await dialog.run_async()
-
-        if result and isinstance(result, User):
-            # Use API to update KYC status with retries
-            import requests
-            from requests.adapters import HTTPAdapter
-            from urllib3.util.retry import Retry
-
-            # Configure retry strategy
-            retry_strategy = Retry(
-                total=3,
-                backoff_factor=1,
-                status_forcelist=[500, 502, 503, 504]
-            )
-            adapter = HTTPAdapter(max_retries=retry_strategy)
-            session = requests.Session()
-            session.mount("http://", adapter)
-            session.mount("https://", adapter)
-
-            response = session.patch(
-                f"http://localhost:8000/api/v1/users/{result.telegram_id}",
-                json={"kyc": True},
-                timeout=10
-            )
-            if response.status_code == 200:
-                user_data = response.json()
-                console.print(f"[green]KYC approved for user {result.telegram_id}[/green]")
-                if user_data.get("wallet_address"):
-                    console.print(f"[green]Wallet generated: {user_data['wallet_address']}[/green]")
-            else:
-                console.print(f"[red]Error from API: {response.text}[/red]")
+        if not result:
+            return
+        telegram_ids = [user.telegram_id for user in users] if "all" in result else result
+
+        # Use API to approve in chunks with retries
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        # Only failed connections are retried for POST; a chunk sent twice reports already_approved
+        retry_strategy = Retry(total=3, backoff_factor=1)
+        adapter = HTTPAdapter(max_retries=retry_strategy)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        totals = {"approved": 0, "already_approved": 0, "not_found": 0, "failed": 0}
+        failures = []
+        with Progress(
+            TextColumn("Approving KYC"), BarColumn(), TextColumn("{task.completed}/{task.total}"),
+            TimeRemainingColumn(), console=console
+        ) as progress:
+            task = progress.add_task("approve", total=len(telegram_ids))
+            for start in range(0, len(telegram_ids), APPROVE_CHUNK_SIZE):
+                chunk = telegram_ids[start:start + APPROVE_CHUNK_SIZE]
+                response = session.post(
+                    "http://localhost:8000/api/v1/users/kyc:bulk-approve",
+                    json={"telegram_ids": chunk},
+                    timeout=120
+                )
+                if response.status_code != 200:
+                    totals["failed"] += len(chunk)
+                    failures.extend((telegram_id, response.text) for telegram_id in chunk)
+                else:
+                    report = response.json()
+                    for status in totals:
+                        totals[status] += report[status]
+                    failures.extend((r["telegram_id"], r["error"]) for r in report["results"] if r["status"] == "failed")
+                progress.advance(task, len(chunk))
+
+        console.print(f"[green]KYC approved for {totals['approved']} users[/green]")
+        if totals["already_approved"] or totals["not_found"]:
+            console.print(f"[yellow]{totals['already_approved']} already approved, "
+                          f"{totals['not_found']} not found[/yellow]")
+        for telegram_id, error in failures:
+            console.print(f"[red]Failed for user {telegram_id}: {error}[/red]")
     except Exception as e:
         console.print(f"[red]Error approving KYC: {e}[/red]")
 
@@ -364,10 +389,12 @@ async def delete_user(db: Session):
             
             # Delete user's quiz completions first
             from backend.app.models.quiz import UserQuizCompletion
+            from backend.app.services.user_cache import record_user_change
             db.query(UserQuizCompletion).filter(UserQuizCompletion.user_id == result.id).delete()
             
-            # Delete the user
+            # Delete the user and tell the bot to drop its cached profile
             db.delete(result)
+            record_user_change(db, result.telegram_id)
             db.commit()
             
             console.print(f"[green]User {result.telegram_id} deleted successfully![/green]")
@@ -390,6 +417,7 @@ async def main_menu():
             ("delete", "Delete User"),
             ("deploy_nft", "Deploy NFT Contract"),
             ("configure_nft", "Configure Quiz NFT Metadata"),
+            ("deploy_disperse", "Deploy Batch Payout Contract"),
             ("exit", "Exit")
         ]
         
@@ -428,6 +456,8 @@ async def main_menu():
                 await deploy_nft_contract(db)
             elif result == "configure_nft":
                 await configure_nft_metadata(db)
+            elif result == "deploy_disperse":
+                await deploy_disperse_contract(db)
         finally:
             db.close()
 
@@ -509,6 +539,35 @@ async def deploy_nft_contract(db: Session):
     except Exception as e:
         console.print(f"[red]Error deploying NFT contract: {e}[/red]")
 
+async def deploy_disperse_contract(db: Session):
+    """Deploy the disperse contract used for batched reward payouts."""
+    try:
+        from backend.app.services.disperse_deploy_wrapper import DisperseDeployService
+        import os
+
+        if os.getenv('DISPERSE_CONTRACT_ADDRESS'):
+            console.print(f"[yellow]Current disperse contract: {os.getenv('DISPERSE_CONTRACT_ADDRESS')}[/yellow]")
+
+        confirmation = await session.prompt_async("Type 'DEPLOY' to deploy the batch payout contract: ")
+        if confirmation != "DEPLOY":
+            return
+
+        disperse_service = DisperseDeployService()
+        result = await disperse_service.deploy_contract()
+
+        is_valid = await disperse_service.verify_deployment(result['contractAddress'])
+        if not is_valid:
+            console.print("[red]Contract deployment could not be verified![/red]")
+            return
+
+        console.print("[green]Disperse contract deployed successfully![/green]")
+        console.print(f"[green]Contract address: {result['contractAddress']}[/green]")
+        console.print(f"[green]View on explorer: https://sepolia.basescan.org/tx/{result['transactionHash']}[/green]")
+        console.print("\n[green]Set PAYOUT_BATCH_ENABLED=true and restart the bot to batch quiz rewards.[/green]")
+
+    except Exception as e:
+        console.print(f"[red]Error deploying disperse contract: {e}[/red]")
+
 async def configure_nft_metadata(db: Session):
     """Configure NFT metadata for quiz completion."""
     from prompt_toolkit.application import create_app_session
@@ -616,7 +675,15 @@ def sync_main_menu():
     except KeyboardInterrupt:
         console.print("\n[yellow]Goodbye![/yellow]")
     finally:
+        from backend.app.services.balances import shutdown_balance_service
+        loop.run_until_complete(shutdown_balance_service())
         loop.close()
 
 if __name__ == "__main__":
+    from backend.app.db.migrations import check_schema, SchemaOutdated
+    try:
+        check_schema(engine)
+    except SchemaOutdated as e:
+        console.print(f"[red]{e}[/red]")
+        sys.exit(1)
     sync_main_menu()
@@ -1,17 +1,11 @@
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-import os
 
-# Create database URL - use the same SQLite database as backend
-db_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../base-hackathon.db"))
-DATABASE_URL = f"sqlite:///{db_path}"
+from backend.app.db.engine import create_db_engine, resolve_database_url
 
-# Create SQLAlchemy engine with SQLite-specific settings
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False}  # Needed for SQLite
-)
+# Same database and connection setup (WAL, busy timeout) as the backend
+DATABASE_URL = resolve_database_url()
+engine = create_db_engine("admin")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
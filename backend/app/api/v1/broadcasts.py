@@ -0,0 +1,85 @@
+from typing import List
+import json
+import logging
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from ...db.async_session import unit_of_work
+from ...db.session import get_db
+from ...models.broadcast import Broadcast as BroadcastModel, QUEUED, RUNNING, CANCELLED
+from ...models.user import User as UserModel
+from ...schemas.broadcast import Broadcast, BroadcastCreate
+from ...services.broadcasts import segment_filter, get_broadcast_runner
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+def to_schema(broadcast: BroadcastModel) -> Broadcast:
+    return Broadcast(
+        id=broadcast.id,
+        text=broadcast.text,
+        parse_mode=broadcast.parse_mode,
+        segment=json.loads(broadcast.segment),
+        status=broadcast.status,
+        total=broadcast.total,
+        sent=broadcast.sent,
+        failed=broadcast.failed,
+        created_at=broadcast.created_at,
+        completed_at=broadcast.completed_at
+    )
+
+
+@router.post("/", response_model=Broadcast, status_code=202)
+async def create_broadcast(broadcast: BroadcastCreate):
+    # Async so runner.wake() sets the runner's asyncio.Event on the event loop thread
+    runner = get_broadcast_runner()
+    if runner is None:
+        raise HTTPException(status_code=503, detail="Broadcasts need TELEGRAM_BOT_TOKEN to be configured")
+
+    segment = broadcast.segment.dict()
+    async with unit_of_work() as db:
+        total = (await db.execute(
+            select(func.count()).select_from(UserModel).where(segment_filter(segment))
+        )).scalar()
+        db_broadcast = BroadcastModel(
+            text=broadcast.text,
+            parse_mode=broadcast.parse_mode,
+            segment=json.dumps(segment),
+            status=QUEUED,
+            total=total
+        )
+        db.add(db_broadcast)
+        await db.commit()
+        await db.refresh(db_broadcast)
+    logger.info(f"Queued broadcast {db_broadcast.id} to {total} users")
+    runner.wake()
+    return to_schema(db_broadcast)
+
+
+@router.get("/", response_model=List[Broadcast])
+def list_broadcasts(db: Session = Depends(get_db)):
+    return [to_schema(b) for b in db.query(BroadcastModel).order_by(BroadcastModel.id.desc()).limit(100)]
+
+
+@router.get("/{broadcast_id}", response_model=Broadcast)
+def get_broadcast(broadcast_id: int, db: Session = Depends(get_db)):
+    db_broadcast = db.query(BroadcastModel).get(broadcast_id)
+    if db_broadcast is None:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    return to_schema(db_broadcast)
+
+
+@router.post("/{broadcast_id}/cancel", response_model=Broadcast)
+def cancel_broadcast(broadcast_id: int, db: Session = Depends(get_db)):
+    db_broadcast = db.query(BroadcastModel).get(broadcast_id)
+    if db_broadcast is None:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    if db_broadcast.status not in (QUEUED, RUNNING):
+        raise HTTPException(status_code=400, detail=f"Broadcast is already {db_broadcast.status}")
+    db_broadcast.status = CANCELLED
+    db.commit()
+    db.refresh(db_broadcast)
+    return to_schema(db_broadcast)
@@ -0,0 +1,38 @@
+import logging
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, Request
+
+from ...bot.webhook import get_webhook_ingress, InvalidUpdate, UpdateQueueFull
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.post("/webhook")
+async def telegram_webhook(
+    request: Request,
+    x_telegram_bot_api_secret_token: Optional[str] = Header(None)
+):
+    ingress = get_webhook_ingress()
+    if ingress is None:
+        raise HTTPException(status_code=404, detail="Bot webhook mode is not enabled")
+    if not ingress.check_secret(x_telegram_bot_api_secret_token):
+        raise HTTPException(status_code=403, detail="Invalid secret token")
+
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid update")
+
+    try:
+        ingress.submit(data)
+    except InvalidUpdate as e:
+        # Redelivering it would fail the same way, so acknowledge and drop it
+        logger.warning(f"Dropped a webhook body that is not a valid update: {e}")
+        return {"ok": False}
+    except UpdateQueueFull:
+        # Telegram retries non-2xx deliveries, which gives us backpressure
+        logger.warning("Bot update queue is full, asking Telegram to retry")
+        raise HTTPException(status_code=503, detail="Update queue full", headers={"Retry-After": "1"})
+    return {"ok": True}
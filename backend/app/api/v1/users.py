@@ -1,12 +1,20 @@
 from typing import List, Optional
+import json
 import logging
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 
 from ...db.session import get_db
+from ...db.async_session import unit_of_work
+from ...db.returning import insert_returning
 from ...models.user import User as UserModel
-from ...schemas.user import User, UserCreate, UserUpdate
+from ...config import get_settings
+from ...schemas.user import User, UserCreate, UserUpdate, KycBulkApprove, KycApprovalResult, KycBulkApproveResult
+from ...services.broadcasts import segment_filter
 from ...services.wallet_wrapper import WalletService
+from ...services.user_cache import user_cache, record_user_change
 from ...bot.bot import notify_kyc_approved
 
 logger = logging.getLogger(__name__)
@@ -14,6 +22,11 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 wallet_service = WalletService()
 
+USER_FIELDS = ["id", "telegram_id", "username", "wallet_address", "kyc", "private_key"]
+DEFAULT_FIELDS = [f for f in USER_FIELDS if f != "private_key"]
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 500
+
 
 @router.post("/", response_model=User)
 def create_user(user: UserCreate, db: Session = Depends(get_db)):
@@ -21,17 +34,131 @@ def create_user(user: UserCreate, db: Session = Depends(get_db)):
     if db_user:
         raise HTTPException(status_code=400, detail="User already registered")
     
-    db_user = UserModel(
-        telegram_id=user.telegram_id,
-        username=user.username,
-        wallet_address=user.wallet_address
-    )
-    db.add(db_user)
+    db_user = insert_returning(db, UserModel.__table__, {
+        "telegram_id": user.telegram_id,
+        "username": user.username,
+        "wallet_address": user.wallet_address
+    })
+    record_user_change(db, user.telegram_id)
     db.commit()
-    db.refresh(db_user)
+    user_cache.invalidate(user.telegram_id)
     return db_user
 
 
+async def _approve_chunk(users: List[UserModel], report: KycBulkApproveResult) -> List[UserModel]:
+    """Give pending `users` wallets and mark them approved; their session commits the result."""
+    pending = []
+    for db_user in users:
+        if db_user.kyc:
+            report.results.append(KycApprovalResult(
+                telegram_id=db_user.telegram_id, status="already_approved", wallet_address=db_user.wallet_address
+            ))
+        else:
+            pending.append(db_user)
+
+    need_wallet = [u for u in pending if not u.wallet_address]
+    if need_wallet:
+        try:
+            wallets = await wallet_service.create_wallets([u.id for u in need_wallet])
+        except Exception as e:
+            logger.error(f"Error creating {len(need_wallet)} wallets: {e}")
+            report.results.extend(
+                KycApprovalResult(telegram_id=u.telegram_id, status="failed", error=f"Error creating wallet: {e}")
+                for u in pending
+            )
+            return []
+        for db_user, wallet in zip(need_wallet, wallets):
+            db_user.wallet_address = wallet['address']
+            db_user.private_key = wallet['privateKey']
+
+    for db_user in pending:
+        db_user.kyc = True
+    return pending
+
+
+@router.post("/kyc:bulk-approve", response_model=KycBulkApproveResult)
+async def bulk_approve_kyc(request: KycBulkApprove):
+    """Approve KYC for many users, creating wallets and committing a chunk at a time.
+
+    Users are picked by `telegram_ids` or by `filter`. Each chunk is its own
+    transaction, so a failure leaves earlier chunks approved and is reported
+    per user. Notifications are queued once a chunk has been committed.
+    """
+    settings = get_settings()
+    chunk_size = settings.KYC_APPROVE_CHUNK_SIZE
+    report = KycBulkApproveResult()
+
+    if request.telegram_ids is not None:
+        telegram_ids = list(dict.fromkeys(request.telegram_ids))
+        if len(telegram_ids) > settings.KYC_APPROVE_MAX_USERS:
+            raise HTTPException(status_code=400, detail=f"At most {settings.KYC_APPROVE_MAX_USERS} users per request")
+        chunks = (telegram_ids[i:i + chunk_size] for i in range(0, len(telegram_ids), chunk_size))
+        remaining = len(telegram_ids)
+    else:
+        condition = segment_filter({
+            "kyc": False,
+            "has_wallet": request.filter.has_wallet,
+            "passed_quiz": request.filter.passed_quiz,
+        })
+        remaining = min(request.filter.limit or settings.KYC_APPROVE_MAX_USERS, settings.KYC_APPROVE_MAX_USERS)
+        after_id = request.filter.after_id
+
+    while remaining > 0:
+        async with unit_of_work() as db:
+            if request.telegram_ids is not None:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                query = select(UserModel).where(UserModel.telegram_id.in_(chunk))
+            else:
+                query = (select(UserModel).where(UserModel.id > after_id, condition)
+                         .order_by(UserModel.id).limit(min(chunk_size, remaining)))
+            # Row locks on PostgreSQL keep a concurrent PATCH from giving a user a second wallet
+            users = (await db.execute(query.with_for_update())).scalars().all()
+
+            if request.telegram_ids is not None:
+                found = {u.telegram_id for u in users}
+                report.results.extend(
+                    KycApprovalResult(telegram_id=t, status="not_found") for t in chunk if t not in found
+                )
+                remaining -= len(chunk)
+            elif not users:
+                break
+            else:
+                after_id = users[-1].id
+                remaining -= len(users)
+
+            # Read before committing: a failed commit expires the objects
+            approved = [(u.telegram_id, u.wallet_address) for u in await _approve_chunk(users, report)]
+            for telegram_id, _ in approved:
+                record_user_change(db, telegram_id)
+            try:
+                await db.commit()
+            except Exception as e:
+                logger.error(f"Error approving KYC for {len(approved)} users: {e}")
+                report.results.extend(
+                    KycApprovalResult(telegram_id=telegram_id, status="failed", error=str(e))
+                    for telegram_id, _ in approved
+                )
+                continue
+
+        for telegram_id, wallet_address in approved:
+            user_cache.invalidate(telegram_id)
+            report.results.append(KycApprovalResult(
+                telegram_id=telegram_id, status="approved", wallet_address=wallet_address
+            ))
+            try:
+                await notify_kyc_approved(telegram_id, wallet_address)
+            except Exception as e:
+                logger.error(f"Failed to send notification: {e}")
+
+    for result in report.results:
+        setattr(report, result.status, getattr(report, result.status) + 1)
+    logger.info(f"Bulk KYC approval: {report.approved} approved, {report.already_approved} already approved, "
+                f"{report.not_found} not found, {report.failed} failed")
+    return report
+
+
 @router.get("/{telegram_id}", response_model=User)
 def get_user(telegram_id: int, db: Session = Depends(get_db)):
     db_user = db.query(UserModel).filter(UserModel.telegram_id == telegram_id).first()
@@ -56,17 +183,19 @@ async def update_user(telegram_id: int, user: UserUpdate, db: Session = Depends(
             # Create wallet if needed
             if not db_user.wallet_address:
                 try:
-                    wallet = await wallet_service.create_wallet()
-                    print(f"Wallet created: {wallet}")  # Debug log
+                    wallet = await wallet_service.create_wallet(index=db_user.id)
+                    logger.info(f"Wallet created for user {db_user.id}: {wallet['address']}")
                     db_user.wallet_address = wallet['address']
                     db_user.private_key = wallet['privateKey']
                 except Exception as e:
-                    print(f"Error creating wallet: {str(e)}")  # Debug log
+                    logger.error(f"Error creating wallet: {e}")
                     raise HTTPException(status_code=500, detail=f"Error creating wallet: {str(e)}")
             
             # Commit changes first
+            record_user_change(db, telegram_id)
             db.commit()
             db.refresh(db_user)
+            user_cache.invalidate(telegram_id)
             
             # Send notification after commit (so even if notification fails, DB is updated)
             try:
@@ -77,16 +206,62 @@ async def update_user(telegram_id: int, user: UserUpdate, db: Session = Depends(
             
             return db_user
     except Exception as e:
-        print(f"Error updating user: {str(e)}")  # Debug log
+        logger.error(f"Error updating user: {e}")
         raise HTTPException(status_code=500, detail=f"Error updating user: {str(e)}")
 
 
-@router.get("/", response_model=List[User])
+def _user_columns(fields: Optional[str]) -> List[str]:
+    """Requested column names; private keys are only returned when asked for by name."""
+    if not fields:
+        return DEFAULT_FIELDS
+    columns = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [c for c in columns if c not in USER_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return columns
+
+
+def _users_query(columns: List[str], kyc: Optional[bool], after_id: int):
+    # id is always selected because it is the pagination cursor
+    selected = ["id"] + [c for c in columns if c != "id"]
+    query = select(*[getattr(UserModel, c) for c in selected]).where(UserModel.id > after_id)
+    if kyc is not None:
+        query = query.where(UserModel.kyc == kyc)
+    return query.order_by(UserModel.id)
+
+
+async def _stream_users(query, columns: List[str]):
+    """Write rows as NDJSON straight from a streaming cursor, a chunk at a time."""
+    async with unit_of_work() as db:
+        result = (await db.stream(query)).mappings()
+        async for rows in result.partitions(STREAM_CHUNK_SIZE):
+            yield "".join(
+                json.dumps({c: row[c] for c in columns}) + "\n" for row in rows
+            ).encode()
+
+
+@router.get("/")
 def list_users(
+    response: Response,
     kyc: Optional[bool] = Query(None, description="Filter users by KYC status"),
+    after_id: int = Query(0, ge=0, description="Return users with an id greater than this cursor"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    format: str = Query("json", regex="^(json|ndjson)$", description="ndjson streams every matching user"),
     db: Session = Depends(get_db)
 ):
-    query = db.query(UserModel)
-    if kyc is not None:
-        query = query.filter(UserModel.kyc == kyc)
-    return query.all()
+    """List users ordered by id, one page at a time.
+
+    The next page starts at the X-Next-Cursor header, which is absent on
+    the last page. format=ndjson ignores `limit` and streams everything
+    after `after_id`.
+    """
+    columns = _user_columns(fields)
+    query = _users_query(columns, kyc, after_id)
+    if format == "ndjson":
+        return StreamingResponse(_stream_users(query, columns), media_type="application/x-ndjson")
+
+    rows = db.execute(query.limit(limit)).mappings().all()
+    if len(rows) == limit:
+        response.headers["X-Next-Cursor"] = str(rows[-1]["id"])
+    return [{c: row[c] for c in columns} for row in rows]
@@ -1,23 +1,50 @@
 """Main Telegram bot module."""
+import json
 import logging
 import os
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Bot
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.request import BaseRequest
 import asyncio
 from telegram.ext import (
     Application,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
+    TypeHandler,
     filters,
     ConversationHandler,
     ContextTypes,
 )
-from ..db.session import get_db
+from ..db.async_session import unit_of_work, dispose_async_engine
+from ..db.migrations import check_schema
+from ..db.returning import insert_returning_async
 from ..models.user import User
-from ..models.quiz import Quiz, UserQuizCompletion
+from ..models.quiz import UserQuizCompletion
+from ..models.payout import Payout, ETH_REWARD, NFT_BADGE, CONFIRMED
 from ..services.backend_wallet import BackendWalletService
-from ..services.wallet_wrapper import WalletService
+from ..services.balances import format_eth, get_balance_service, shutdown_balance_service
+from ..services.user_cache import user_cache, record_user_change, UserProfile
+from ..services.nonce_manager import shutdown_nonce_managers
+from ..services.wallet_wrapper import shutdown_sidecar_pool
+from ..services.notifications import (
+    get_notification_dispatcher, send_durably, start_notification_dispatcher, stop_notification_dispatcher
+)
+from ..services.scheduler import start_job_scheduler, stop_job_scheduler
+from ..services.payout_worker import create_payout_worker, enqueue_quiz_rewards
 from ..config import get_settings
+from ..metrics import ERRORS, register_component_stats, register_stats, start_metrics_server
+from .instrumentation import InstrumentedApplication, InstrumentedRequest
+from .persistence import DBPersistence
+from .state_sweeper import StateSweeper
+from .update_processor import PerUserUpdateProcessor
+from .recipients import (
+    can_receive, recipient_page, start_search, clear_search, PAGE_PATTERN as RECIPIENT_PAGE_PATTERN, PICKER_KEY as RECIPIENT_PICKER_KEY
+)
+from .quiz_engine import quiz_catalog, CompiledQuiz, QUIZ_CALLBACK_PATTERN, INTRO_PATTERN, ANSWER_PATTERN
 
 # Configure logging to be less verbose
 logging.basicConfig(
@@ -31,65 +58,18 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 
 # Conversation states
 NAME, BIRTHDAY, PHONE, EMAIL = range(4)
-QUIZ_START, QUIZ_Q1, QUIZ_Q2, QUIZ_Q3 = range(4, 8)
+QUIZ_START, QUIZ_ANSWER = range(4, 6)
 SEND_SELECT_USER, SEND_AMOUNT = range(8, 10)
 
-# Quiz content
-TRAINING_TEXT = """🌞 Solar Panel Cleaning Guide
-
-Safety First:
-• Turn off your solar panel system
-• Stay on the ground - use long-handled tools
-• Work in early morning or late afternoon
-
-Cleaning Steps:
-1. Mix mild soap with water (or use soap-free brushes)
-2. Use soft-bristle brush with long handle
-3. Gently clean panel surface
-4. Rinse with gentle spray
-
-❌ Never Use:
-• Harsh chemicals
-• Pressure washers
-• Abrasive tools
-
-❄️ For Snow:
-• Use soft roof rake with plastic blade
-• Start from lower edge
-• When in doubt, let nature do the work
-"""
-
-QUIZ_QUESTIONS = [
-    {
-        "question": "When is the best time to clean solar panels?",
-        "options": [
-            "During the hottest part of the day",
-            "Early morning or late afternoon",
-            "Right after it rains"
-        ],
-        "correct": 1
-    },
-    {
-        "question": "What should you avoid using when cleaning solar panels?",
-        "options": [
-            "Soft-bristle brush",
-            "Mild, biodegradable soap",
-            "Pressure washer"
-        ],
-        "correct": 2
-    },
-    {
-        "question": "How should you remove snow from solar panels?",
-        "options": [
-            "Use a soft roof rake with a plastic blade",
-            "Pour hot water over the panels",
-            "Scrape with a metal shovel"
-        ],
-        "correct": 0
-    }
-]
+PAYOUT_WORKER_KEY = "payout_worker"
+STATE_SWEEPER_KEY = "state_sweeper"
 
-def build_menu(user: User = None) -> InlineKeyboardMarkup:
+async def get_user(db: AsyncSession, telegram_id: int) -> Optional[User]:
+    """Look up a user by Telegram ID."""
+    result = await db.execute(select(User).where(User.telegram_id == telegram_id))
+    return result.scalars().first()
+
+def build_menu(user: UserProfile = None) -> InlineKeyboardMarkup:
     """Build the menu keyboard based on user state."""
     buttons = []
     
@@ -129,8 +109,7 @@ def build_menu(user: User = None) -> InlineKeyboardMarkup:
 
 async def show_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show the main menu."""
-    db = next(get_db())
-    user = db.query(User).filter(User.telegram_id == update.effective_user.id).first()
+    user = await user_cache.get(update.effective_user.id)
     
     await update.message.reply_text(
         "Welcome to Base Hackathon Bot! 🚀\n"
@@ -152,6 +131,10 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     logger.info(f"Received callback data: {query.data}")
     logger.info(f"Current conversation state: {context.user_data.get('state', 'None')}")
+    
+    if QUIZ_CALLBACK_PATTERN.match(query.data):
+        return await quiz_callback(update, context)
+    
     await query.answer()
     
     if query.data == "unavailable":
@@ -168,282 +151,63 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if query.data == "send_eth":
         logger.info(f"User {update.effective_user.id} starting send ETH flow")
-        db = next(get_db())
-        sender = db.query(User).filter(User.telegram_id == update.effective_user.id).first()
+        sender = await user_cache.get(update.effective_user.id)
         
         if not sender or not sender.kyc:
             await query.message.reply_text("Please complete KYC first")
             return ConversationHandler.END
-            
-        # Get list of KYC-approved users except current user
-        users = db.query(User).filter(
-            User.kyc == True,
-            User.telegram_id != update.effective_user.id,
-            User.wallet_address != None
-        ).all()
         
-        if not users:
+        clear_search(context.user_data)
+        text, keyboard, shown = await recipient_page(context.user_data, update.effective_user.id)
+        if not shown:
             await query.message.reply_text("No users available to send ETH to.")
             return ConversationHandler.END
-            
-        # Create buttons for each user
-        buttons = [
-            [InlineKeyboardButton(f"@{user.username}", callback_data=f"select_user_{user.id}")]
-            for user in users
-        ]
-        buttons.append([InlineKeyboardButton("Cancel", callback_data="send_cancel")])
-        
-        await query.message.reply_text(
-            "Select a user to send ETH to:",
-            reply_markup=InlineKeyboardMarkup(buttons)
-        )
+
+        await query.message.reply_text(text, reply_markup=keyboard)
         return SEND_SELECT_USER
-        
+
     elif query.data.startswith("select_user_"):
         user_id = int(query.data.split("_")[2])
-        context.user_data['recipient_id'] = user_id
+        context.user_data.pop('recipient_id', None)
+        
+        async with unit_of_work() as db:
+            recipient = await db.get(User, user_id)
         
-        db = next(get_db())
-        recipient = db.query(User).filter(User.id == user_id).first()
+        if not can_receive(recipient, update.effective_user.id):
+            # Stale button: the user was deleted or lost KYC since the page was shown
+            clear_search(context.user_data)
+            text, keyboard, shown = await recipient_page(context.user_data, update.effective_user.id)
+            if not shown:
+                await query.message.reply_text("That user can no longer receive ETH, and no other users are available.")
+                return ConversationHandler.END
+            await query.message.reply_text("That user can no longer receive ETH. " + text, reply_markup=keyboard)
+            return SEND_SELECT_USER
         
+        context.user_data['recipient_id'] = user_id
         await query.message.reply_text(
             f"How much ETH would you like to send to @{recipient.username}?\n"
             "Enter the amount (e.g., 0.01):"
         )
         return SEND_AMOUNT
         
+    elif query.data.startswith("rp:"):
+        direction = query.data[3:]
+        if direction == "all":
+            clear_search(context.user_data)
+            direction = None
+        text, keyboard, _ = await recipient_page(context.user_data, update.effective_user.id, direction)
+        await query.edit_message_text(text, reply_markup=keyboard)
+        return SEND_SELECT_USER
+
     elif query.data == "send_cancel":
         await query.message.reply_text(
             "ETH transfer cancelled. Use /menu to see available options."
         )
         return ConversationHandler.END
     
-    if query.data == "quiz":
-        logger.info(f"User {update.effective_user.id} starting quiz flow")
-        db = next(get_db())
-        user = db.query(User).filter(User.telegram_id == update.effective_user.id).first()
-        logger.info(f"Found user: {user.id} (Telegram ID: {user.telegram_id})")
-        
-        # Check if user has already passed the quiz
-        quiz = db.query(Quiz).filter(Quiz.name == "Solar Panel Cleaning").first()
-        logger.info(f"Found quiz: {quiz.id} - {quiz.name}")
-        
-        passed_quiz = db.query(UserQuizCompletion).filter(
-            UserQuizCompletion.user_id == user.id,
-            UserQuizCompletion.quiz_id == quiz.id,
-            UserQuizCompletion.passed == True
-        ).first()
-        logger.info(f"Previous passed quiz completion: {passed_quiz is not None}")
-        
-        if passed_quiz:
-            await query.message.reply_text(
-                "You've already passed this quiz and received your reward! 🎉"
-            )
-            return
-        
-        # Show training text
-        quiz = db.query(Quiz).filter(Quiz.name == "Solar Panel Cleaning").first()
-        await query.message.reply_text(
-            f"Let's learn about solar panel cleaning! 📚\n\n{TRAINING_TEXT}\n\n"
-            f"Ready to test your knowledge? Complete the quiz correctly to earn {quiz.eth_reward_amount} ETH (≈ $0.02)!\n\n"
-            f"Would you like to start the quiz?",
-            reply_markup=InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("Yes", callback_data="quiz_start"),
-                    InlineKeyboardButton("No", callback_data="quiz_cancel")
-                ]
-            ])
-        )
-        logger.info(f"Transitioning to QUIZ_START state for user {update.effective_user.id}")
-        return QUIZ_START
-        
-    elif query.data == "quiz_start":
-        logger.info(f"User {update.effective_user.id} starting quiz questions")
-        context.user_data['quiz_score'] = 0
-        logger.info("Quiz score initialized to 0")
-        await query.message.reply_text(
-            f"Question 1: {QUIZ_QUESTIONS[0]['question']}",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton(opt, callback_data=f"q1_{i}")]
-                for i, opt in enumerate(QUIZ_QUESTIONS[0]['options'])
-            ])
-        )
-        logger.info(f"Transitioning to QUIZ_Q1 state for user {update.effective_user.id}")
-        return QUIZ_Q1
-        
-    elif query.data.startswith("q1_"):
-        selected = int(query.data.split("_")[1])
-        logger.info(f"User {update.effective_user.id} answered Q1: selected={selected}, correct={QUIZ_QUESTIONS[0]['correct']}")
-        context.user_data['quiz_score'] = 0  # Reset score at start
-        if selected == QUIZ_QUESTIONS[0]['correct']:
-            context.user_data['quiz_score'] += 1
-            logger.info(f"Q1 correct, score now: {context.user_data['quiz_score']}")
-        else:
-            logger.info("Q1 incorrect")
-        
-        await query.message.reply_text(
-            f"Question 2: {QUIZ_QUESTIONS[1]['question']}",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton(opt, callback_data=f"q2_{i}")]
-                for i, opt in enumerate(QUIZ_QUESTIONS[1]['options'])
-            ])
-        )
-        logger.info(f"Transitioning to QUIZ_Q2 state for user {update.effective_user.id}")
-        return QUIZ_Q2
-        
-    elif query.data.startswith("q2_"):
-        selected = int(query.data.split("_")[1])
-        logger.info(f"User {update.effective_user.id} answered Q2: selected={selected}, correct={QUIZ_QUESTIONS[1]['correct']}")
-        if selected == QUIZ_QUESTIONS[1]['correct']:
-            context.user_data['quiz_score'] += 1
-            logger.info(f"Q2 correct, score now: {context.user_data['quiz_score']}")
-        else:
-            logger.info("Q2 incorrect")
-        
-        await query.message.reply_text(
-            f"Question 3: {QUIZ_QUESTIONS[2]['question']}",
-            reply_markup=InlineKeyboardMarkup([
-                [InlineKeyboardButton(opt, callback_data=f"q3_{i}")]
-                for i, opt in enumerate(QUIZ_QUESTIONS[2]['options'])
-            ])
-        )
-        logger.info(f"Transitioning to QUIZ_Q3 state for user {update.effective_user.id}")
-        return QUIZ_Q3
-        
-    elif query.data.startswith("q3_"):
-        selected = int(query.data.split("_")[1])
-        logger.info(f"User {update.effective_user.id} answered Q3: selected={selected}, correct={QUIZ_QUESTIONS[2]['correct']}")
-        if selected == QUIZ_QUESTIONS[2]['correct']:
-            context.user_data['quiz_score'] += 1
-            logger.info(f"Q3 correct, score now: {context.user_data['quiz_score']}")
-        else:
-            logger.info("Q3 incorrect")
-        
-        score = context.user_data.get('quiz_score', 0)
-        passed = score == 3
-        logger.info(f"Quiz completed - Final score: {score}, Passed: {passed}")
-        
-        # Only save completion record if they passed
-        if passed:
-            db = next(get_db())
-            user = db.query(User).filter(User.telegram_id == update.effective_user.id).first()
-            logger.info(f"Retrieved user for completion: {user.id}")
-            quiz = db.query(Quiz).filter(Quiz.name == "Solar Panel Cleaning").first()
-            logger.info(f"Retrieved quiz for completion: {quiz.id}")
-            
-            completion = UserQuizCompletion(
-                user_id=user.id,
-                quiz_id=quiz.id,
-                score=score,
-                passed=passed
-            )
-            logger.info(f"Created completion record: user_id={user.id}, quiz_id={quiz.id}, score={score}, passed={passed}")
-            
-            try:
-                db.add(completion)
-                db.commit()
-                logger.info("Successfully saved quiz completion")
-            except Exception as e:
-                logger.error(f"Error saving quiz completion: {e}")
-                db.rollback()
-                raise
-        
-        if passed:
-            # Send ETH reward and mint NFT
-            try:
-                # Send ETH reward
-                wallet_service = BackendWalletService()
-                wallet_info = wallet_service.get_wallet_info()
-                logger.info(f"Retrieved backend wallet info: {wallet_info['address']}")
-                
-                logger.info(f"Sending {quiz.eth_reward_amount} ETH to {user.wallet_address}")
-                tx_hash = await wallet_service.sendTransaction(
-                    wallet_info['private_key'],
-                    user.wallet_address,
-                    quiz.eth_reward_amount
-                )
-                logger.info(f"ETH reward sent successfully, tx_hash: {tx_hash}")
-
-                # Get NFT metadata
-                from ..models.nft import NFTMetadata
-                metadata = db.query(NFTMetadata).filter(NFTMetadata.quiz_id == quiz.id).first()
-                if metadata:
-                    # Mint NFT
-                    from ..services.nft_wrapper import NFTService
-                    nft_service = NFTService()
-                    
-                    # Update dynamic attributes
-                    import json
-                    attributes = json.loads(metadata.attributes)
-                    attributes["completion_date"] = completion.created_at.strftime("%Y-%m-%d")
-                    
-                    try:
-                        logger.info(f"Minting NFT for user {user.id} with metadata: {metadata.name}")
-                        nft_result = await nft_service.mint_nft(
-                            user.wallet_address,
-                            {
-                                "name": metadata.name,
-                                "description": metadata.description,
-                                "image_url": metadata.image_url,
-                                "attributes": json.dumps(attributes)
-                            }
-                        )
-                        
-                        # Save NFT token ID
-                        completion.nft_token_id = str(nft_result["tokenId"])
-                        completion.nft_transaction_hash = nft_result["transactionHash"]
-                        db.commit()
-                        logger.info(f"NFT minted successfully: token_id={nft_result['tokenId']}, tx_hash={nft_result['transactionHash']}")
-                        
-                        await query.message.reply_text(
-                            "🎉 Congratulations! You got all questions correct!\n\n"
-                            f"Your reward of {quiz.eth_reward_amount} ETH (≈ $0.02) has been sent!\n"
-                            f"View transaction: https://sepolia.basescan.org/tx/{tx_hash}\n\n"
-                            f"You've also earned a special NFT badge! 🏆\n"
-                            f"Token ID: {nft_result['tokenId']}\n"
-                            f"View NFT transaction: https://sepolia.basescan.org/tx/{nft_result['transactionHash']}"
-                        )
-                    except Exception as e:
-                        logger.error(f"Error minting NFT: {e}")
-                        # Still save completion but without NFT info
-                        db.commit()
-                        await query.message.reply_text(
-                            "🎉 Congratulations! You got all questions correct!\n\n"
-                            f"Your reward of {quiz.eth_reward_amount} ETH (≈ $0.02) has been sent!\n"
-                            f"View transaction: https://sepolia.basescan.org/tx/{tx_hash}\n\n"
-                            "NFT minting is temporarily unavailable. Your ETH reward has been sent successfully!"
-                        )
-                else:
-                    await query.message.reply_text(
-                        "🎉 Congratulations! You got all questions correct!\n\n"
-                        f"Your reward of {quiz.eth_reward_amount} ETH (≈ $0.02) has been sent!\n\n"
-                        f"View transaction: https://sepolia.basescan.org/tx/{tx_hash}"
-                    )
-            except Exception as e:
-                logger.error(f"Error sending ETH reward: {e}")
-                await query.message.reply_text(
-                    "🎉 Congratulations! You got all questions correct!\n\n"
-                    "There was an issue sending your ETH reward. Please contact support."
-                )
-        else:
-            await query.message.reply_text(
-                f"You got {score}/3 questions correct. You need all correct answers to earn the reward.\n"
-                "Feel free to try again after reviewing the training material!"
-            )
-        
-        logger.info(f"Ending conversation for user {update.effective_user.id} after quiz completion")
-        return ConversationHandler.END
-        
-    elif query.data == "quiz_cancel":
-        await query.message.reply_text(
-            "No problem! You can take the quiz anytime by selecting it from the menu."
-        )
-        logger.info(f"Ending conversation for user {update.effective_user.id} after quiz cancellation")
-        return ConversationHandler.END
-        
-    elif query.data == "wallet":
-        db = next(get_db())
-        user = db.query(User).filter(User.telegram_id == update.effective_user.id).first()
+    if query.data == "wallet":
+        async with unit_of_work() as db:
+            user = await get_user(db, update.effective_user.id)
         
         if not user:
             await query.message.reply_text("Please complete KYC first")
@@ -458,13 +222,13 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         
         try:
-            wallet_service = WalletService()
-            wallet_info = await wallet_service.get_wallet_client(user.private_key)
+            # Cached for a few seconds, so repeated taps do not reach the RPC node
+            balance = await get_balance_service().get_balance(user.wallet_address)
             
             await query.message.reply_text(
                 f"💳 Your Base Wallet\n\n"
-                f"Address: `{wallet_info['address']}`\n"
-                f"Balance: {wallet_info['balance']} ETH",
+                f"Address: `{user.wallet_address}`\n"
+                f"Balance: {format_eth(balance)} ETH",
                 parse_mode='Markdown'
             )
         except Exception as e:
@@ -474,6 +238,194 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 "Please try again later."
             )
 
+async def has_passed_quiz(user_id: int, quiz_id: int) -> bool:
+    """Check whether the user already has a passing completion for the quiz."""
+    async with unit_of_work() as db:
+        result = await db.execute(select(UserQuizCompletion.id).where(
+            UserQuizCompletion.user_id == user_id,
+            UserQuizCompletion.quiz_id == quiz_id,
+            UserQuizCompletion.passed == True
+        ).limit(1))
+        return result.scalar() is not None
+
+async def show_quiz_intro(query, quiz: CompiledQuiz, user: UserProfile):
+    """Show a quiz's training text and offer to start it."""
+    passed_quiz = await has_passed_quiz(user.id, quiz.id)
+    logger.info(f"Previous passed completion of quiz {quiz.id} for user {user.id}: {passed_quiz}")
+    
+    if passed_quiz:
+        await query.message.reply_text(
+            "You've already passed this quiz and received your reward! 🎉"
+        )
+        return ConversationHandler.END
+    
+    await query.message.reply_text(
+        f"Let's learn about {quiz.name.lower()}! 📚\n\n{quiz.training_text}\n\n"
+        f"Ready to test your knowledge? Complete the quiz correctly to earn {quiz.eth_reward_amount} ETH (≈ ${quiz.reward_amount})!\n\n"
+        f"Would you like to start the quiz?",
+        reply_markup=quiz.intro_keyboard
+    )
+    return QUIZ_START
+
+async def quiz_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Drive any quiz from its compiled definition.
+    
+    Progress is kept in context.user_data['quiz'] as the quiz id, the index
+    of the question being answered and the score so far.
+    """
+    query = update.callback_query
+    await query.answer()
+    action, *fields = query.data.split(":")
+    
+    if action == "qc":
+        context.user_data.pop('quiz', None)
+        await query.message.reply_text(
+            "No problem! You can take the quiz anytime by selecting it from the menu."
+        )
+        logger.info(f"Ending conversation for user {update.effective_user.id} after quiz cancellation")
+        return ConversationHandler.END
+    
+    user = await user_cache.get(update.effective_user.id)
+    if not user or not user.kyc:
+        await query.message.reply_text("Please complete KYC first")
+        return ConversationHandler.END
+    
+    if action == "quiz":
+        logger.info(f"User {update.effective_user.id} starting quiz flow")
+        quizzes = await quiz_catalog.quizzes()
+        if not quizzes:
+            await query.message.reply_text("No quizzes are available right now. Please check back later!")
+            return ConversationHandler.END
+        if len(quizzes) == 1:
+            return await show_quiz_intro(query, quizzes[0], user)
+        
+        await query.message.reply_text(
+            "Choose a course to learn and earn:",
+            reply_markup=await quiz_catalog.menu_keyboard()
+        )
+        return QUIZ_START
+    
+    quiz = await quiz_catalog.get(int(fields[0]))
+    if quiz is None:
+        await query.message.reply_text("This quiz is no longer available. Use /menu to see available options.")
+        return ConversationHandler.END
+    
+    if action == "qi":
+        return await show_quiz_intro(query, quiz, user)
+    
+    if action == "qs":
+        logger.info(f"User {update.effective_user.id} starting questions for quiz {quiz.id}")
+        context.user_data['quiz'] = {'id': quiz.id, 'question': 0, 'score': 0}
+        question = quiz.questions[0]
+        await query.message.reply_text(
+            f"Question 1: {question.text}",
+            reply_markup=question.keyboard
+        )
+        return QUIZ_ANSWER
+    
+    # action == "qa": an answer to question `index`
+    index, selected = int(fields[1]), int(fields[2])
+    progress = context.user_data.get('quiz')
+    if not progress or progress['id'] != quiz.id or progress['question'] != index:
+        logger.info(f"Ignoring stale quiz answer {query.data} from user {update.effective_user.id}")
+        return None
+    
+    question = quiz.questions[index]
+    if selected == question.correct_option:
+        progress['score'] += 1
+    logger.info(f"User {update.effective_user.id} answered quiz {quiz.id} Q{index + 1}: selected={selected}, score now: {progress['score']}")
+    
+    progress['question'] += 1
+    if progress['question'] < len(quiz.questions):
+        question = quiz.questions[progress['question']]
+        await query.message.reply_text(
+            f"Question {question.index + 1}: {question.text}",
+            reply_markup=question.keyboard
+        )
+        return QUIZ_ANSWER
+    
+    context.user_data.pop('quiz', None)
+    score = progress['score']
+    total = len(quiz.questions)
+    passed = score == total
+    logger.info(f"Quiz completed - Final score: {score}/{total}, Passed: {passed}")
+    
+    if passed:
+        await reward_quiz_completion(context, query, user, quiz, score)
+    else:
+        await query.message.reply_text(
+            f"You got {score}/{total} questions correct. You need all correct answers to earn the reward.\n"
+            "Feel free to try again after reviewing the training material!"
+        )
+    
+    logger.info(f"Ending conversation for user {update.effective_user.id} after quiz completion")
+    return ConversationHandler.END
+
+async def reward_quiz_completion(context: ContextTypes.DEFAULT_TYPE, query, user: UserProfile,
+                                 quiz: CompiledQuiz, score: int):
+    """Save a passing completion and queue its rewards for the payout worker."""
+    nft_metadata = None
+    if quiz.nft_metadata:
+        # Update dynamic attributes
+        attributes = json.loads(quiz.nft_metadata["attributes"])
+        attributes["completion_date"] = datetime.utcnow().strftime("%Y-%m-%d")
+        nft_metadata = {**quiz.nft_metadata, "attributes": json.dumps(attributes)}
+
+    async with unit_of_work() as db:
+        try:
+            # The completion id is needed for the payouts' idempotency keys
+            completion_id = (await insert_returning_async(db, UserQuizCompletion.__table__, {
+                "user_id": user.id,
+                "quiz_id": quiz.id,
+                "score": score,
+                "passed": True
+            }, UserQuizCompletion.id)).id
+            logger.info(f"Created completion record {completion_id}: user_id={user.id}, quiz_id={quiz.id}, score={score}")
+            enqueue_quiz_rewards(
+                db, completion_id, query.message.chat_id, user.wallet_address,
+                quiz.eth_reward_amount, nft_metadata
+            )
+            await db.commit()
+            logger.info("Successfully saved quiz completion and queued rewards")
+        except Exception as e:
+            logger.error(f"Error saving quiz completion: {e}")
+            raise
+
+    context.application.bot_data[PAYOUT_WORKER_KEY].wake()
+    await query.message.reply_text(
+        "🎉 Congratulations! You got all questions correct!\n\n"
+        f"Your reward of {quiz.eth_reward_amount} ETH (≈ ${quiz.reward_amount}) is on its way"
+        + (" together with a special NFT badge! 🏆" if nft_metadata else "!")
+        + "\nWe'll message you as soon as it has been sent."
+    )
+
+async def notify_payout_result(payout: Payout):
+    """Tell the user how their reward payout ended."""
+    if payout.status == CONFIRMED and payout.kind == ETH_REWARD:
+        text = (
+            f"💸 Your reward of {payout.amount} ETH has been sent!\n"
+            f"View transaction: https://sepolia.basescan.org/tx/{payout.tx_hash}"
+        )
+    elif payout.status == CONFIRMED and payout.kind == NFT_BADGE:
+        token_id = json.loads(payout.result)["tokenId"]
+        text = (
+            f"🏆 Your NFT badge has been minted!\n"
+            f"Token ID: {token_id}\n"
+            f"View NFT transaction: https://sepolia.basescan.org/tx/{payout.tx_hash}"
+        )
+    elif payout.kind == ETH_REWARD:
+        text = "There was an issue sending your ETH reward. Please contact support."
+    else:
+        text = "NFT minting is temporarily unavailable. Please contact support to receive your badge."
+    await send_durably(payout.chat_id, text)
+
+async def search_recipients(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Show recipients whose username starts with the typed text."""
+    start_search(context.user_data, update.message.text)
+    text, keyboard, _ = await recipient_page(context.user_data, update.effective_user.id)
+    await update.message.reply_text(text, reply_markup=keyboard)
+    return SEND_SELECT_USER
+
 async def handle_eth_amount(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handle ETH amount input and process the transaction."""
     try:
@@ -483,13 +435,16 @@ async def handle_eth_amount(update: Update, context: ContextTypes.DEFAULT_TYPE)
             return SEND_AMOUNT
             
         # Get sender and recipient info
-        db = next(get_db())
-        sender = db.query(User).filter(User.telegram_id == update.effective_user.id).first()
-        recipient = db.query(User).filter(User.id == context.user_data.get('recipient_id')).first()
+        async with unit_of_work() as db:
+            sender = await get_user(db, update.effective_user.id)
+            recipient = await db.get(User, context.user_data.get('recipient_id'))
         
         if not sender or not recipient:
             await update.message.reply_text("Error: User not found")
             return ConversationHandler.END
+        if not can_receive(recipient, update.effective_user.id):
+            await update.message.reply_text("That user can no longer receive ETH. Use /menu to pick someone else.")
+            return ConversationHandler.END
             
         # Send ETH
         try:
@@ -503,53 +458,31 @@ async def handle_eth_amount(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 formatted_amount
             )
             logger.info(f"ETH sent successfully, tx_hash: {tx_hash}")
-            
-            # Notify sender
-            await update.message.reply_text(
-                f"✅ Successfully sent {amount} ETH to @{recipient.username}!\n\n"
-                f"View transaction: https://sepolia.basescan.org/tx/{tx_hash}"
-            )
-            
-            # Schedule recipient notification as a background task
-            async def notify_recipient():
-                bot = Bot(token=get_settings().TELEGRAM_BOT_TOKEN)
-                max_retries = 3
-                retry_delay = 60  # Start with 1 minute delay
-                
-                try:
-                    for attempt in range(max_retries):
-                        try:
-                            await bot.send_message(
-                                chat_id=recipient.telegram_id,
-                                text=f"🎉 You received {amount} ETH from @{sender.username}!\n\n"
-                                     f"View transaction: https://sepolia.basescan.org/tx/{tx_hash}",
-                                parse_mode='Markdown'
-                            )
-                            break
-                        except Exception as e:
-                            if "Flood control exceeded" in str(e) and attempt < max_retries - 1:
-                                logger.warning(f"Rate limited, waiting {retry_delay} seconds...")
-                                await asyncio.sleep(retry_delay)
-                                retry_delay *= 2  # Exponential backoff
-                                continue
-                            logger.error(f"Failed to notify recipient: {e}")
-                            break
-                finally:
-                    try:
-                        await bot.close()
-                    except Exception as e:
-                        logger.warning(f"Error closing bot in background task: {e}")
-            
-            # Start notification task in background and ignore any errors
-            task = asyncio.create_task(notify_recipient())
-            task.add_done_callback(lambda t: t.exception() if t.exception() else None)
-                
         except Exception as e:
             logger.error(f"Error sending ETH: {e}")
             await update.message.reply_text(
                 "Sorry, there was an error sending ETH. Please try again later."
             )
-            
+            return ConversationHandler.END
+
+        # The ETH has been sent: nothing below may tell the sender to try again
+        # Notify sender
+        await update.message.reply_text(
+            f"✅ Successfully sent {amount} ETH to @{recipient.username}!\n\n"
+            f"View transaction: https://sepolia.basescan.org/tx/{tx_hash}"
+        )
+
+        # Notify recipient as a job, retried with backoff until Telegram takes it.
+        # Plain text: usernames may contain Markdown characters such as _
+        try:
+            await send_durably(
+                recipient.telegram_id,
+                f"🎉 You received {amount} ETH from @{sender.username}!\n\n"
+                f"View transaction: https://sepolia.basescan.org/tx/{tx_hash}"
+            )
+        except Exception as e:
+            logger.error(f"Could not queue the ETH notification for user {recipient.telegram_id} (tx {tx_hash}): {e}")
+
     except ValueError:
         await update.message.reply_text("Please enter a valid number")
         return SEND_AMOUNT
@@ -584,32 +517,32 @@ async def collect_email(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     """Collect user's email and save all data."""
     context.user_data['email'] = update.message.text
     
-    # Get database session
-    db = next(get_db())
-    
     try:
-        # Try to get existing user or create new one
-        user = db.query(User).filter(User.telegram_id == update.effective_user.id).first()
-        if user:
-            # Update existing user
-            user.username = update.effective_user.username
-            user.kyc = False  # Reset to pending approval
-            user.full_name = context.user_data['name']
-            user.birthday = context.user_data['birthday']
-            user.phone = context.user_data['phone']
-            user.email = context.user_data['email']
-        else:
-            # Create new user
-            user = User(
-                telegram_id=update.effective_user.id,
-                username=update.effective_user.username,
-                kyc=False,  # Pending approval
-                full_name=context.user_data['name'],
-                phone=context.user_data['phone'],
-                email=context.user_data['email']
-            )
-            db.add(user)
-        db.commit()
+        async with unit_of_work() as db:
+            # Try to get existing user or create new one
+            user = await get_user(db, update.effective_user.id)
+            if user:
+                # Update existing user
+                user.username = update.effective_user.username
+                user.kyc = False  # Reset to pending approval
+                user.full_name = context.user_data['name']
+                user.birthday = context.user_data['birthday']
+                user.phone = context.user_data['phone']
+                user.email = context.user_data['email']
+            else:
+                # Create new user
+                user = User(
+                    telegram_id=update.effective_user.id,
+                    username=update.effective_user.username,
+                    kyc=False,  # Pending approval
+                    full_name=context.user_data['name'],
+                    phone=context.user_data['phone'],
+                    email=context.user_data['email']
+                )
+                db.add(user)
+            record_user_change(db, update.effective_user.id)
+            await db.commit()
+        user_cache.invalidate(update.effective_user.id)
         
         await update.message.reply_text(
             "Thank you! Your KYC information has been submitted for review. "
@@ -617,7 +550,6 @@ async def collect_email(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
         )
     except Exception as e:
         logger.error(f"Error saving user data: {e}")
-        db.rollback()
         await update.message.reply_text(
             "Sorry, there was an error processing your information. "
             "Please try again later or contact support."
@@ -625,6 +557,13 @@ async def collect_email(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     
     return ConversationHandler.END
 
+def forget_on_timeout(*keys: str) -> list:
+    """TIMEOUT state handlers dropping the user_data a conversation collected."""
+    async def timed_out(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        for key in keys:
+            context.user_data.pop(key, None)
+    return [TypeHandler(Update, timed_out)]
+
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancel the conversation."""
     await update.message.reply_text(
@@ -634,69 +573,104 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
 async def notify_kyc_approved(telegram_id: int, wallet_address: str):
     """Send notification to user when KYC is approved."""
-    settings = get_settings()
-    if not settings.TELEGRAM_BOT_TOKEN:
-        logger.error("Cannot send notification: No bot token")
+    dispatcher = get_notification_dispatcher()
+    if dispatcher is None:
+        logger.error("Cannot send notification: notification dispatcher is not running")
         return
-        
-    bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
-    max_retries = 3
-    retry_delay = 5  # seconds
-    
-    try:
-        for attempt in range(max_retries):
-            try:
-                await bot.send_message(
-                    chat_id=telegram_id,
-                    text=f"🎉 Congratulations! Your KYC has been approved!\n\n"
-                         f"Your Base wallet address is:\n`{wallet_address}`\n\n"
-                         f"Use /menu to see all available options.",
-                    parse_mode='Markdown'
-                )
-                break
-            except Exception as e:
-                if "Flood control exceeded" in str(e) and attempt < max_retries - 1:
-                    logger.warning(f"Rate limited, waiting {retry_delay} seconds...")
-                    await asyncio.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
-                    continue
-                logger.error(f"Failed to send KYC approval notification: {e}")
-                break
-    finally:
-        await bot.close()
-
-def create_application() -> Application:
-    """Create and configure the bot application."""
+
+    dispatcher.send(
+        telegram_id,
+        f"🎉 Congratulations! Your KYC has been approved!\n\n"
+        f"Your Base wallet address is:\n`{wallet_address}`\n\n"
+        f"Use /menu to see all available options.",
+        parse_mode='Markdown'
+    )
+
+async def post_init(application: Application) -> None:
+    """Start the notification dispatcher, job scheduler and reward payout worker once the bot is initialised."""
+    await start_notification_dispatcher(application.bot)
+    await start_job_scheduler()
+    register_component_stats()
+    register_stats("bot_updates", application.update_processor.stats)
+    if application.persistence is not None:
+        register_stats("bot_persistence", application.persistence.stats)
+    register_stats("bot_state", application.bot_data[STATE_SWEEPER_KEY].stats)
+    worker = create_payout_worker(notify_payout_result)
+    application.bot_data[PAYOUT_WORKER_KEY] = worker
+    await worker.start()
+
+async def post_shutdown(application: Application) -> None:
+    """Stop the payout worker, job scheduler, dispatcher and wallet sidecar and release pooled database connections."""
+    worker = application.bot_data.get(PAYOUT_WORKER_KEY)
+    if worker:
+        await worker.stop()
+    # Before the dispatcher, so draining notify jobs can still deliver
+    await stop_job_scheduler()
+    await stop_notification_dispatcher()
+    await shutdown_nonce_managers()
+    await shutdown_sidecar_pool()
+    await shutdown_balance_service()
+    await dispose_async_engine()
+
+def create_application(update_queue: Optional[asyncio.Queue] = None,
+                       request: Optional[BaseRequest] = None) -> Application:
+    """Create and configure the bot application.
+
+    Pass `update_queue` when updates are fed in from outside (webhook mode),
+    and `request` to replace the Bot API transport (backend/bench).
+    """
     # Create application with custom settings
     settings = get_settings()
     if not settings.TELEGRAM_BOT_TOKEN:
         raise ValueError("TELEGRAM_BOT_TOKEN is required for bot operation")
         
-    application = Application.builder().token(
+    builder = Application.builder().token(
         settings.TELEGRAM_BOT_TOKEN
-    ).build()
+    ).base_url(settings.TELEGRAM_BASE_URL).post_init(post_init).post_shutdown(post_shutdown)
+    # Time handlers and Bot API calls (getUpdates keeps its own, untimed client)
+    builder = builder.application_class(InstrumentedApplication).request(
+        request or InstrumentedRequest(connection_pool_size=256)
+    )
+    # Users are served concurrently, each user's updates in order (see update_processor.py)
+    builder = builder.concurrent_updates(PerUserUpdateProcessor(settings.BOT_CONCURRENT_UPDATES))
+    # Conversations and user_data survive restarts (see persistence.py)
+    persistent = settings.BOT_PERSISTENCE_INTERVAL > 0
+    if persistent:
+        builder = builder.persistence(DBPersistence(
+            settings.BOT_PERSISTENCE_INTERVAL,
+            conversation_ttl=settings.BOT_CONVERSATION_TIMEOUT,
+            user_data_ttl=settings.BOT_USER_DATA_TTL
+        ))
+    if update_queue is not None:
+        builder = builder.update_queue(update_queue).updater(None)
+    application = builder.build()
 
     # Configure error handlers
     async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handle errors in the bot."""
+        ERRORS.labels("bot").inc()
         logger.error(f"Exception while handling an update: {context.error}")
         if update:
             logger.error(f"Update that caused error: {update}")
     
     application.add_error_handler(error_handler)
 
+    # Abandoned conversations end after this long without an update from the user
+    conversation_timeout = settings.BOT_CONVERSATION_TIMEOUT or None
+
     # Create quiz handler
     quiz_handler = ConversationHandler(
-        entry_points=[CallbackQueryHandler(button_callback, pattern="^quiz$")],
+        entry_points=[CallbackQueryHandler(quiz_callback, pattern="^quiz$")],
         states={
-            QUIZ_START: [CallbackQueryHandler(button_callback, pattern="^(quiz_start|quiz_cancel)$")],
-            QUIZ_Q1: [CallbackQueryHandler(button_callback, pattern="^q1_[0-2]$")],
-            QUIZ_Q2: [CallbackQueryHandler(button_callback, pattern="^q2_[0-2]$")],
-            QUIZ_Q3: [CallbackQueryHandler(button_callback, pattern="^q3_[0-2]$")],
+            QUIZ_START: [CallbackQueryHandler(quiz_callback, pattern=INTRO_PATTERN)],
+            QUIZ_ANSWER: [CallbackQueryHandler(quiz_callback, pattern=ANSWER_PATTERN)],
+            ConversationHandler.TIMEOUT: forget_on_timeout('quiz'),
         },
         fallbacks=[CommandHandler("cancel", cancel)],
         allow_reentry=True,
-        name="quiz"
+        name="quiz",
+        persistent=persistent,
+        conversation_timeout=conversation_timeout
     )
 
     # Create send ETH handler
@@ -708,14 +682,18 @@ def create_application() -> Application:
         states={
             SEND_SELECT_USER: [
                 CallbackQueryHandler(button_callback, pattern="^select_user_\\d+$"),
-                CallbackQueryHandler(button_callback, pattern="^send_cancel$")
+                CallbackQueryHandler(button_callback, pattern=RECIPIENT_PAGE_PATTERN),
+                CallbackQueryHandler(button_callback, pattern="^send_cancel$"),
+                MessageHandler(filters.TEXT & ~filters.COMMAND, search_recipients)
             ],
-            SEND_AMOUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_eth_amount)]
+            SEND_AMOUNT: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_eth_amount)],
+            ConversationHandler.TIMEOUT: forget_on_timeout('recipient_id', RECIPIENT_PICKER_KEY),
         },
         fallbacks=[CommandHandler("cancel", cancel)],
         allow_reentry=True,
         name="send_eth",
-        persistent=False
+        persistent=persistent,
+        conversation_timeout=conversation_timeout
     )
 
     # Create KYC handler
@@ -726,10 +704,13 @@ def create_application() -> Application:
             BIRTHDAY: [MessageHandler(filters.TEXT & ~filters.COMMAND, collect_birthday)],
             PHONE: [MessageHandler(filters.TEXT & ~filters.COMMAND, collect_phone)],
             EMAIL: [MessageHandler(filters.TEXT & ~filters.COMMAND, collect_email)],
+            ConversationHandler.TIMEOUT: forget_on_timeout('name', 'birthday', 'phone', 'email'),
         },
         fallbacks=[CommandHandler("cancel", cancel)],
         allow_reentry=True,
-        name="kyc"
+        name="kyc",
+        persistent=persistent,
+        conversation_timeout=conversation_timeout
     )
     
     # Add handlers in correct order
@@ -740,11 +721,24 @@ def create_application() -> Application:
     application.add_handler(kyc_handler)
     application.add_handler(CallbackQueryHandler(button_callback))
 
+    # Drop user_data and chat_data of users idle for longer than their TTL
+    sweeper = StateSweeper([quiz_handler, send_eth_handler, kyc_handler],
+                           settings.BOT_USER_DATA_TTL, settings.BOT_CHAT_DATA_TTL)
+    application.add_handler(TypeHandler(Update, sweeper.track), group=-1)
+    sweeper.schedule(application, settings.BOT_STATE_SWEEP_INTERVAL)
+    application.bot_data[STATE_SWEEPER_KEY] = sweeper
+
     return application
 
 def main() -> None:
     """Start the bot."""
     try:
+        if get_settings().BOT_MODE == "webhook":
+            print("BOT_MODE=webhook: updates are served by the API process (python run.py)")
+            return
+        check_schema()
+        if get_settings().BOT_METRICS_PORT:
+            start_metrics_server(get_settings().BOT_METRICS_PORT)
         print("Creating application...")
         app = create_application()
         print("Starting bot polling...")
@@ -0,0 +1,70 @@
+"""Metrics hooks for python-telegram-bot (see app/metrics.py)."""
+import json
+import re
+import time
+from typing import Tuple
+
+from telegram import Update
+from telegram.ext import Application
+from telegram.request import HTTPXRequest
+
+from ..metrics import BOT_HANDLER_SECONDS, ERRORS, FLOOD_WAITS, FLOOD_WAIT_SECONDS, TELEGRAM_REQUEST_SECONDS
+
+# User-controlled strings (callback data, commands) become at most this many labels
+MAX_UPDATE_LABELS = 100
+_update_labels = set()
+_callback_ids = re.compile(r"[:_]\d.*$")  # qa:3:1:0 -> qa, select_user_42 -> select_user
+
+
+def update_label(update: object) -> str:
+    """Low-cardinality label for an update: callback data without ids, command name, or kind."""
+    if not isinstance(update, Update):
+        return "other"
+    if update.callback_query is not None:
+        label = "callback:" + _callback_ids.sub("", update.callback_query.data or "")
+    elif update.message is not None and update.message.text and update.message.text.startswith("/"):
+        label = "command:" + update.message.text.split()[0].split("@")[0]
+    elif update.message is not None:
+        label = "message"
+    else:
+        return "other"
+    if label not in _update_labels:
+        if len(_update_labels) >= MAX_UPDATE_LABELS:
+            return "other"
+        _update_labels.add(label)
+    return label
+
+
+class InstrumentedApplication(Application):
+    """Application that times each update through all of its handlers."""
+
+    async def process_update(self, update: object) -> None:
+        start = time.perf_counter()
+        try:
+            await super().process_update(update)
+        finally:
+            BOT_HANDLER_SECONDS.labels(update_label(update)).observe(time.perf_counter() - start)
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that times Bot API calls and counts flood-control waits."""
+
+    async def do_request(self, url: str, method: str, *args, **kwargs) -> Tuple[int, bytes]:
+        api_method = url.rsplit("/", 1)[-1]
+        start = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception:
+            ERRORS.labels("telegram").inc()
+            raise
+        finally:
+            TELEGRAM_REQUEST_SECONDS.labels(api_method).observe(time.perf_counter() - start)
+        if code == 429:
+            FLOOD_WAITS.labels(api_method).inc()
+            try:
+                FLOOD_WAIT_SECONDS.inc(json.loads(payload)["parameters"]["retry_after"])
+            except (ValueError, KeyError, TypeError):
+                pass
+        elif code >= 400:
+            ERRORS.labels("telegram").inc()
+        return code, payload
@@ -0,0 +1,195 @@
+"""Conversation states and user_data kept in the database across restarts.
+
+PTB collects what changed and hands it to the persistence every
+`update_interval` seconds (BOT_PERSISTENCE_INTERVAL) and at shutdown.
+DBPersistence only records those changes in memory, so handlers never wait
+on a write. Everything handed over in one round goes to the database
+together on the next loop iteration: one transaction, a DELETE and a
+multi-row INSERT per table. A user who clicks ten times between rounds
+costs one row.
+
+Only conversations and user_data are stored; the bot keeps nothing in
+chat_data, bot_data or callback data. Rows older than the conversation
+timeout or user_data TTL are deleted instead of loaded at startup, since
+the process that wrote them would have dropped them by now.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, tuple_
+from telegram.ext import BasePersistence, PersistenceInput
+
+from ..db.async_session import unit_of_work
+from ..models.bot_state import BotConversation, BotUserData
+
+logger = logging.getLogger(__name__)
+
+DELETED = None  # Dirty entry that is removed instead of written
+WRITE_CHUNK_SIZE = 500  # Rows per statement, well below the databases' bound parameter limits
+
+
+def _chunks(items: List, size: int = WRITE_CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _cutoff(ttl: float) -> Optional[datetime]:
+    return datetime.now(timezone.utc) - timedelta(seconds=ttl) if ttl else None
+
+
+class DBPersistence(BasePersistence):
+    def __init__(self, update_interval: float, conversation_ttl: float = 0, user_data_ttl: float = 0):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.conversation_ttl = conversation_ttl  # 0: keep forever
+        self.user_data_ttl = user_data_ttl
+        # Serialized at hand-over, so later changes to the live dicts wait for the next round
+        self._dirty_users: Dict[int, Optional[str]] = {}
+        self._dirty_conversations: Dict[Tuple[str, str], Optional[str]] = {}
+        self._write_lock = asyncio.Lock()
+        self._write_scheduled = False
+        self._writes: Set[asyncio.Task] = set()  # Referenced until done so flush() can wait for them
+        self.flushes = 0
+        self.rows_written = 0
+        self.errors = 0
+
+    async def get_user_data(self) -> Dict[int, Dict[Any, Any]]:
+        async with unit_of_work() as db:
+            cutoff = _cutoff(self.user_data_ttl)
+            if cutoff is not None:
+                await db.execute(delete(BotUserData).where(BotUserData.updated_at < cutoff))
+                await db.commit()
+            rows = (await db.execute(BotUserData.__table__.select())).all()
+        return {row.user_id: json.loads(row.data) for row in rows}
+
+    async def get_conversations(self, name: str) -> Dict[Tuple, object]:
+        async with unit_of_work() as db:
+            cutoff = _cutoff(self.conversation_ttl)
+            if cutoff is not None:
+                await db.execute(delete(BotConversation).where(
+                    BotConversation.name == name, BotConversation.updated_at < cutoff
+                ))
+                await db.commit()
+            rows = (await db.execute(
+                BotConversation.__table__.select().where(BotConversation.name == name)
+            )).all()
+        return {tuple(json.loads(row.key)): json.loads(row.state) for row in rows}
+
+    async def update_user_data(self, user_id: int, data: Dict[Any, Any]) -> None:
+        try:
+            self._dirty_users[user_id] = json.dumps(data)
+        except (TypeError, ValueError) as e:
+            logger.error(f"Not saving user_data of {user_id}, it is not JSON serializable: {e}")
+            return
+        self._schedule_write()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._dirty_users[user_id] = DELETED
+        self._schedule_write()
+
+    async def update_conversation(self, name: str, key: Tuple, new_state: Optional[object]) -> None:
+        state = DELETED if new_state is None else json.dumps(new_state)
+        self._dirty_conversations[(name, json.dumps(list(key)))] = state
+        self._schedule_write()
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[Any, Any]) -> None:
+        pass  # This process is the only writer
+
+    async def flush(self) -> None:
+        """Write whatever is still pending; called by Application.shutdown()."""
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+        await self._write()
+
+    def _schedule_write(self):
+        if not self._write_scheduled:
+            # PTB hands over a round with asyncio.gather, so by the time this
+            # runs every update_* call of the round has been recorded
+            self._write_scheduled = True
+            asyncio.get_running_loop().call_soon(self._start_write)
+
+    def _start_write(self):
+        task = asyncio.ensure_future(self._write())
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _write(self):
+        async with self._write_lock:
+            self._write_scheduled = False
+            users, self._dirty_users = self._dirty_users, {}
+            conversations, self._dirty_conversations = self._dirty_conversations, {}
+            if not users and not conversations:
+                return
+            try:
+                async with unit_of_work() as db:
+                    # Replace rather than upsert: the same two statements on every database
+                    for keys in _chunks(list(users)):
+                        await db.execute(delete(BotUserData).where(BotUserData.user_id.in_(keys)))
+                    rows = [{"user_id": k, "data": v} for k, v in users.items() if v is not DELETED]
+                    for chunk in _chunks(rows):
+                        await db.execute(BotUserData.__table__.insert(), chunk)
+
+                    for keys in _chunks(list(conversations)):
+                        await db.execute(delete(BotConversation).where(
+                            tuple_(BotConversation.name, BotConversation.key).in_(keys)
+                        ))
+                    rows = [
+                        {"name": name, "key": key, "state": state}
+                        for (name, key), state in conversations.items() if state is not DELETED
+                    ]
+                    for chunk in _chunks(rows):
+                        await db.execute(BotConversation.__table__.insert(), chunk)
+                    await db.commit()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Saving {len(users)} user_data and {len(conversations)} conversations failed: {e}")
+                # Retried with the next round, unless that round has something newer
+                for key, value in users.items():
+                    self._dirty_users.setdefault(key, value)
+                for key, value in conversations.items():
+                    self._dirty_conversations.setdefault(key, value)
+                return
+            self.flushes += 1
+            self.rows_written += len(users) + len(conversations)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._dirty_users) + len(self._dirty_conversations),
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "errors": self.errors,
+        }
+
+    # Not stored: the bot keeps no chat_data, bot_data or callback data
+
+    async def get_chat_data(self) -> Dict[int, Dict[Any, Any]]:
+        return {}
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]) -> None:
+        pass
+
+    async def update_bot_data(self, data: Dict[Any, Any]) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict[Any, Any]) -> None:
+        pass
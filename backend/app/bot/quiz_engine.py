@@ -0,0 +1,164 @@
+"""Data-driven quiz engine with precompiled, in-memory quiz definitions."""
+import json
+import logging
+import re
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import func, select
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from ..db.async_session import unit_of_work
+from ..models.nft import NFTMetadata
+from ..models.quiz import Quiz, QuizQuestion
+
+logger = logging.getLogger(__name__)
+
+# Compact callback data. Telegram caps callback_data at 64 bytes.
+#   qi:<quiz_id>                     show a quiz's training text
+#   qs:<quiz_id>                     start the questions
+#   qc                               cancel
+#   qa:<quiz_id>:<question>:<option> answer a question
+QUIZ_CALLBACK_PATTERN = re.compile(r"^(quiz|qc|q[is]:\d+|qa:\d+:\d+:\d+)$")
+INTRO_PATTERN = r"^(qi:\d+|qs:\d+|qc)$"
+ANSWER_PATTERN = r"^(qa:\d+:\d+:\d+|qc)$"
+
+
+class CompiledQuestion(NamedTuple):
+    index: int
+    text: str
+    correct_option: int
+    keyboard: InlineKeyboardMarkup
+
+
+class CompiledQuiz(NamedTuple):
+    id: int
+    name: str
+    training_text: str
+    reward_amount: str
+    eth_reward_amount: str
+    questions: List[CompiledQuestion]
+    intro_keyboard: InlineKeyboardMarkup
+    nft_metadata: Optional[Dict[str, str]]
+
+
+def _compile(quiz: Quiz, questions: List[QuizQuestion],
+             metadata: Optional[NFTMetadata]) -> CompiledQuiz:
+    compiled = []
+    for index, question in enumerate(questions):
+        options = json.loads(question.options)
+        compiled.append(CompiledQuestion(
+            index=index,
+            text=question.text,
+            correct_option=question.correct_option,
+            keyboard=InlineKeyboardMarkup([
+                [InlineKeyboardButton(option, callback_data=f"qa:{quiz.id}:{index}:{i}")]
+                for i, option in enumerate(options)
+            ])
+        ))
+    return CompiledQuiz(
+        id=quiz.id,
+        name=quiz.name,
+        training_text=quiz.training_text or "",
+        reward_amount=quiz.reward_amount,
+        eth_reward_amount=quiz.eth_reward_amount,
+        questions=compiled,
+        intro_keyboard=InlineKeyboardMarkup([[
+            InlineKeyboardButton("Yes", callback_data=f"qs:{quiz.id}"),
+            InlineKeyboardButton("No", callback_data="qc")
+        ]]),
+        nft_metadata={
+            "name": metadata.name,
+            "description": metadata.description,
+            "image_url": metadata.image_url,
+            "attributes": metadata.attributes,
+        } if metadata else None
+    )
+
+
+class QuizCatalog:
+    """All quizzes, loaded once and reloaded when the quiz tables change.
+
+    Change detection runs at most every `check_interval` seconds: an
+    aggregate query over the quiz tables, plus the reward and NFT metadata
+    columns themselves, which admins edit in place without touching
+    updated_at. Answering a question never touches the catalog tables.
+    """
+
+    def __init__(self, check_interval: float = 30.0):
+        self.check_interval = check_interval
+        self._quizzes: Dict[int, CompiledQuiz] = {}
+        self._menu_keyboard: Optional[InlineKeyboardMarkup] = None
+        self._fingerprint = None
+        self._next_check = 0.0
+        self.reloads = 0
+
+    async def _refresh(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+
+        async with unit_of_work() as db:
+            aggregates = [
+                func.count(Quiz.id), func.max(Quiz.id), func.max(Quiz.updated_at),
+                func.count(QuizQuestion.id), func.max(QuizQuestion.id), func.max(QuizQuestion.updated_at),
+                func.count(NFTMetadata.id), func.max(NFTMetadata.id),
+            ]
+            result = await db.execute(select(*(select(agg).scalar_subquery() for agg in aggregates)))
+            rewards = await db.execute(
+                select(Quiz.id, Quiz.reward_amount, Quiz.eth_reward_amount).order_by(Quiz.id)
+            )
+            nft_fields = await db.execute(
+                select(NFTMetadata.id, NFTMetadata.quiz_id, NFTMetadata.name, NFTMetadata.description,
+                       NFTMetadata.image_url, NFTMetadata.attributes).order_by(NFTMetadata.id)
+            )
+            fingerprint = (tuple(result.one()), tuple(map(tuple, rewards)), tuple(map(tuple, nft_fields)))
+            if fingerprint == self._fingerprint:
+                return
+
+            quizzes = (await db.execute(select(Quiz).order_by(Quiz.id))).scalars().all()
+            questions = (await db.execute(
+                select(QuizQuestion).order_by(QuizQuestion.quiz_id, QuizQuestion.position)
+            )).scalars().all()
+            metadata = (await db.execute(select(NFTMetadata).order_by(NFTMetadata.id))).scalars().all()
+
+        by_quiz: Dict[int, List[QuizQuestion]] = {}
+        for question in questions:
+            by_quiz.setdefault(question.quiz_id, []).append(question)
+        metadata_by_quiz = {}
+        for item in metadata:
+            metadata_by_quiz.setdefault(item.quiz_id, item)
+
+        # Quizzes without questions are not offered
+        self._quizzes = {
+            quiz.id: _compile(quiz, by_quiz[quiz.id], metadata_by_quiz.get(quiz.id))
+            for quiz in quizzes if by_quiz.get(quiz.id)
+        }
+        self._menu_keyboard = InlineKeyboardMarkup(
+            [[InlineKeyboardButton(quiz.name, callback_data=f"qi:{quiz.id}")]
+             for quiz in self._quizzes.values()]
+            + [[InlineKeyboardButton("Cancel", callback_data="qc")]]
+        )
+        self._fingerprint = fingerprint
+        self.reloads += 1
+        logger.info(f"Loaded {len(self._quizzes)} quizzes into the quiz catalog")
+
+    async def quizzes(self) -> List[CompiledQuiz]:
+        await self._refresh()
+        return list(self._quizzes.values())
+
+    async def get(self, quiz_id: int) -> Optional[CompiledQuiz]:
+        await self._refresh()
+        return self._quizzes.get(quiz_id)
+
+    async def menu_keyboard(self) -> InlineKeyboardMarkup:
+        await self._refresh()
+        return self._menu_keyboard
+
+    def invalidate(self):
+        """Force a change check on the next lookup."""
+        self._next_check = 0.0
+
+
+quiz_catalog = QuizCatalog()
@@ -0,0 +1,116 @@
+"""Paged, searchable recipient picker for the send ETH flow."""
+import logging
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func, or_, select
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from ..db.async_session import unit_of_work
+from ..models.user import User
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 8
+PICKER_KEY = "recipient_picker"  # user_data entry holding the current page's cursors
+
+# Callback data:
+#   rp:next / rp:prev   page through recipients
+#   rp:all              clear the search
+PAGE_PATTERN = r"^rp:(next|prev|all)$"
+
+# Both browsing and search walk users in (lower(username), id) order, which
+# ix_users_kyc_username serves directly.
+_sort_name = func.lower(User.username)
+
+
+def can_receive(user: Optional[User], sender_telegram_id: int) -> bool:
+    """Whether `user` may still be picked; a button can outlive the recipient's KYC or account."""
+    return bool(
+        user is not None and user.kyc and user.wallet_address and user.username
+        and user.telegram_id != sender_telegram_id
+    )
+
+
+async def _fetch(sender_telegram_id: int, prefix: Optional[str], after: Optional[Tuple[str, int]],
+                 before: Optional[Tuple[str, int]]) -> List[Tuple[str, int, str]]:
+    """Up to PAGE_SIZE + 1 rows of (sort name, id, username) next to a cursor."""
+    query = select(_sort_name, User.id, User.username).where(
+        User.kyc == True,
+        User.telegram_id != sender_telegram_id,
+        User.wallet_address != None,
+        User.username != None  # Nothing to show on a button otherwise
+    )
+    if prefix:
+        # A range instead of LIKE so the index is used on every database
+        query = query.where(_sort_name >= prefix, _sort_name < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+    if after:
+        query = query.where(_sort_name >= after[0], or_(_sort_name > after[0], User.id > after[1]))
+    if before:
+        query = query.where(_sort_name <= before[0], or_(_sort_name < before[0], User.id < before[1]))
+        query = query.order_by(_sort_name.desc(), User.id.desc())
+    else:
+        query = query.order_by(_sort_name, User.id)
+
+    async with unit_of_work() as db:
+        rows = (await db.execute(query.limit(PAGE_SIZE + 1))).all()
+    return [tuple(row) for row in rows]
+
+
+async def recipient_page(user_data: dict, sender_telegram_id: int,
+                         direction: Optional[str] = None) -> Tuple[str, InlineKeyboardMarkup, int]:
+    """Load the first, next or previous page for the picker state in user_data.
+
+    Returns the message text, keyboard and number of recipients shown.
+    """
+    picker = user_data.setdefault(PICKER_KEY, {"prefix": None})
+    prefix = picker.get("prefix")
+
+    if direction == "next" and picker.get("last"):
+        rows = await _fetch(sender_telegram_id, prefix, tuple(picker["last"]), None)
+        has_prev, has_next = True, len(rows) > PAGE_SIZE
+        rows = rows[:PAGE_SIZE]
+    elif direction == "prev" and picker.get("first"):
+        rows = await _fetch(sender_telegram_id, prefix, None, tuple(picker["first"]))
+        has_prev, has_next = len(rows) > PAGE_SIZE, True
+        rows = list(reversed(rows[:PAGE_SIZE]))
+    else:
+        rows = await _fetch(sender_telegram_id, prefix, None, None)
+        has_prev, has_next = False, len(rows) > PAGE_SIZE
+        rows = rows[:PAGE_SIZE]
+
+    if rows:
+        picker["first"] = list(rows[0][:2])
+        picker["last"] = list(rows[-1][:2])
+
+    buttons = [
+        [InlineKeyboardButton(f"@{username}", callback_data=f"select_user_{user_id}")]
+        for _, user_id, username in rows
+    ]
+    nav = []
+    if has_prev:
+        nav.append(InlineKeyboardButton("◀️ Previous", callback_data="rp:prev"))
+    if has_next:
+        nav.append(InlineKeyboardButton("Next ▶️", callback_data="rp:next"))
+    if nav:
+        buttons.append(nav)
+    if prefix:
+        buttons.append([InlineKeyboardButton("Show all users", callback_data="rp:all")])
+    buttons.append([InlineKeyboardButton("Cancel", callback_data="send_cancel")])
+
+    if prefix and not rows:
+        text = f"No users found matching @{prefix}. Type another username to search:"
+    elif prefix:
+        text = f"Users matching @{prefix}:\nTap one to send ETH, or type another username to search."
+    else:
+        text = "Select a user to send ETH to, or type a username to search:"
+    return text, InlineKeyboardMarkup(buttons), len(rows)
+
+
+def start_search(user_data: dict, text: str):
+    """Reset the picker to the first page of usernames starting with `text`."""
+    prefix = text.strip().lstrip("@").lower()
+    user_data[PICKER_KEY] = {"prefix": prefix or None}
+
+
+def clear_search(user_data: dict):
+    user_data[PICKER_KEY] = {"prefix": None}
@@ -0,0 +1,101 @@
+"""Drops bot state left behind by users who walked away.
+
+Conversations end by themselves after BOT_CONVERSATION_TIMEOUT (see
+create_application). user_data and chat_data have no such limit: PTB keeps
+an entry for every user and chat that ever sent an update. StateSweeper
+notes when each was last seen and, every BOT_STATE_SWEEP_INTERVAL seconds,
+drops the entries idle for longer than BOT_USER_DATA_TTL / BOT_CHAT_DATA_TTL.
+With persistence enabled the dropped user_data is deleted from the
+database too.
+"""
+import json
+import logging
+import time
+from typing import Dict, List
+
+from telegram import Update
+from telegram.ext import Application, ConversationHandler, ContextTypes
+
+logger = logging.getLogger(__name__)
+
+
+def _size(data: dict) -> int:
+    """Approximate bytes held by one user_data/chat_data dict, as JSON."""
+    return len(json.dumps(data, default=str))
+
+
+class StateSweeper:
+    def __init__(self, conversations: List[ConversationHandler], user_data_ttl: float, chat_data_ttl: float):
+        self.conversations = conversations
+        self.user_data_ttl = user_data_ttl
+        self.chat_data_ttl = chat_data_ttl
+        self._users_seen: Dict[int, float] = {}  # id -> monotonic time of the last update
+        self._chats_seen: Dict[int, float] = {}
+        self.dropped_user_data = 0
+        self.dropped_chat_data = 0
+        # Measured at each sweep rather than on every scrape
+        self.user_data_entries = 0
+        self.chat_data_entries = 0
+        self.user_data_bytes = 0
+        self.chat_data_bytes = 0
+
+    async def track(self, update: object, context: ContextTypes.DEFAULT_TYPE):
+        """TypeHandler callback that records activity; runs before every other handler."""
+        if not isinstance(update, Update):
+            return
+        now = time.monotonic()
+        if update.effective_user is not None:
+            self._users_seen[update.effective_user.id] = now
+        if update.effective_chat is not None:
+            self._chats_seen[update.effective_chat.id] = now
+
+    async def sweep(self, context: ContextTypes.DEFAULT_TYPE):
+        """Job callback dropping idle user_data and chat_data."""
+        application = context.application
+        if self.user_data_ttl:
+            self.dropped_user_data += self._sweep(
+                "user_data", application.user_data, self._users_seen, self.user_data_ttl, application.drop_user_data
+            )
+        if self.chat_data_ttl:
+            self.dropped_chat_data += self._sweep(
+                "chat_data", application.chat_data, self._chats_seen, self.chat_data_ttl, application.drop_chat_data
+            )
+        self.user_data_entries = len(application.user_data)
+        self.chat_data_entries = len(application.chat_data)
+        self.user_data_bytes = sum(_size(data) for data in application.user_data.values())
+        self.chat_data_bytes = sum(_size(data) for data in application.chat_data.values())
+
+    @staticmethod
+    def _sweep(kind: str, entries, seen: Dict[int, float], ttl: float, drop) -> int:
+        now = time.monotonic()
+        dropped = 0
+        for key in list(entries):
+            # Entries loaded from persistence have no activity yet; their clock starts now
+            if now - seen.setdefault(key, now) > ttl:
+                drop(key)
+                dropped += 1
+        for key, last_seen in list(seen.items()):
+            if now - last_seen > ttl:
+                del seen[key]
+        if dropped:
+            logger.info(f"Dropped {dropped} idle {kind} entries")
+        return dropped
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            # Every conversation in progress has a pending timeout job
+            "conversations": sum(len(handler.timeout_jobs) for handler in self.conversations),
+            "users_tracked": len(self._users_seen),
+            "user_data_entries": self.user_data_entries,
+            "chat_data_entries": self.chat_data_entries,
+            "user_data_bytes": self.user_data_bytes,
+            "chat_data_bytes": self.chat_data_bytes,
+            "dropped_user_data": self.dropped_user_data,
+            "dropped_chat_data": self.dropped_chat_data,
+        }
+
+    def schedule(self, application: Application, interval: float):
+        if application.job_queue is None:
+            logger.warning("No JobQueue (install python-telegram-bot[job-queue]); idle user_data is never dropped")
+            return
+        application.job_queue.run_repeating(self.sweep, interval=interval, first=interval, name="state_sweeper")
@@ -0,0 +1,100 @@
+"""Concurrent update processing that keeps each user's updates in order.
+
+With PTB's default every update waits for the one before it, so one slow
+payout or balance lookup holds up every other user. Here up to
+BOT_CONCURRENT_UPDATES updates run at once, but never two from the same
+user: ConversationHandler state and context.user_data are only ever
+touched by one handler at a time.
+
+An update from a user who is already being served is appended to that
+user's queue and gives its concurrency slot back straight away. The
+update being served works through the queue before releasing its own
+slot, so a busy user occupies one slot however many updates they send.
+"""
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Deque, Dict, Optional, Tuple
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from ..metrics import BOT_UPDATE_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def update_key(update: object) -> Optional[int]:
+    """The user (or, failing that, chat) whose updates must stay in order; None for neither."""
+    if not isinstance(update, Update):
+        return None
+    if update.effective_user is not None:
+        return update.effective_user.id
+    if update.effective_chat is not None:
+        return update.effective_chat.id
+    return None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Runs updates concurrently up to `max_concurrent_updates`, one at a time per user."""
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # user -> updates waiting behind the one being handled, with their arrival time
+        self._queues: Dict[int, Deque[Tuple[Awaitable[Any], float]]] = {}
+        self.processing = 0
+        self.processed = 0
+        self.deferred = 0
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = update_key(update)
+        if key is None:
+            await self._handle(coroutine)
+            return
+
+        queue = self._queues.get(key)
+        if queue is not None:
+            # Handled by the task already serving this user, once its earlier updates are done
+            queue.append((coroutine, time.perf_counter()))
+            self.deferred += 1
+            return
+
+        queue = self._queues[key] = deque()
+        try:
+            await self._handle(coroutine)
+            while queue:
+                coroutine, queued_at = queue.popleft()
+                BOT_UPDATE_WAIT_SECONDS.observe(time.perf_counter() - queued_at)
+                await self._handle(coroutine)
+        finally:
+            del self._queues[key]
+            # Only left over when cancelled at shutdown
+            for coroutine, _ in queue:
+                coroutine.close()
+
+    async def _handle(self, coroutine: Awaitable[Any]):
+        self.processing += 1
+        try:
+            await coroutine
+        except Exception as e:
+            # Application.process_update reports handler errors itself; keep serving the queue
+            logger.error(f"Unhandled error processing update: {e}")
+        finally:
+            self.processing -= 1
+            self.processed += 1
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "max_concurrent": self.max_concurrent_updates,
+            "processing": self.processing,
+            "active_users": len(self._queues),
+            "queued": sum(len(queue) for queue in self._queues.values()),
+            "processed": self.processed,
+            "deferred": self.deferred,
+        }
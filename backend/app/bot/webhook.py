@@ -0,0 +1,132 @@
+"""Webhook ingestion: the FastAPI app receives updates and feeds the bot Application."""
+import asyncio
+import hmac
+import logging
+from typing import Dict, Optional
+
+from telegram import Update
+from telegram.ext import Application
+from telegram.request import BaseRequest
+
+from ..config import get_settings
+from .bot import create_application
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = "/api/v1/telegram/webhook"
+
+
+class UpdateQueueFull(Exception):
+    """Raised when the bot is too far behind to accept another update."""
+
+
+class InvalidUpdate(ValueError):
+    """Raised for a request body that is not a Telegram update."""
+
+
+class WebhookIngress:
+    """Owns the bot Application while it runs inside the API process.
+
+    Updates are parsed in the request handler and put on a bounded queue
+    that the Application drains, so the HTTP response never waits for a
+    handler. When the queue is full the update is refused and Telegram
+    redelivers it later.
+
+    `request` replaces the Bot API transport, as in create_application().
+    """
+
+    def __init__(self, queue_size: int, request: Optional[BaseRequest] = None):
+        self.queue: "asyncio.Queue[object]" = asyncio.Queue(maxsize=queue_size)
+        self.request = request
+        self.application: Optional[Application] = None
+        self.accepted = 0
+        self.rejected = 0
+        self.invalid = 0
+
+    async def start(self):
+        settings = get_settings()
+        if not settings.TELEGRAM_WEBHOOK_URL:
+            raise ValueError("TELEGRAM_WEBHOOK_URL is required when BOT_MODE=webhook")
+        # Without it anyone who can reach the endpoint could post updates as any user
+        if not settings.TELEGRAM_WEBHOOK_SECRET:
+            raise ValueError("TELEGRAM_WEBHOOK_SECRET is required when BOT_MODE=webhook")
+
+        self.application = create_application(update_queue=self.queue, request=self.request)
+        await self.application.initialize()
+        # run_polling/run_webhook normally call the lifecycle hooks; we manage them here
+        if self.application.post_init:
+            await self.application.post_init(self.application)
+        await self.application.start()
+
+        await self.application.bot.set_webhook(
+            url=settings.TELEGRAM_WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=settings.TELEGRAM_WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES,
+            # Keep what Telegram held for us while we were restarting
+            drop_pending_updates=False
+        )
+        logger.info(f"Bot webhook registered at {settings.TELEGRAM_WEBHOOK_URL}")
+
+    async def stop(self):
+        if self.application is None:
+            return
+        # The webhook stays registered so Telegram holds updates while we restart
+        if self.application.running:
+            await self.application.stop()
+            if self.application.post_stop:
+                await self.application.post_stop(self.application)
+        await self.application.shutdown()
+        if self.application.post_shutdown:
+            await self.application.post_shutdown(self.application)
+        self.application = None
+
+    def check_secret(self, token: Optional[str]) -> bool:
+        expected = get_settings().TELEGRAM_WEBHOOK_SECRET
+        if not expected:
+            return False
+        return token is not None and hmac.compare_digest(token, expected)
+
+    def submit(self, data: dict):
+        """Queue a raw update from Telegram without waiting for it to be handled."""
+        try:
+            update = Update.de_json(data, self.application.bot)
+        except Exception as e:
+            self.invalid += 1
+            raise InvalidUpdate(f"{type(e).__name__}: {e}") from e
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise UpdateQueueFull()
+        self.accepted += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "invalid": self.invalid,
+        }
+
+
+_ingress: Optional[WebhookIngress] = None
+
+
+def get_webhook_ingress() -> Optional[WebhookIngress]:
+    """The running ingress, or None when the bot is not in webhook mode."""
+    return _ingress
+
+
+async def start_webhook_ingress() -> WebhookIngress:
+    global _ingress
+    _ingress = WebhookIngress(get_settings().TELEGRAM_WEBHOOK_QUEUE_SIZE)
+    await _ingress.start()
+    return _ingress
+
+
+async def stop_webhook_ingress():
+    global _ingress
+    if _ingress is not None:
+        await _ingress.stop()
+    _ingress = None
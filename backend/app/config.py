@@ -5,8 +5,102 @@ import os
 
 class Settings(BaseSettings):
     # Use SQLite database file in the project root
-    DATABASE_URL: str = "sqlite:///./base-hackathon.db"
+    DATABASE_URL: str = "sqlite:///./base-hackathon.db"  # Relative paths are from the project root
+
+    # SQLite connection setup shared by every process (see db/engine.py); ignored for PostgreSQL
+    DB_BUSY_TIMEOUT: int = 5000  # Milliseconds to wait for another writer before "database is locked"
+    DB_SYNCHRONOUS: str = "NORMAL"  # Durable across app crashes with WAL; FULL also survives power loss
+    DB_MMAP_SIZE: int = 268435456  # Bytes of the file read through memory mapping
+    DB_CACHE_SIZE: int = 16384  # KiB of page cache per connection
+    DB_SLOW_QUERY: float = 0.5  # Seconds; slower statements are counted and logged
+
+    # Connection pools for every database (see db/engine.py); unset sizes use per-process defaults
+    DB_POOL_SIZE: int | None = None
+    DB_MAX_OVERFLOW: int | None = None
+    DB_POOL_TIMEOUT: float = 30.0  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # Seconds before a connection is replaced
+    DB_STATEMENT_CACHE_SIZE: int = 500  # asyncpg prepared statements per connection; 0 behind pgbouncer
     TELEGRAM_BOT_TOKEN: str | None = None
+    TELEGRAM_BASE_URL: str = "https://api.telegram.org/bot"
+
+    # "polling": run_bot.py long-polls. "webhook": the API process receives updates
+    BOT_MODE: str = "polling"
+    TELEGRAM_WEBHOOK_URL: str | None = None  # Public base URL of the API, e.g. https://bot.example.com
+    TELEGRAM_WEBHOOK_SECRET: str | None = None  # Required in webhook mode; checked against X-Telegram-Bot-Api-Secret-Token
+    TELEGRAM_WEBHOOK_QUEUE_SIZE: int = 1000  # Updates buffered before Telegram is asked to retry
+    BOT_CONCURRENT_UPDATES: int = 64  # Updates handled at once; each user's still run in order (1: one at a time)
+    BOT_PERSISTENCE_INTERVAL: float = 5.0  # Seconds between saves of conversations and user_data, 0 to keep them in memory
+
+    # Abandoned bot state (see bot/state_sweeper.py); 0 keeps it forever
+    BOT_CONVERSATION_TIMEOUT: float = 900.0  # Seconds a KYC, quiz or send-ETH conversation may sit idle
+    BOT_USER_DATA_TTL: float = 86400.0  # Seconds after a user's last update before their user_data is dropped
+    BOT_CHAT_DATA_TTL: float = 86400.0
+    BOT_STATE_SWEEP_INTERVAL: float = 300.0  # Seconds between sweeps
+
+    # Outgoing notifications (see services/notifications.py); limits apply per process
+    NOTIFY_GLOBAL_RATE: float = 10.0  # Messages per second across all chats; one process's share of Telegram's 30
+    NOTIFY_CHAT_RATE: float = 1.0  # Messages per second to one chat
+    NOTIFY_CHAT_BURST: float = 1.0
+    NOTIFY_WORKERS: int = 8  # Concurrent sends, also the HTTP connection pool size
+    NOTIFY_MAX_ATTEMPTS: int = 3  # For network errors; RetryAfter is always honoured
+
+    # Segment broadcasts sent by the API (see services/broadcasts.py)
+    BROADCAST_CHUNK_SIZE: int = 500  # Recipients loaded and checkpointed at a time
+    BROADCAST_POLL_INTERVAL: float = 5.0  # Seconds between checks for new broadcasts
+    BROADCAST_LEASE_TIME: float = 300.0  # Seconds a process holds a broadcast between checkpoints; above one chunk's send time
+
+    # POST /api/v1/users/kyc:bulk-approve
+    KYC_APPROVE_CHUNK_SIZE: int = 200  # Users given wallets and committed per transaction
+    KYC_APPROVE_MAX_USERS: int = 10000  # Per request
+
+    # Warm Node.js workers for wallet operations (see services/wallet_wrapper.py)
+    WALLET_SIDECAR_WORKERS: int = 2
+    WALLET_SIDECAR_MAX_IN_FLIGHT: int = 32  # Concurrent calls per worker
+    WALLET_SIDECAR_TIMEOUT: float = 60.0  # Seconds per call
+    WALLET_SIDECAR_HEALTH_INTERVAL: float = 15.0
+
+    # Balance lookups (see services/balances.py); the sidecar reads the same RPC URL
+    BASE_SEPOLIA_RPC_URL: str | None = None  # Defaults to the public https://sepolia.base.org
+    BALANCE_CACHE_TTL: float = 15.0  # Seconds
+    BALANCE_SETTLE_TIME: float = 6.0  # Seconds after a send during which balances are not cached
+    BALANCE_BATCH_SIZE: int = 100  # eth_getBalance calls per JSON-RPC batch
+    BALANCE_CACHE_MAX_SIZE: int = 10000
+    BALANCE_RPC_TIMEOUT: float = 10.0  # Seconds
+    RECEIPT_POLL_INTERVAL: float = 2.0  # Seconds between eth_getTransactionReceipt calls; Base mines every 2s
+    RECEIPT_TIMEOUT: float = 120.0  # Seconds before a payout stops waiting and checks again later
+
+    # Prometheus metrics (see app/metrics.py); the API serves them at /metrics
+    BOT_METRICS_PORT: int = 9101  # Exporter for the polling bot process, 0 to disable
+
+    # Optional HD mode: user wallets are derived from this seed at index users.id
+    WALLET_HD_SEED: str | None = None  # Hex-encoded BIP-32 seed
+    WALLET_HD_MNEMONIC: str | None = None  # BIP-39 mnemonic, takes precedence over the seed
+    WALLET_HD_PATH: str = "m/44'/60'/0'/0"
+
+    # User profile cache used for menu rendering and KYC gating in the bot
+    USER_CACHE_TTL: float = 300.0  # Seconds
+    USER_CACHE_MAX_SIZE: int = 10000
+    USER_CACHE_POLL_INTERVAL: float = 1.0  # Seconds between cross-process invalidation checks
+
+    # Reward payout outbox drained by the bot's payout worker
+    PAYOUT_WORKER_CONCURRENCY: int = 4
+    PAYOUT_MAX_ATTEMPTS: int = 5
+    PAYOUT_RETRY_BASE_DELAY: float = 10.0  # Seconds, doubled after each failed attempt
+    PAYOUT_POLL_INTERVAL: float = 2.0  # Seconds
+    PAYOUT_LEASE_TIME: float = 60.0  # Seconds a claimed payout is reserved for its worker; renewed while it runs
+    PAYOUT_BATCH_ENABLED: bool = False  # Pay ETH rewards through the disperse contract
+    PAYOUT_BATCH_MAX_SIZE: int = 100  # Send as soon as this many rewards are due
+    PAYOUT_BATCH_WINDOW: float = 30.0  # Or once the oldest due reward has waited this long
+
+    # Durable delayed jobs run by the bot process (see services/scheduler.py)
+    JOB_WORKERS: int = 4  # Jobs run at once
+    JOB_LEASE_TIME: float = 60.0  # Seconds a claimed job is reserved for its worker; renewed while it runs
+    JOB_POLL_INTERVAL: float = 1.0  # Seconds between checks for due jobs
+    JOB_DRAIN_TIMEOUT: float = 10.0  # Seconds running jobs get to finish at shutdown
+
+    # Local nonce allocation for the backend wallet (see services/nonce_manager.py)
+    NONCE_CHECK_INTERVAL: float = 10.0  # Seconds between gap/stuck checks
+    NONCE_STUCK_AFTER: float = 60.0  # Seconds before an unmined nonce counts as stuck
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,67 @@
+"""Async database sessions for code running on an event loop (the Telegram bot)."""
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from .engine import create_db_engine, to_async_url  # noqa: F401 (to_async_url re-exported)
+
+async_engine = create_db_engine("bot", async_driver=True)
+AsyncSessionLocal = sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False  # Handlers keep reading objects after commit
+)
+
+_stats = {
+    "units_opened": 0,
+    "units_open": 0,
+    "connections_checked_out": 0,
+}
+
+
+@event.listens_for(async_engine.sync_engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    _stats["connections_checked_out"] += 1
+
+
+@event.listens_for(async_engine.sync_engine, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    _stats["connections_checked_out"] -= 1
+
+
+@asynccontextmanager
+async def unit_of_work() -> AsyncIterator[AsyncSession]:
+    """Session scoped to one bot update.
+
+    Rolls back on error and always returns its connection to the pool.
+    """
+    session = AsyncSessionLocal()
+    _stats["units_opened"] += 1
+    _stats["units_open"] += 1
+    try:
+        yield session
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+        _stats["units_open"] -= 1
+
+
+def get_pool_stats() -> Dict[str, int]:
+    """Pool usage; `units_open` and `connections_checked_out` return to 0 when idle."""
+    pool = async_engine.sync_engine.pool
+    return {
+        **_stats,
+        "pool_size": pool.size(),
+        "pool_checked_in": pool.checkedin(),
+        "pool_overflow": pool.overflow(),
+    }
+
+
+async def dispose_async_engine():
+    await async_engine.dispose()
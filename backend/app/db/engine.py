@@ -0,0 +1,188 @@
+"""Engine factory shared by the API, the bot and the admin CLI.
+
+Every process opens the same database, so every engine is built here from
+Settings.DATABASE_URL with the same connection setup. For SQLite that means
+WAL (readers never wait for a writer in another process), a busy timeout
+instead of immediate "database is locked" errors, and pooled connections so
+the pragmas and page cache survive between sessions.
+
+PostgreSQL (`postgresql://...`) uses psycopg2 for sync sessions and asyncpg,
+with a per-connection prepared statement cache, for async ones.
+"""
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+from ..config import get_settings
+from ..metrics import DB_QUERY_SECONDS, ERRORS
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../.."))
+
+# (pool_size, max_overflow) per kind of caller
+POOL_SIZES = {
+    "api": (10, 20),  # Sync sessions serve FastAPI's threadpool
+    "bot": (5, 10),  # Async sessions: bot updates, plus background work in the API
+    "admin": (1, 2),  # The interactive CLI does one thing at a time
+}
+
+
+def resolve_database_url(url: Optional[str] = None) -> str:
+    """DATABASE_URL with relative SQLite paths anchored at the project root.
+
+    The default `sqlite:///./base-hackathon.db` has always meant the file
+    next to README.md, whichever directory a process is started from.
+    """
+    url = url or get_settings().DATABASE_URL
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)  # Heroku-style URLs
+    prefix = "sqlite:///"
+    if url.startswith(prefix) and url != prefix and not url.startswith(prefix + "/") \
+            and ":memory:" not in url:
+        url = prefix + os.path.normpath(os.path.join(PROJECT_ROOT, url[len(prefix):]))
+    return url
+
+
+def to_async_url(url: str) -> str:
+    """Map a sync database URL onto its asyncio driver."""
+    if url.startswith("sqlite:///"):
+        return url.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
+    if url.startswith("postgres://"):
+        return url.replace("postgres://", "postgresql+asyncpg://", 1)
+    if url.startswith("postgresql://") or url.startswith("postgresql+psycopg2://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    return url
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+class EngineStats:
+    """Contention counters for one engine."""
+
+    def __init__(self):
+        self.statements = 0
+        self.slow_statements = 0
+        self.locked_errors = 0
+        self.statement_time = 0.0
+        self.statement_time_max = 0.0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "statements": self.statements,
+            "slow_statements": self.slow_statements,
+            "locked_errors": self.locked_errors,
+            "statement_time_avg": self.statement_time / self.statements if self.statements else 0.0,
+            "statement_time_max": self.statement_time_max,
+        }
+
+
+_stats: Dict[str, EngineStats] = {}
+_engines: Dict[str, Engine] = {}
+
+
+def _configure_sqlite(engine: Engine):
+    settings = get_settings()
+    pragmas = [
+        "PRAGMA journal_mode=WAL",
+        f"PRAGMA busy_timeout={settings.DB_BUSY_TIMEOUT}",
+        f"PRAGMA synchronous={settings.DB_SYNCHRONOUS}",
+        f"PRAGMA mmap_size={settings.DB_MMAP_SIZE}",
+        f"PRAGMA cache_size=-{settings.DB_CACHE_SIZE}",  # Negative means KiB
+    ]
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def _track_contention(engine: Engine, stats: EngineStats, role: str):
+    slow_after = get_settings().DB_SLOW_QUERY
+    query_seconds = DB_QUERY_SECONDS.labels(role)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.monotonic())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.monotonic() - conn.info["query_start"].pop()
+        stats.statements += 1
+        stats.statement_time += elapsed
+        stats.statement_time_max = max(stats.statement_time_max, elapsed)
+        query_seconds.observe(elapsed)
+        if elapsed >= slow_after:
+            # Mostly time spent in busy_timeout waiting for another writer
+            stats.slow_statements += 1
+            logger.warning(f"Slow {role} statement ({elapsed:.2f}s): {statement[:200]}")
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(context):
+        starts = context.connection.info.get("query_start") if context.connection else None
+        if starts:
+            starts.pop()
+        ERRORS.labels("db").inc()
+        if "database is locked" in str(context.original_exception):
+            stats.locked_errors += 1
+
+
+def create_db_engine(role: str, url: Optional[str] = None, async_driver: bool = False):
+    """Build an engine for `role` ("api", "bot" or "admin").
+
+    With async_driver=True this returns an AsyncEngine on the matching
+    asyncio driver; pragmas and metrics are attached to its sync core.
+    """
+    settings = get_settings()
+    url = resolve_database_url(url)
+    pool_size, max_overflow = POOL_SIZES[role]
+    kwargs = {
+        "pool_size": settings.DB_POOL_SIZE if settings.DB_POOL_SIZE is not None else pool_size,
+        "max_overflow": settings.DB_MAX_OVERFLOW if settings.DB_MAX_OVERFLOW is not None else max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+    if async_driver:
+        from sqlalchemy.ext.asyncio import create_async_engine
+        from sqlalchemy.pool import AsyncAdaptedQueuePool
+        if not is_sqlite(url):
+            # Statements are prepared once per connection and reused from this cache
+            kwargs["connect_args"] = {"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+        # aiosqlite would otherwise default to NullPool (a new thread + connection per session)
+        engine = create_async_engine(to_async_url(url), poolclass=AsyncAdaptedQueuePool, **kwargs)
+        core = engine.sync_engine
+    else:
+        if is_sqlite(url):
+            kwargs.update(poolclass=QueuePool, connect_args={"check_same_thread": False})
+        engine = core = create_engine(url, **kwargs)
+
+    if is_sqlite(url):
+        _configure_sqlite(core)
+    stats = _stats.setdefault(role, EngineStats())
+    _track_contention(core, stats, role)
+    _engines[role] = core
+    return engine
+
+
+def get_db_stats() -> Dict[str, Dict[str, float]]:
+    """Contention counters and pool usage for every engine in this process."""
+    result = {}
+    for role, engine in _engines.items():
+        pool = engine.pool
+        result[role] = {
+            **_stats[role].as_dict(),
+            "pool_checked_out": pool.checkedout(),
+            "pool_overflow": pool.overflow(),
+        }
+    return result
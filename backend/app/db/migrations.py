@@ -0,0 +1,380 @@
+"""Versioned schema migrations.
+
+Migrations run once each, in order, and are recorded in schema_version.
+Every migration must be safe to re-run (CREATE ... IF NOT EXISTS, checkfirst,
+_add_columns), so one interrupted halfway can simply be applied again.
+Append new migrations to MIGRATIONS; never edit or reorder ones that have
+shipped. Migrations spell out their tables instead of using the models, so
+what they create does not change as the models do.
+
+Apply them with `python migrate.py` from the repository root. The API, the
+bot and the admin CLI call check_schema() and refuse to start until the
+database is up to date.
+"""
+import json
+import logging
+from typing import Callable, List, NamedTuple
+
+from sqlalchemy import (
+    BigInteger, Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text,
+    TIMESTAMP, inspect, select, text
+)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql import func
+
+from .seed import SOLAR_PANEL_QUIZ
+from .session import engine as default_engine
+
+logger = logging.getLogger(__name__)
+
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime(timezone=True), server_default=func.now()),
+)
+
+
+class SchemaOutdated(Exception):
+    """Raised at startup when the database is missing migrations."""
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+def _true(conn: Connection) -> str:
+    """Boolean literal as SQLAlchemy renders `column == True`, so partial indexes match queries."""
+    return "true" if conn.dialect.supports_native_boolean else "1"
+
+
+def _create_indexes(conn: Connection, *statements: str):
+    """Run CREATE INDEX statements, skipping indexes that already exist."""
+    for statement in statements:
+        conn.execute(text(statement.replace("CREATE INDEX", "CREATE INDEX IF NOT EXISTS", 1)))
+
+
+def _create_tables(conn: Connection, metadata: MetaData, *names: str):
+    """Create the named tables of `metadata` that do not exist yet.
+
+    Other tables in `metadata` only stand in for foreign key targets.
+    """
+    metadata.create_all(conn, tables=[metadata.tables[name] for name in names])
+
+
+def _add_columns(conn: Connection, table: str, *columns: str):
+    """ALTER TABLE ... ADD COLUMN for each "<name> <type>" the table does not have yet."""
+    existing = {column["name"] for column in inspect(conn).get_columns(table)}
+    for column in columns:
+        if column.split()[0] not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column}"))
+
+
+def _baseline(conn: Connection):
+    """The schema as it was before this runner.
+
+    Databases created before the runner got these tables from the API's
+    create_all and the scripts in db/migrations/; for them this is a no-op.
+    """
+    metadata = MetaData()
+    Table(
+        "users", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("telegram_id", BigInteger, unique=True, nullable=False, index=True),
+        Column("username", String),
+        Column("kyc", Boolean),
+        Column("wallet_address", String),
+        Column("private_key", String),
+        Column("full_name", String),
+        Column("birthday", String),
+        Column("phone", String),
+        Column("email", String),
+    )
+    Table(
+        "quizzes", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("name", String, nullable=False),
+        Column("reward_amount", String, nullable=False),
+        Column("eth_reward_amount", String, nullable=False),
+    )
+    Table(
+        "user_quiz_completions", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("user_id", Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        Column("quiz_id", Integer, ForeignKey("quizzes.id"), nullable=False),
+        Column("created_at", TIMESTAMP, server_default=func.now()),
+        Column("score", Integer, nullable=False),
+        Column("passed", Boolean, nullable=False),
+        Column("nft_token_id", String),
+        Column("nft_transaction_hash", String),
+    )
+    Table(
+        "nft_metadata", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("quiz_id", Integer, ForeignKey("quizzes.id"), nullable=False),
+        Column("name", String, nullable=False),
+        Column("description", Text, nullable=False),
+        Column("image_url", String, nullable=False),
+        Column("attributes", Text, nullable=False),
+        Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    )
+    metadata.create_all(conn)
+
+
+def _hot_query_indexes(conn: Connection):
+    _create_indexes(
+        conn,
+        # KYC listings filter on kyc and page by id
+        "CREATE INDEX ix_users_kyc_id ON users (kyc, id)",
+        "CREATE INDEX ix_users_wallet_address ON users (wallet_address)",
+        "CREATE INDEX ix_users_username_lower ON users (lower(username), id)",
+        # Partial: only passed attempts, which is all has_passed_quiz and segments look for
+        "CREATE INDEX ix_user_quiz_completions_passed ON user_quiz_completions (user_id, quiz_id) "
+        f"WHERE passed = {_true(conn)}",
+        "CREATE INDEX ix_nft_metadata_quiz_id ON nft_metadata (quiz_id)",
+        "CREATE INDEX ix_quizzes_name ON quizzes (name)",
+    )
+
+
+def _recipient_picker_index(conn: Connection):
+    # With ix_users_kyc_id in place the planner filtered on kyc and sorted;
+    # leading with kyc lets one index serve the filter, the range and the order.
+    _create_indexes(conn, "CREATE INDEX ix_users_kyc_username ON users (kyc, lower(username), id)")
+    conn.execute(text("DROP INDEX IF EXISTS ix_users_username_lower"))
+
+
+def _bot_persistence(conn: Connection):
+    metadata = MetaData()
+    Table(
+        "bot_conversations", metadata,
+        Column("name", String, primary_key=True),
+        Column("key", String, primary_key=True),
+        Column("state", Text, nullable=False),
+        Column("updated_at", DateTime(timezone=True), server_default=func.now()),
+    )
+    Table(
+        "bot_user_data", metadata,
+        Column("user_id", BigInteger, primary_key=True),
+        Column("data", Text, nullable=False),
+        Column("updated_at", DateTime(timezone=True), server_default=func.now()),
+    )
+    _create_tables(conn, metadata, "bot_conversations", "bot_user_data")
+
+
+def _scheduled_jobs(conn: Connection):
+    metadata = MetaData()
+    jobs = Table(
+        "scheduled_jobs", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("kind", String, nullable=False),
+        Column("payload", Text, nullable=False),
+        Column("idempotency_key", String, unique=True),
+        Column("status", String, nullable=False),
+        Column("run_at", DateTime, nullable=False, server_default=func.now()),
+        Column("attempts", Integer, nullable=False),
+        Column("max_attempts", Integer, nullable=False),
+        Column("retry_base_delay", Float, nullable=False),
+        Column("retry_max_delay", Float, nullable=False),
+        Column("lease_owner", String),
+        Column("lease_expires_at", DateTime),
+        Column("last_error", Text),
+        Column("created_at", DateTime(timezone=True), server_default=func.now()),
+        Column("updated_at", DateTime(timezone=True), server_default=func.now()),
+    )
+    Index("ix_scheduled_jobs_status_run_at", jobs.c.status, jobs.c.run_at)
+    _create_tables(conn, metadata, "scheduled_jobs")
+
+
+def _user_cache_invalidations(conn: Connection):
+    metadata = MetaData()
+    Table(
+        "user_cache_invalidations", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("telegram_id", BigInteger, nullable=False),
+        Column("created_at", DateTime(timezone=True), server_default=func.now(), index=True),
+    )
+    _create_tables(conn, metadata, "user_cache_invalidations")
+
+
+def _quiz_questions(conn: Connection):
+    _add_columns(conn, "quizzes", "training_text TEXT", "updated_at TIMESTAMP")
+    conn.execute(text("UPDATE quizzes SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL"))
+
+    metadata = MetaData()
+    Table("quizzes", metadata, Column("id", Integer, primary_key=True))
+    Table(
+        "quiz_questions", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("quiz_id", Integer, ForeignKey("quizzes.id", ondelete="CASCADE"), nullable=False, index=True),
+        Column("position", Integer, nullable=False),
+        Column("text", Text, nullable=False),
+        Column("options", Text, nullable=False),
+        Column("correct_option", Integer, nullable=False),
+        Column("updated_at", TIMESTAMP, server_default=func.now()),
+    )
+    _create_tables(conn, metadata, "quiz_questions")
+
+
+def _payouts(conn: Connection):
+    metadata = MetaData()
+    Table("user_quiz_completions", metadata, Column("id", Integer, primary_key=True))
+    Table(
+        "payouts", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("idempotency_key", String, unique=True, nullable=False),
+        Column("completion_id", Integer, ForeignKey("user_quiz_completions.id", ondelete="CASCADE"),
+               nullable=False),
+        Column("kind", String, nullable=False),
+        Column("chat_id", BigInteger, nullable=False),
+        Column("recipient_address", String, nullable=False),
+        Column("amount", String),
+        Column("payload", Text),
+        Column("status", String, nullable=False, index=True),
+        Column("attempts", Integer, nullable=False),
+        Column("next_attempt_at", DateTime, server_default=func.now()),
+        Column("tx_hash", String),
+        Column("result", Text),
+        Column("last_error", Text),
+        Column("claimed_by", String),
+        Column("claimed_until", DateTime),
+        Column("created_at", DateTime(timezone=True), server_default=func.now()),
+        Column("updated_at", DateTime(timezone=True), server_default=func.now()),
+    )
+    _create_tables(conn, metadata, "payouts")
+
+
+def _payout_batches(conn: Connection):
+    metadata = MetaData()
+    Table(
+        "payout_batches", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("size", Integer, nullable=False),
+        Column("total_amount", String, nullable=False),
+        Column("status", String, nullable=False),
+        Column("tx_hash", String),
+        Column("last_error", Text),
+        Column("created_at", DateTime(timezone=True), server_default=func.now()),
+        Column("updated_at", DateTime(timezone=True), server_default=func.now()),
+    )
+    _create_tables(conn, metadata, "payout_batches")
+    _add_columns(conn, "payouts", "batch_id INTEGER REFERENCES payout_batches(id)")
+    _add_columns(conn, "user_quiz_completions", "reward_transaction_hash VARCHAR")
+
+
+def _broadcasts(conn: Connection):
+    metadata = MetaData()
+    Table(
+        "broadcasts", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("text", Text, nullable=False),
+        Column("parse_mode", String),
+        Column("segment", Text, nullable=False),
+        Column("status", String, nullable=False, index=True),
+        Column("cursor", Integer, nullable=False),
+        Column("total", Integer, nullable=False),
+        Column("sent", Integer, nullable=False),
+        Column("failed", Integer, nullable=False),
+        Column("created_at", DateTime(timezone=True), server_default=func.now()),
+        Column("updated_at", DateTime(timezone=True), server_default=func.now()),
+        Column("completed_at", DateTime(timezone=True)),
+        Column("claimed_by", String),
+        Column("claimed_until", DateTime),
+    )
+    _create_tables(conn, metadata, "broadcasts")
+
+
+def _solar_panel_quiz(conn: Connection):
+    """The quiz init_db.py and insert_quiz_questions.py used to load, unless it is there already."""
+    quiz = SOLAR_PANEL_QUIZ
+    find = text("SELECT id FROM quizzes WHERE name = :name ORDER BY id")
+    quiz_id = conn.execute(find, {"name": quiz["name"]}).scalar()
+    if quiz_id is None:
+        conn.execute(
+            text(
+                "INSERT INTO quizzes (name, reward_amount, eth_reward_amount, training_text, updated_at) "
+                "VALUES (:name, :reward_amount, :eth_reward_amount, :training_text, CURRENT_TIMESTAMP)"
+            ),
+            {key: quiz[key] for key in ("name", "reward_amount", "eth_reward_amount", "training_text")}
+        )
+        quiz_id = conn.execute(find, {"name": quiz["name"]}).scalar()
+    else:
+        conn.execute(
+            text(
+                "UPDATE quizzes SET training_text = :training_text, updated_at = CURRENT_TIMESTAMP "
+                "WHERE id = :id AND training_text IS NULL"
+            ),
+            {"id": quiz_id, "training_text": quiz["training_text"]}
+        )
+
+    has_questions = conn.execute(
+        text("SELECT 1 FROM quiz_questions WHERE quiz_id = :id"), {"id": quiz_id}
+    ).first()
+    if has_questions is None:
+        conn.execute(
+            text(
+                "INSERT INTO quiz_questions (quiz_id, position, text, options, correct_option) "
+                "VALUES (:quiz_id, :position, :text, :options, :correct_option)"
+            ),
+            [
+                {"quiz_id": quiz_id, "position": position, "text": question["text"],
+                 "options": json.dumps(question["options"]), "correct_option": question["correct_option"]}
+                for position, question in enumerate(quiz["questions"])
+            ]
+        )
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline", _baseline),
+    Migration(2, "hot query indexes", _hot_query_indexes),
+    Migration(3, "recipient picker index", _recipient_picker_index),
+    Migration(4, "bot persistence", _bot_persistence),
+    Migration(5, "scheduled jobs", _scheduled_jobs),
+    Migration(6, "user cache invalidations", _user_cache_invalidations),
+    Migration(7, "quiz questions", _quiz_questions),
+    Migration(8, "payouts", _payouts),
+    Migration(9, "payout batches", _payout_batches),
+    Migration(10, "broadcasts", _broadcasts),
+    Migration(11, "solar panel quiz", _solar_panel_quiz),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(conn: Connection) -> int:
+    """Highest applied migration, or 0 if the runner has never been used."""
+    if not inspect(conn).has_table(schema_version.name):
+        return 0
+    return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def upgrade(engine: Engine = default_engine) -> int:
+    """Apply pending migrations, each in its own transaction. Returns the new version."""
+    with engine.begin() as conn:
+        schema_version.create(conn, checkfirst=True)
+        version = current_version(conn)
+
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        logger.info(f"Applying migration {migration.version}: {migration.name}")
+        with engine.begin() as conn:
+            migration.upgrade(conn)
+            conn.execute(schema_version.insert().values(version=migration.version, name=migration.name))
+        version = migration.version
+    return version
+
+
+def check_schema(engine: Engine = default_engine):
+    """Raise SchemaOutdated unless every migration has been applied."""
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version < LATEST_VERSION:
+        raise SchemaOutdated(
+            f"Database schema is at version {version}, expected {LATEST_VERSION}. "
+            "Run `python migrate.py` from the repository root."
+        )
+    if version > LATEST_VERSION:
+        logger.warning(f"Database schema version {version} is newer than this code ({LATEST_VERSION})")
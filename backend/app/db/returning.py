@@ -0,0 +1,34 @@
+"""INSERT ... RETURNING where the database supports it.
+
+PostgreSQL hands back the inserted row in the same round trip. SQLAlchemy
+1.4 cannot compile RETURNING for SQLite, so there the row is read back by
+primary key, which is what flush() + refresh() cost before.
+"""
+from sqlalchemy import Table, insert, select
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+
+def _supports_returning(dialect) -> bool:
+    return getattr(dialect, "full_returning", False)
+
+
+def insert_returning(db: Session, table: Table, values: dict, *columns) -> Row:
+    """Insert one row and return `columns` of it (all columns by default)."""
+    columns = columns or tuple(table.c)
+    stmt = insert(table).values(**values)
+    if _supports_returning(db.get_bind().dialect):
+        return db.execute(stmt.returning(*columns)).one()
+    pk = db.execute(stmt).inserted_primary_key[0]
+    return db.execute(select(*columns).where(table.c.id == pk)).one()
+
+
+async def insert_returning_async(db: AsyncSession, table: Table, values: dict, *columns) -> Row:
+    """Async version of insert_returning()."""
+    columns = columns or tuple(table.c)
+    stmt = insert(table).values(**values)
+    if _supports_returning(db.bind.dialect):
+        return (await db.execute(stmt.returning(*columns))).one()
+    pk = (await db.execute(stmt)).inserted_primary_key[0]
+    return (await db.execute(select(*columns).where(table.c.id == pk))).one()
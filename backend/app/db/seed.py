@@ -0,0 +1,59 @@
+"""Content loaded by data migrations (see migrations.py); frozen like the migrations themselves."""
+
+SOLAR_PANEL_QUIZ = {
+    "name": "Solar Panel Cleaning",
+    "reward_amount": "1.0",
+    "eth_reward_amount": "0.00001",
+    "training_text": """🌞 Solar Panel Cleaning Guide
+
+Safety First:
+• Turn off your solar panel system
+• Stay on the ground - use long-handled tools
+• Work in early morning or late afternoon
+
+Cleaning Steps:
+1. Mix mild soap with water (or use soap-free brushes)
+2. Use soft-bristle brush with long handle
+3. Gently clean panel surface
+4. Rinse with gentle spray
+
+❌ Never Use:
+• Harsh chemicals
+• Pressure washers
+• Abrasive tools
+
+❄️ For Snow:
+• Use soft roof rake with plastic blade
+• Start from lower edge
+• When in doubt, let nature do the work
+""",
+    "questions": [
+        {
+            "text": "When is the best time to clean solar panels?",
+            "options": [
+                "During the hottest part of the day",
+                "Early morning or late afternoon",
+                "Right after it rains",
+            ],
+            "correct_option": 1,
+        },
+        {
+            "text": "What should you avoid using when cleaning solar panels?",
+            "options": [
+                "Soft-bristle brush",
+                "Mild, biodegradable soap",
+                "Pressure washer",
+            ],
+            "correct_option": 2,
+        },
+        {
+            "text": "How should you remove snow from solar panels?",
+            "options": [
+                "Use a soft roof rake with a plastic blade",
+                "Pour hot water over the panels",
+                "Scrape with a metal shovel",
+            ],
+            "correct_option": 0,
+        },
+    ],
+}
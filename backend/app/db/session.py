@@ -1,20 +1,12 @@
-from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-import os
 
-from ..config import get_settings
+from .engine import create_db_engine, resolve_database_url
 
-settings = get_settings()
+# Settings.DATABASE_URL, with relative SQLite paths anchored at the project root
+DATABASE_URL = resolve_database_url()
 
-# Ensure SQLite file is created in the correct directory
-db_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../base-hackathon.db"))
-DATABASE_URL = f"sqlite:///{db_path}"
-
-engine = create_engine(
-    DATABASE_URL, 
-    connect_args={"check_same_thread": False}  # Needed for SQLite
-)
+engine = create_db_engine("api")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -1,20 +1,28 @@
-from fastapi import FastAPI, Request
+import time
+
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from .api.v1 import users
-from .db.session import engine
-from .models.user import Base
+from .api.v1 import users, telegram, broadcasts
 from .db.health import wait_for_db
-from .bot.bot import create_application
+from .db.migrations import check_schema
+from .db.async_session import dispose_async_engine
+from .bot.webhook import start_webhook_ingress, stop_webhook_ingress
 from .config import get_settings
+from .metrics import API_REQUEST_SECONDS, ERRORS, register_component_stats, render_latest
 from .services.backend_wallet import initialize_backend_wallet
+from .services.wallet_wrapper import shutdown_sidecar_pool
+from .services.nonce_manager import shutdown_nonce_managers
+from .services.balances import shutdown_balance_service
+from .services.notifications import start_notification_dispatcher, stop_notification_dispatcher
+from .services.broadcasts import start_broadcast_runner, stop_broadcast_runner
 import asyncio
 
 # Wait for database to be ready
 wait_for_db()
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Refuse to serve against a schema missing migrations (python migrate.py)
+check_schema()
 
 app = FastAPI(title="Hackathon API")
 
@@ -22,6 +30,51 @@ app = FastAPI(title="Hackathon API")
 async def startup_event():
     """Initialize backend wallet on startup."""
     await initialize_backend_wallet()
+    register_component_stats()
+    settings = get_settings()
+    if settings.BOT_MODE == "webhook":
+        await start_webhook_ingress()  # Also starts the dispatcher on the bot's own client
+    if settings.TELEGRAM_BOT_TOKEN:
+        await start_notification_dispatcher()
+        await start_broadcast_runner()  # Resumes broadcasts interrupted by a restart
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the bot, background senders, wallet sidecar workers and database pools."""
+    await stop_broadcast_runner()
+    await stop_webhook_ingress()
+    await stop_notification_dispatcher()
+    await shutdown_nonce_managers()
+    await shutdown_sidecar_pool()
+    await shutdown_balance_service()
+    await dispose_async_engine()
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        if status >= 500:
+            ERRORS.labels("api").inc()
+        # Label by route template so /users/{telegram_id} is one series
+        route = _route_paths().get(request.scope.get("endpoint"), "unmatched")
+        API_REQUEST_SECONDS.labels(request.method, route, status).observe(time.perf_counter() - start)
+
+
+_route_path_cache = {}
+
+
+def _route_paths():
+    if not _route_path_cache:
+        _route_path_cache.update(
+            (route.endpoint, route.path) for route in app.routes if hasattr(route, "endpoint")
+        )
+    return _route_path_cache
 
 # Configure CORS
 app.add_middleware(
@@ -34,6 +87,8 @@ app.add_middleware(
 
 # Include routers
 app.include_router(users.router, prefix="/api/v1/users", tags=["users"])
+app.include_router(telegram.router, prefix="/api/v1/telegram", tags=["telegram"])
+app.include_router(broadcasts.router, prefix="/api/v1/broadcasts", tags=["broadcasts"])
 
 
 @app.get("/")
@@ -41,8 +96,14 @@ async def root():
     return {"message": "Welcome to Hackathon API"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_latest()
+    return Response(body, media_type=content_type)
+
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
-# API server only - bot runs separately via run_bot.py
+# With BOT_MODE=polling (default) the bot runs separately via run_bot.py
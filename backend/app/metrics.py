@@ -0,0 +1,143 @@
+"""Prometheus metrics shared by the API and bot processes.
+
+The API serves them at /metrics. The polling bot serves its own on
+BOT_METRICS_PORT; in webhook mode the bot runs inside the API process and
+shows up on the API's /metrics.
+
+Histograms are observed inline (a lock and a bisect per observation), so
+they stay on in production. The stats() counters that components already
+keep are read only when Prometheus scrapes, through register_stats().
+"""
+import logging
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest, start_http_server
+from prometheus_client.core import REGISTRY, GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Node.js and RPC calls include waiting for transactions, hence the long tail
+_CALL_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+_QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+BOT_HANDLER_SECONDS = Histogram(
+    "bot_handler_duration_seconds", "Time spent handling one update, by update type", ["update"]
+)
+BOT_UPDATE_WAIT_SECONDS = Histogram(
+    "bot_update_queue_wait_seconds", "Time an update waited for earlier updates from the same user"
+)
+API_REQUEST_SECONDS = Histogram(
+    "api_request_duration_seconds", "API request duration", ["method", "route", "status"]
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds", "Statement execution time, by engine role", ["role"], buckets=_QUERY_BUCKETS
+)
+CALL_SECONDS = Histogram(
+    "external_call_duration_seconds", "Node.js sidecar, subprocess and RPC call duration",
+    ["service", "method"], buckets=_CALL_BUCKETS
+)
+TELEGRAM_REQUEST_SECONDS = Histogram(
+    "telegram_request_duration_seconds", "Bot API request duration", ["method"], buckets=_CALL_BUCKETS
+)
+ERRORS = Counter("errors_total", "Errors by component", ["component"])
+FLOOD_WAITS = Counter("telegram_flood_waits_total", "429 responses from the Bot API", ["method"])
+FLOOD_WAIT_SECONDS = Counter("telegram_flood_wait_seconds_total", "Seconds Telegram asked us to wait")
+
+
+class track_call:
+    """Time a call into CALL_SECONDS and count it in ERRORS if it raises.
+
+        with track_call("wallet", "sendTransaction"):
+            ...
+    """
+    __slots__ = ("_histogram", "_service", "_start")
+
+    def __init__(self, service: str, method: str):
+        self._histogram = CALL_SECONDS.labels(service, method)
+        self._service = service
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(time.perf_counter() - self._start)
+        if exc_type is not None:
+            ERRORS.labels(self._service).inc()
+        return False
+
+
+# component -> (provider, label); the provider returns stats() output, or
+# {label value: stats()} when a label is given, or None when not running
+_stats_providers: Dict[str, Tuple[Callable[[], Optional[dict]], Optional[str]]] = {}
+
+
+def register_stats(component: str, provider: Callable[[], Optional[dict]], label: Optional[str] = None):
+    """Export a component's stats() as `<component>_<key>` gauges at scrape time."""
+    _stats_providers[component] = (provider, label)
+
+
+class _StatsCollector:
+    def collect(self):
+        families: Dict[str, GaugeMetricFamily] = {}
+        for component, (provider, label) in list(_stats_providers.items()):
+            try:
+                stats = provider()
+            except Exception as e:
+                logger.warning(f"Could not collect {component} stats: {e}")
+                continue
+            if not stats:
+                continue
+            for label_value, values in (stats.items() if label else [(None, stats)]):
+                for key, value in values.items():
+                    if not isinstance(value, (int, float)):
+                        continue  # e.g. a nonce manager that has not synced yet
+                    name = f"{component}_{key}"
+                    family = families.get(name)
+                    if family is None:
+                        family = families[name] = GaugeMetricFamily(
+                            name, f"{component} {key}", labels=[label] if label else []
+                        )
+                    family.add_metric([str(label_value)] if label else [], value)
+        return list(families.values())
+
+
+REGISTRY.register(_StatsCollector())
+
+
+def register_component_stats():
+    """Export the stats() of every component this codebase runs in-process."""
+    from .db.async_session import get_pool_stats
+    from .db.engine import get_db_stats
+    from .services import balances, nonce_manager, wallet_wrapper
+    from .services.notifications import get_notification_dispatcher
+    from .services.scheduler import get_job_scheduler
+    from .services.user_cache import user_cache
+    from .bot.webhook import get_webhook_ingress
+
+    def running(getter):
+        return lambda: getter().stats() if getter() is not None else None
+
+    register_stats("db", get_db_stats, label="role")
+    register_stats("db_async", get_pool_stats)
+    register_stats("notifications", running(get_notification_dispatcher))
+    register_stats("jobs", running(get_job_scheduler))
+    register_stats("webhook", running(get_webhook_ingress))
+    register_stats("user_cache", user_cache.stats)
+    register_stats("wallet_sidecar", running(lambda: wallet_wrapper._pool))
+    register_stats("balances", running(lambda: balances._service))
+    register_stats("nonce", lambda: {
+        address: manager.stats() for address, manager in nonce_manager._managers.items()
+    }, label="address")
+
+
+def render_latest() -> Tuple[bytes, str]:
+    """Current metrics in the Prometheus text format, with its content type."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port: int):
+    """Serve /metrics from a background thread (used by the polling bot)."""
+    start_http_server(port)
+    logger.info(f"Serving metrics on port {port}")
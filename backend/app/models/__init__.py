@@ -1,2 +1,6 @@
-from .user import User
-from .quiz import Quiz, UserQuizCompletion
+from .user import User, UserCacheInvalidation
+from .quiz import Quiz, QuizQuestion, UserQuizCompletion
+from .payout import Payout, PayoutBatch
+from .broadcast import Broadcast
+from .bot_state import BotConversation, BotUserData
+from .scheduled_job import ScheduledJob
@@ -0,0 +1,23 @@
+"""Conversation states and user_data saved by the bot (see bot/persistence.py)."""
+from sqlalchemy import Column, String, Text, DateTime, BigInteger
+from sqlalchemy.sql import func
+from ..db.session import Base
+
+
+class BotConversation(Base):
+    """Current state of one ConversationHandler conversation; ended ones are deleted."""
+    __tablename__ = "bot_conversations"
+
+    name = Column(String, primary_key=True)  # ConversationHandler name
+    key = Column(String, primary_key=True)  # JSON list, e.g. [chat_id, user_id]
+    state = Column(Text, nullable=False)  # JSON
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class BotUserData(Base):
+    """context.user_data of one Telegram user, as JSON."""
+    __tablename__ = "bot_user_data"
+
+    user_id = Column(BigInteger, primary_key=True)  # Telegram user id
+    data = Column(Text, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
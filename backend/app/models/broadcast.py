@@ -0,0 +1,30 @@
+"""Broadcast models."""
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy.sql import func
+from ..db.session import Base
+
+# Broadcast statuses: queued -> running -> completed | cancelled
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+
+
+class Broadcast(Base):
+    """A message sent to every user in a segment, resumable from `cursor`."""
+    __tablename__ = "broadcasts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    text = Column(Text, nullable=False)
+    parse_mode = Column(String, nullable=True)
+    segment = Column(Text, nullable=False)  # JSON segment filter
+    status = Column(String, nullable=False, default=QUEUED, index=True)
+    cursor = Column(Integer, nullable=False, default=0)  # Last users.id fully processed
+    total = Column(Integer, nullable=False, default=0)  # Matching users when created
+    sent = Column(Integer, nullable=False, default=0)
+    failed = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    claimed_by = Column(String, nullable=True)  # Runner sending it while status is running
+    claimed_until = Column(DateTime, nullable=True)  # UTC; another runner may take over after this
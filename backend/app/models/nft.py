@@ -7,7 +7,7 @@ class NFTMetadata(Base):
     __tablename__ = "nft_metadata"
 
     id = Column(Integer, primary_key=True, index=True)
-    quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=False)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=False, index=True)
     name = Column(String, nullable=False)
     description = Column(Text, nullable=False)
     image_url = Column(String, nullable=False)
@@ -0,0 +1,53 @@
+"""Reward payout outbox models."""
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, BigInteger
+from sqlalchemy.sql import func
+from ..db.session import Base
+
+# Payout kinds
+ETH_REWARD = "eth_reward"
+NFT_BADGE = "nft_badge"
+
+# Payout statuses: queued -> submitted -> confirmed | failed
+QUEUED = "queued"
+SUBMITTED = "submitted"
+CONFIRMED = "confirmed"
+FAILED = "failed"
+
+
+class PayoutBatch(Base):
+    """One disperse transaction paying several ETH rewards at once."""
+    __tablename__ = "payout_batches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    size = Column(Integer, nullable=False)
+    total_amount = Column(String, nullable=False)  # ETH
+    status = Column(String, nullable=False, default=SUBMITTED)
+    tx_hash = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class Payout(Base):
+    """A reward owed for a quiz completion, drained by the payout worker."""
+    __tablename__ = "payouts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    idempotency_key = Column(String, unique=True, nullable=False)  # e.g. "eth_reward:<completion id>"
+    completion_id = Column(Integer, ForeignKey("user_quiz_completions.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String, nullable=False)
+    chat_id = Column(BigInteger, nullable=False)  # Telegram chat to report the result to
+    recipient_address = Column(String, nullable=False)
+    amount = Column(String, nullable=True)  # ETH amount for eth_reward payouts
+    payload = Column(Text, nullable=True)  # JSON NFT metadata for nft_badge payouts
+    status = Column(String, nullable=False, default=QUEUED, index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, server_default=func.now())
+    claimed_by = Column(String, nullable=True)  # Worker holding the lease on a submitted payout
+    claimed_until = Column(DateTime, nullable=True)  # UTC; lease expiry, or when to check a receipt again
+    batch_id = Column(Integer, ForeignKey("payout_batches.id"), nullable=True)  # Set when paid in a batch
+    tx_hash = Column(String, nullable=True)
+    result = Column(Text, nullable=True)  # JSON result, e.g. minted token id
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
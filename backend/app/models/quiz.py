@@ -1,5 +1,5 @@
 """Quiz models."""
-from sqlalchemy import Column, Integer, String, Boolean, DECIMAL, ForeignKey, TIMESTAMP
+from sqlalchemy import Column, Integer, String, Boolean, DECIMAL, ForeignKey, TIMESTAMP, Text, Index
 from sqlalchemy.sql import func
 from ..db.session import Base
 
@@ -8,9 +8,24 @@ class Quiz(Base):
     __tablename__ = "quizzes"
     
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, nullable=False)
+    name = Column(String, nullable=False, index=True)
     reward_amount = Column(String, nullable=False)  # USDC reward amount as string
     eth_reward_amount = Column(String, nullable=False, default="0.00001")  # ETH reward
+    training_text = Column(Text, nullable=True)  # Shown before the first question
+    # Added by ALTER TABLE, which cannot give it a server default on SQLite
+    updated_at = Column(TIMESTAMP, default=func.now(), onupdate=func.now())
+
+class QuizQuestion(Base):
+    """Quiz question model."""
+    __tablename__ = "quiz_questions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    quiz_id = Column(Integer, ForeignKey("quizzes.id", ondelete="CASCADE"), nullable=False, index=True)
+    position = Column(Integer, nullable=False)  # Order within the quiz, starting at 0
+    text = Column(Text, nullable=False)
+    options = Column(Text, nullable=False)  # JSON list of answer strings
+    correct_option = Column(Integer, nullable=False)  # Index into options
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
 
 class UserQuizCompletion(Base):
     """User quiz completion model."""
@@ -24,6 +39,14 @@ class UserQuizCompletion(Base):
     passed = Column(Boolean, nullable=False)
     nft_token_id = Column(String)  # NFT token ID when minted
     nft_transaction_hash = Column(String)  # NFT minting transaction hash
+    reward_transaction_hash = Column(String)  # ETH reward transaction, shared by a payout batch
     
-    # Remove unique constraint to allow multiple attempts
-    __table_args__ = ()
+    # No unique constraint, to allow multiple attempts. Queries ask whether a
+    # user has passed, so only passed rows are indexed; keep `passed == True`
+    # in those queries so the planner can match the index condition.
+    __table_args__ = (
+        Index(
+            "ix_user_quiz_completions_passed", user_id, quiz_id,
+            sqlite_where=passed == True, postgresql_where=passed == True
+        ),
+    )
@@ -0,0 +1,34 @@
+"""Delayed jobs run by services/scheduler.py."""
+from sqlalchemy import Column, Float, Index, Integer, String, Text, DateTime
+from sqlalchemy.sql import func
+from ..db.session import Base
+
+# Job statuses: queued -> running -> (deleted on success) | queued again | failed
+QUEUED = "queued"
+RUNNING = "running"
+FAILED = "failed"
+
+
+class ScheduledJob(Base):
+    __tablename__ = "scheduled_jobs"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)  # Selects the handler registered with @job_handler
+    payload = Column(Text, nullable=False)  # JSON
+    idempotency_key = Column(String, unique=True, nullable=True)
+    status = Column(String, nullable=False, default=QUEUED)
+    run_at = Column(DateTime, nullable=False, server_default=func.now())  # UTC
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    retry_base_delay = Column(Float, nullable=False)  # Seconds, doubled after each failed attempt
+    retry_max_delay = Column(Float, nullable=False)
+    lease_owner = Column(String, nullable=True)  # Worker running the job
+    lease_expires_at = Column(DateTime, nullable=True)  # UTC; after this another worker may take it
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # Claiming looks for due queued jobs and lapsed leases
+        Index("ix_scheduled_jobs_status_run_at", status, run_at),
+    )
@@ -1,4 +1,5 @@
-from sqlalchemy import Boolean, Column, Integer, String, BigInteger, Text
+from sqlalchemy import Boolean, Column, Integer, String, BigInteger, Text, DateTime, Index
+from sqlalchemy.sql import func
 from ..db.session import Base
 
 
@@ -16,5 +17,21 @@ class User(Base):
     phone = Column(String, nullable=True)
     email = Column(String, nullable=True)
 
+    __table_args__ = (
+        Index("ix_users_kyc_id", kyc, id),
+        Index("ix_users_wallet_address", wallet_address),
+        # Recipient picker: paging and case-insensitive prefix search by username
+        Index("ix_users_kyc_username", kyc, func.lower(username), id),
+    )
+
     class Config:
         orm_mode = True
+
+
+class UserCacheInvalidation(Base):
+    """Change log polled by every process holding a user profile cache."""
+    __tablename__ = "user_cache_invalidations"
+
+    id = Column(Integer, primary_key=True)
+    telegram_id = Column(BigInteger, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Optional
+from pydantic import BaseModel
+
+
+class Segment(BaseModel):
+    kyc: Optional[bool] = None
+    passed_quiz: Optional[bool] = None
+    has_wallet: Optional[bool] = None
+
+
+class BroadcastCreate(BaseModel):
+    text: str
+    parse_mode: Optional[str] = None
+    segment: Segment = Segment()
+
+
+class Broadcast(BaseModel):
+    id: int
+    text: str
+    parse_mode: Optional[str] = None
+    segment: Segment
+    status: str
+    total: int
+    sent: int
+    failed: int
+    created_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
@@ -1,5 +1,5 @@
-from typing import Optional
-from pydantic import BaseModel
+from typing import List, Optional
+from pydantic import BaseModel, Field, root_validator
 
 
 class UserBase(BaseModel):
@@ -30,3 +30,37 @@ class User(UserBase):
 
 class UserInDB(User):
     pass
+
+
+class KycApprovalFilter(BaseModel):
+    """Pending users in id order; every pending user when left empty."""
+    after_id: int = 0
+    has_wallet: Optional[bool] = None
+    passed_quiz: Optional[bool] = None
+    limit: Optional[int] = Field(None, ge=1)
+
+
+class KycBulkApprove(BaseModel):
+    telegram_ids: Optional[List[int]] = None
+    filter: Optional[KycApprovalFilter] = None
+
+    @root_validator
+    def one_selection(cls, values):
+        if (values.get("telegram_ids") is None) == (values.get("filter") is None):
+            raise ValueError("Give either telegram_ids or filter")
+        return values
+
+
+class KycApprovalResult(BaseModel):
+    telegram_id: int
+    status: str  # approved, already_approved, not_found or failed
+    wallet_address: Optional[str] = None
+    error: Optional[str] = None
+
+
+class KycBulkApproveResult(BaseModel):
+    approved: int = 0
+    already_approved: int = 0
+    not_found: int = 0
+    failed: int = 0
+    results: List[KycApprovalResult] = []
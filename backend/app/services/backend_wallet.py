@@ -1,7 +1,11 @@
 """Backend wallet service for managing the system wallet."""
 import os
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
 from dotenv import load_dotenv, set_key
-from .wallet_wrapper import WalletService
+from .wallet_wrapper import WalletService, never_broadcast
+from .balances import format_eth, get_balance_service, invalidate_balances
+from .disperse import encode_disperse
+from .nonce_manager import NonceManager, get_nonce_manager, is_nonce_error
 import asyncio
 
 class BackendWalletService:
@@ -51,12 +55,91 @@ class BackendWalletService:
         if not wallet['address']:
             return None
         
-        result = await self.wallet_service.get_wallet_client(wallet['private_key'])
-        return result.get('balance', '0')
+        return format_eth(await get_balance_service().get_balance(wallet['address']))
 
     async def sendTransaction(self, private_key: str, to: str, amount: str):
-        """Send a transaction."""
-        return await self.wallet_service.send_transaction(private_key, to, amount)
+        """Send a transaction.
+
+        Sends from the backend wallet take their nonce from the local nonce
+        manager so concurrent payouts can be pipelined.
+        """
+        wallet = self.get_wallet_info()
+        if private_key != wallet['private_key']:
+            return await self.wallet_service.send_transaction(private_key, to, amount)
+
+        return await self._send_with_nonce(
+            lambda nonce: self.wallet_service.send_transaction(private_key, to, amount, nonce)
+        )
+
+    async def disperse(self, payments: List[Tuple[str, str]]) -> str:
+        """Pay several (address, ETH amount) pairs in one disperse contract call."""
+        contract = os.getenv('DISPERSE_CONTRACT_ADDRESS')
+        if not contract:
+            raise Exception("DISPERSE_CONTRACT_ADDRESS is not configured")
+        data, total_wei = encode_disperse(payments)
+        private_key = self.get_wallet_info()['private_key']
+        # The contract forwards the value, so the payees' balances change too
+        invalidate_balances(*(address for address, _ in payments))
+        return await self._send_with_nonce(
+            lambda nonce: self.wallet_service.send_contract_call(private_key, contract, total_wei, data, nonce)
+        )
+
+    async def mint_nft(self, recipient: str, metadata: Dict[str, Any]) -> str:
+        """Mint a badge from the backend wallet; returns the transaction hash once broadcast.
+
+        The mint takes its nonce from the nonce manager like every other
+        backend wallet send, so it never races a concurrent payout.
+        """
+        contract = os.getenv('NFT_CONTRACT_ADDRESS')
+        if not contract:
+            raise Exception("NFT_CONTRACT_ADDRESS is not configured")
+        private_key = self.get_wallet_info()['private_key']
+        return await self._send_with_nonce(
+            lambda nonce: self.wallet_service.mint_nft(private_key, contract, recipient, metadata, nonce)
+        )
+
+    async def _send_with_nonce(self, send: Callable[[int], Awaitable[str]]) -> str:
+        nonces = self.get_nonce_manager()
+        nonce = await nonces.allocate()
+        try:
+            tx_hash = await send(nonce)
+        except Exception as e:
+            if not (is_nonce_error(e) and never_broadcast(e)):
+                await self._send_failed(nonces, nonce, e)
+                raise
+            # Someone else used the account (e.g. the admin CLI); retry once from the chain's view
+            nonces.discard(nonce)
+            await nonces.resync()
+            nonce = await nonces.allocate()
+            try:
+                tx_hash = await send(nonce)
+            except Exception as e:
+                await self._send_failed(nonces, nonce, e)
+                raise
+        nonces.mark_sent(nonce)
+        return tx_hash
+
+    @staticmethod
+    async def _send_failed(nonces: NonceManager, nonce: int, error: Exception):
+        if never_broadcast(error):
+            nonces.release(nonce)
+        else:
+            # Reusing the nonce could replace a transaction that did go out
+            await nonces.maybe_sent(nonce)
+
+    def get_nonce_manager(self) -> NonceManager:
+        """Nonce manager for the backend wallet on the running loop."""
+        wallet = self.get_wallet_info()
+
+        async def get_nonce(block_tag: str) -> int:
+            return await self.wallet_service.get_transaction_count(wallet['address'], block_tag)
+
+        async def fill_gap(nonce: int) -> str:
+            return await self.wallet_service.send_transaction(
+                wallet['private_key'], wallet['address'], "0", nonce
+            )
+
+        return get_nonce_manager(wallet['address'], get_nonce, fill_gap)
 
 async def initialize_backend_wallet():
     """Initialize backend wallet if it doesn't exist."""
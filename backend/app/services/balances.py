@@ -0,0 +1,258 @@
+"""ETH balances read straight from the RPC node, batched and cached.
+
+Balance lookups used to start a Node.js call per address. Here they are
+plain `eth_getBalance` requests, and every lookup started in the same event
+loop iteration goes out together in one JSON-RPC batch (split at
+BALANCE_BATCH_SIZE). Results are cached per address for BALANCE_CACHE_TTL
+seconds, and concurrent lookups for an address share one request.
+
+Sending a transaction calls invalidate() for the addresses involved. Until
+the transaction is mined the balance is still moving, so for
+BALANCE_SETTLE_TIME seconds afterwards those addresses are re-read on every
+lookup instead of being cached.
+
+The service's HTTP client also serves other single reads through rpc(),
+such as polling for transaction receipts.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import httpx
+
+from ..config import get_settings
+from ..metrics import track_call
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RPC_URL = "https://sepolia.base.org"  # viem's default for baseSepolia, as the sidecar uses
+
+
+class RPCError(Exception):
+    """Raised when the RPC node fails a request."""
+
+
+class BalanceError(RPCError):
+    """Raised when the RPC node fails a balance lookup."""
+
+
+def format_eth(wei: int) -> str:
+    """Wei as a decimal ETH string without trailing zeros, like viem's formatEther."""
+    text = f"{Decimal(wei).scaleb(-18):f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return text
+
+
+class BalanceService:
+    def __init__(self, rpc_url: str, ttl: float, settle_time: float, batch_size: int,
+                 max_entries: int, timeout: float):
+        self.rpc_url = rpc_url
+        self.ttl = ttl
+        self.settle_time = settle_time
+        self.batch_size = batch_size
+        self.max_entries = max_entries
+        self._client = httpx.AsyncClient(timeout=timeout)
+        self._cache: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()  # address -> (wei, fetched at)
+        self._unsettled: Dict[str, float] = {}  # address -> monotonic time it may be cached again
+        self._generations: Dict[str, int] = {}  # Bumped by invalidate() to discard in-flight results
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._queued: List[str] = []
+        self._fetches: Set[asyncio.Task] = set()  # Referenced until done so close() can wait for them
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+        self.errors = 0
+
+    async def get_balance(self, address: str) -> int:
+        """Balance of `address` in wei."""
+        return (await self.get_balances([address]))[address]
+
+    async def get_balances(self, addresses: Iterable[str]) -> Dict[str, int]:
+        """Balances in wei keyed by the addresses as given; uncached ones cost one round trip."""
+        addresses = list(dict.fromkeys(addresses))
+        now = time.monotonic()
+        found: Dict[str, int] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        for address in addresses:
+            key = address.lower()
+            entry = self._cache.get(key)
+            if entry is not None and now - entry[1] < self.ttl:
+                self._cache.move_to_end(key)
+                found[address] = entry[0]
+                self.hits += 1
+            else:
+                waiting[address] = self._lookup(key)
+                self.misses += 1
+
+        if waiting:
+            # shield() so one caller giving up does not cancel a lookup others share
+            results = await asyncio.gather(*(asyncio.shield(future) for future in waiting.values()))
+            found.update(zip(waiting, results))
+        return {address: found[address] for address in addresses}
+
+    async def rpc(self, method: str, params: list):
+        """Send one JSON-RPC request and return its result."""
+        self.requests += 1
+        try:
+            with track_call("rpc", method):
+                response = await self._client.post(
+                    self.rpc_url, json={"jsonrpc": "2.0", "id": 1, "method": method, "params": params}
+                )
+                response.raise_for_status()
+                reply = response.json()
+        except Exception as e:
+            self.errors += 1
+            raise RPCError(f"{method} failed: {e}") from e
+        if "error" in reply:
+            self.errors += 1
+            raise RPCError(f"{method} failed: {reply['error']}")
+        return reply.get("result")
+
+    def invalidate(self, *addresses: Optional[str]):
+        """Forget cached balances after sending a transaction that touches `addresses`."""
+        settled_at = time.monotonic() + self.settle_time
+        for address in addresses:
+            if not address:
+                continue
+            key = address.lower()
+            self._cache.pop(key, None)
+            self._unsettled[key] = settled_at
+            self._generations[key] = self._generations.get(key, 0) + 1
+
+    def _lookup(self, key: str) -> asyncio.Future:
+        future = self._in_flight.get(key)
+        if future is not None:
+            return future
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._in_flight[key] = future
+        if not self._queued:
+            # Everything queued before the loop gets back to us shares the batch
+            loop.call_soon(self._flush)
+        self._queued.append(key)
+        return future
+
+    def _flush(self):
+        keys, self._queued = self._queued, []
+        batches = [keys[start:start + self.batch_size] for start in range(0, len(keys), self.batch_size)]
+        task = asyncio.ensure_future(self._fetch_all(batches))
+        self._fetches.add(task)
+        task.add_done_callback(self._fetches.discard)
+
+    async def _fetch_all(self, batches: List[List[str]]):
+        results = await asyncio.gather(*(self._fetch(keys) for keys in batches), return_exceptions=True)
+        for keys, result in zip(batches, results):
+            if isinstance(result, BaseException):
+                # A malformed reply _fetch did not expect; fail the lookups rather than leave them waiting
+                self.errors += 1
+                logger.error(f"Balance lookup for {len(keys)} addresses failed: {result!r}")
+                error = BalanceError(str(result))
+                for key in keys:
+                    self._resolve(key, error=error)
+
+    async def _fetch(self, keys: List[str]):
+        generations = {key: self._generations.get(key, 0) for key in keys}
+        payload = [
+            {"jsonrpc": "2.0", "id": index, "method": "eth_getBalance", "params": [key, "latest"]}
+            for index, key in enumerate(keys)
+        ]
+        try:
+            self.requests += 1
+            with track_call("rpc", "eth_getBalance"):
+                response = await self._client.post(self.rpc_url, json=payload)
+                response.raise_for_status()
+                replies = response.json()
+            if isinstance(replies, dict):
+                # Some nodes answer a rejected batch with a single error object
+                raise BalanceError(f"RPC error: {replies.get('error', replies)}")
+            by_id = {reply.get("id"): reply for reply in replies}
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Balance lookup for {len(keys)} addresses failed: {e}")
+            error = e if isinstance(e, BalanceError) else BalanceError(str(e))
+            for key in keys:
+                self._resolve(key, error=error)
+            return
+
+        now = time.monotonic()
+        for index, key in enumerate(keys):
+            reply = by_id.get(index, {})
+            if "result" not in reply:
+                self.errors += 1
+                self._resolve(key, error=BalanceError(f"RPC error for {key}: {reply.get('error')}"))
+                continue
+            wei = int(reply["result"], 16)
+            if generations[key] == self._generations.get(key, 0) and now >= self._unsettled.get(key, 0):
+                self._unsettled.pop(key, None)
+                self._store(key, wei, now)
+            self._resolve(key, wei=wei)
+
+    def _store(self, key: str, wei: int, now: float):
+        self._cache[key] = (wei, now)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def _resolve(self, key: str, wei: Optional[int] = None, error: Optional[Exception] = None):
+        future = self._in_flight.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(wei)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "cached": len(self._cache),
+            "in_flight": len(self._in_flight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "requests": self.requests,
+            "errors": self.errors,
+        }
+
+    async def close(self):
+        if self._fetches:
+            await asyncio.gather(*self._fetches, return_exceptions=True)
+        await self._client.aclose()
+
+
+_service: Optional[BalanceService] = None
+_service_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_balance_service() -> BalanceService:
+    """Return the balance service for the running loop."""
+    global _service, _service_loop
+    loop = asyncio.get_running_loop()
+    if _service is None or _service_loop is not loop:
+        settings = get_settings()
+        _service = BalanceService(
+            settings.BASE_SEPOLIA_RPC_URL or DEFAULT_RPC_URL,
+            ttl=settings.BALANCE_CACHE_TTL,
+            settle_time=settings.BALANCE_SETTLE_TIME,
+            batch_size=settings.BALANCE_BATCH_SIZE,
+            max_entries=settings.BALANCE_CACHE_MAX_SIZE,
+            timeout=settings.BALANCE_RPC_TIMEOUT
+        )
+        _service_loop = loop
+    return _service
+
+
+def invalidate_balances(*addresses: Optional[str]):
+    """Invalidate cached balances, if a balance service is running on this loop."""
+    if _service is not None:
+        _service.invalidate(*addresses)
+
+
+async def shutdown_balance_service():
+    global _service, _service_loop
+    if _service is not None:
+        await _service.close()
+    _service = None
+    _service_loop = None
@@ -0,0 +1,211 @@
+"""Background sender for segment broadcasts."""
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import and_, exists, or_, select, update
+
+from ..config import get_settings
+from ..db.async_session import unit_of_work
+from ..models.broadcast import Broadcast, QUEUED, RUNNING, COMPLETED
+from ..models.quiz import UserQuizCompletion
+from ..models.user import User
+from .notifications import get_notification_dispatcher
+
+logger = logging.getLogger(__name__)
+
+
+def segment_filter(segment: dict):
+    """SQL condition on User for a segment; works for sync and async queries."""
+    clauses = []
+    if segment.get("kyc") is not None:
+        clauses.append(User.kyc == True if segment["kyc"] else or_(User.kyc.is_(False), User.kyc.is_(None)))
+    if segment.get("has_wallet") is not None:
+        clauses.append(User.wallet_address.isnot(None) if segment["has_wallet"] else User.wallet_address.is_(None))
+    if segment.get("passed_quiz") is not None:
+        passed = exists().where(UserQuizCompletion.user_id == User.id, UserQuizCompletion.passed == True)
+        clauses.append(passed if segment["passed_quiz"] else ~passed)
+    return and_(True, *clauses)
+
+
+class BroadcastRunner:
+    """Works through queued broadcasts one chunk of users at a time.
+
+    Recipients are read by keyset pagination on users.id, so memory is
+    bounded by `chunk_size`. A chunk is handed to the notification
+    dispatcher, which sends as fast as Telegram allows. The cursor and
+    counters are committed once every message in the chunk is resolved.
+    After a restart the broadcast resumes at the cursor, so at most one
+    chunk is sent twice.
+
+    Every API process runs a runner, so a broadcast is leased to one of
+    them by a conditional UPDATE and the lease is renewed at each
+    checkpoint. Another runner takes the broadcast over only once the
+    lease has lapsed, so `lease_time` must exceed the time one chunk takes.
+    """
+
+    def __init__(self, chunk_size: int, poll_interval: float, lease_time: float):
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.lease_time = lease_time
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _lease_until(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.lease_time)
+
+    def _owned(self, broadcast_id: int):
+        return and_(Broadcast.id == broadcast_id, Broadcast.status == RUNNING, Broadcast.claimed_by == self.owner)
+
+    async def _run(self):
+        while True:
+            try:
+                broadcast_id = await self._claim()
+                if broadcast_id is not None:
+                    await self._process(broadcast_id)
+                    continue
+            except Exception as e:
+                logger.error(f"Error running broadcasts: {e}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self) -> Optional[int]:
+        """Lease the oldest queued broadcast, or a running one whose runner stopped renewing."""
+        now = datetime.utcnow()
+        claimable = or_(
+            Broadcast.status == QUEUED,
+            and_(Broadcast.status == RUNNING,
+                 or_(Broadcast.claimed_until.is_(None), Broadcast.claimed_until < now)),
+        )
+        async with unit_of_work() as db:
+            candidates = (await db.execute(
+                select(Broadcast.id).where(claimable).order_by(Broadcast.id).limit(5)
+            )).scalars().all()
+            for broadcast_id in candidates:
+                claimed = await db.execute(
+                    update(Broadcast)
+                    .where(Broadcast.id == broadcast_id, claimable)
+                    .values(status=RUNNING, claimed_by=self.owner, claimed_until=self._lease_until())
+                )
+                await db.commit()
+                if claimed.rowcount == 1:
+                    return broadcast_id
+        return None
+
+    async def _process(self, broadcast_id: int):
+        async with unit_of_work() as db:
+            broadcast = await db.get(Broadcast, broadcast_id)
+            logger.info(f"Running broadcast {broadcast_id} from user id {broadcast.cursor}")
+
+        condition = segment_filter(json.loads(broadcast.segment))
+        cursor = broadcast.cursor
+        while True:
+            async with unit_of_work() as db:
+                renewed = await db.execute(
+                    update(Broadcast).where(self._owned(broadcast_id)).values(claimed_until=self._lease_until())
+                )
+                await db.commit()
+                if renewed.rowcount == 0:
+                    status = (await db.execute(
+                        select(Broadcast.status).where(Broadcast.id == broadcast_id)
+                    )).scalar()
+                    logger.info(f"Broadcast {broadcast_id} stopped with status {status} or was taken over")
+                    return
+
+                chunk = (await db.execute(
+                    select(User.id, User.telegram_id)
+                    .where(User.id > cursor, condition)
+                    .order_by(User.id)
+                    .limit(self.chunk_size)
+                )).all()
+
+            if not chunk:
+                async with unit_of_work() as db:
+                    await db.execute(
+                        update(Broadcast)
+                        .where(self._owned(broadcast_id))
+                        .values(status=COMPLETED, completed_at=datetime.utcnow(), claimed_by=None, claimed_until=None)
+                    )
+                    await db.commit()
+                logger.info(f"Broadcast {broadcast_id} completed")
+                return
+
+            results = await self._send_chunk(broadcast, [telegram_id for _, telegram_id in chunk])
+            cursor = chunk[-1][0]
+            delivered = sum(results)
+            async with unit_of_work() as db:
+                # Checkpoint and renew the lease; a cancelled broadcast still records what went out
+                checkpoint = await db.execute(
+                    update(Broadcast)
+                    .where(Broadcast.id == broadcast_id, Broadcast.claimed_by == self.owner)
+                    .values(
+                        cursor=cursor,
+                        sent=Broadcast.sent + delivered,
+                        failed=Broadcast.failed + len(results) - delivered,
+                        claimed_until=self._lease_until()
+                    )
+                )
+                await db.commit()
+            if checkpoint.rowcount == 0:
+                logger.warning(f"Broadcast {broadcast_id} was taken over by another runner after its lease lapsed")
+                return
+
+    async def _send_chunk(self, broadcast: Broadcast, chat_ids: List[int]) -> List[bool]:
+        dispatcher = get_notification_dispatcher()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for chat_id in chat_ids:
+            future = loop.create_future()
+            dispatcher.send(
+                chat_id, broadcast.text, parse_mode=broadcast.parse_mode,
+                on_result=lambda error, f=future: f.done() or f.set_result(error is None)
+            )
+            futures.append(future)
+        return await asyncio.gather(*futures)
+
+
+_runner: Optional[BroadcastRunner] = None
+
+
+def get_broadcast_runner() -> Optional[BroadcastRunner]:
+    return _runner
+
+
+async def start_broadcast_runner() -> BroadcastRunner:
+    """Start sending queued broadcasts, resuming any interrupted ones."""
+    global _runner
+    settings = get_settings()
+    _runner = BroadcastRunner(
+        settings.BROADCAST_CHUNK_SIZE, settings.BROADCAST_POLL_INTERVAL, settings.BROADCAST_LEASE_TIME
+    )
+    await _runner.start()
+    return _runner
+
+
+async def stop_broadcast_runner():
+    global _runner
+    if _runner is not None:
+        await _runner.stop()
+    _runner = None
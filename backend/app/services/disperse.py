@@ -0,0 +1,29 @@
+"""Calldata encoding for the disperse contract (see disperse_deploy.ts)."""
+from decimal import Decimal
+from typing import List, Tuple
+
+WEI_PER_ETH = Decimal(10) ** 18
+MAX_AMOUNT_WEI = 2 ** 96 - 1
+
+
+def to_wei(amount: str) -> int:
+    wei = Decimal(amount) * WEI_PER_ETH
+    if wei != wei.to_integral_value() or wei < 0:
+        raise ValueError(f"Invalid ETH amount: {amount}")
+    return int(wei)
+
+
+def encode_disperse(payments: List[Tuple[str, str]]) -> Tuple[str, int]:
+    """Encode (address, ETH amount) pairs; returns calldata hex and total wei.
+
+    Each recipient is one 32-byte word: amount in wei (uint96) << 160 | address.
+    """
+    words = []
+    total = 0
+    for address, amount in payments:
+        wei = to_wei(amount)
+        if wei > MAX_AMOUNT_WEI:
+            raise ValueError(f"Amount too large for a disperse payment: {amount}")
+        words.append(f"{(wei << 160) | int(address, 16):064x}")
+        total += wei
+    return "0x" + "".join(words), total
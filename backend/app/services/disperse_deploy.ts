@@ -0,0 +1,107 @@
+import { createPublicClient, createWalletClient, http, type Hex } from 'viem'
+import { baseSepolia } from 'viem/chains'
+import { privateKeyToAccount } from 'viem/accounts'
+import * as dotenv from 'dotenv'
+import * as fs from 'fs'
+import * as path from 'path'
+
+dotenv.config()
+
+/*
+ * Minimal disperse contract used for batched reward payouts.
+ *
+ * Calldata is a list of 32-byte words, one per recipient:
+ *   (amount in wei as uint96) << 160 | recipient address
+ * Every recipient is paid from msg.value. Any leftover value is refunded
+ * to the caller. If a transfer fails, the whole batch reverts.
+ *
+ * Runtime (94 bytes):
+ *   PUSH1 0                       i = 0
+ *   loop: JUMPDEST DUP1 CALLDATASIZE GT ISZERO PUSH1 end JUMPI
+ *   DUP1 CALLDATALOAD DUP1 PUSH1 0xa0 SHR SWAP1 PUSH20 0xff..ff AND
+ *   PUSH1 0 PUSH1 0 PUSH1 0 PUSH1 0 DUP6 DUP6 GAS CALL ISZERO PUSH1 fail JUMPI
+ *   POP POP PUSH1 0x20 ADD PUSH1 loop JUMP
+ *   end: JUMPDEST SELFBALANCE DUP1 ISZERO PUSH1 done JUMPI
+ *   PUSH1 0 PUSH1 0 PUSH1 0 PUSH1 0 DUP5 CALLER GAS CALL ISZERO PUSH1 fail JUMPI
+ *   done: JUMPDEST STOP
+ *   fail: JUMPDEST PUSH1 0 PUSH1 0 REVERT
+ */
+const DISPERSE_BYTECODE: Hex =
+  '0x605e80600b6000396000f360005b80361115603f5780358060a01c9073ffffffffffffffffffffffffffffffffffffffff' +
+  '16600060006000600085855af11560585750506020016002565b478015605657600060006000600084335af1156058575b005b60006000fd'
+
+const transport = http(process.env.BASE_SEPOLIA_RPC_URL)
+
+export class DisperseDeployService {
+  async deployDisperseContract(): Promise<{
+    contractAddress: string
+    transactionHash: string
+  }> {
+    try {
+      const account = privateKeyToAccount(`0x${process.env.BACKEND_WALLET_PRIVATE_KEY}`)
+      const client = createWalletClient({ account, chain: baseSepolia, transport })
+      const publicClient = createPublicClient({ chain: baseSepolia, transport })
+
+      const transactionHash = await client.deployContract({
+        abi: [],
+        bytecode: DISPERSE_BYTECODE,
+        account,
+        chain: baseSepolia
+      })
+      const receipt = await publicClient.waitForTransactionReceipt({ hash: transactionHash })
+      if (!receipt.contractAddress) {
+        throw new Error(`Deployment transaction ${transactionHash} did not create a contract`)
+      }
+
+      // Update .env file with contract address
+      const envPath = path.join(process.cwd(), '.env')
+      let envContent = fs.readFileSync(envPath, 'utf8')
+
+      // Remove old disperse contract address if exists
+      envContent = envContent.replace(/\nDISPERSE_CONTRACT_ADDRESS=.*/, '')
+
+      // Add new contract address
+      envContent += `\n# Batched payouts\nDISPERSE_CONTRACT_ADDRESS='${receipt.contractAddress}'`
+
+      // Write back to .env
+      fs.writeFileSync(envPath, envContent.trim() + '\n')
+
+      return {
+        contractAddress: receipt.contractAddress,
+        transactionHash
+      }
+    } catch (error) {
+      console.error('Error deploying disperse contract:', error)
+      throw error
+    }
+  }
+
+  async verifyDeployment(contractAddress: string): Promise<boolean> {
+    try {
+      const publicClient = createPublicClient({ chain: baseSepolia, transport })
+      const code = await publicClient.getBytecode({ address: contractAddress as `0x${string}` })
+      return code !== undefined && code.toLowerCase() === `0x${DISPERSE_BYTECODE.slice(24)}`.toLowerCase()
+    } catch (error) {
+      console.error('Error verifying disperse contract:', error)
+      return false
+    }
+  }
+}
+
+async function main() {
+  const [command, ...args] = process.argv.slice(2)
+  const service = new DisperseDeployService()
+
+  if (command === 'deploy') {
+    console.log(JSON.stringify(await service.deployDisperseContract()))
+  } else if (command === 'verify') {
+    console.log(JSON.stringify({ isValid: await service.verifyDeployment(args[0]) }))
+  } else {
+    throw new Error(`Unknown command: ${command}`)
+  }
+}
+
+main().catch((error) => {
+  console.error(error instanceof Error ? error.message : error)
+  process.exit(1)
+})
@@ -0,0 +1,42 @@
+import asyncio
+import json
+import os
+from typing import Dict
+
+class DisperseDeployService:
+    @staticmethod
+    async def _run(*args: str) -> str:
+        # Get the directory containing this file
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+
+        # Construct path to the CLI script
+        cli_path = os.path.join(current_dir, 'disperse_deploy.js')
+
+        # Create subprocess
+        process = await asyncio.create_subprocess_exec(
+            'node',
+            cli_path,
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+
+        # Wait for the process to complete
+        stdout, stderr = await process.communicate()
+
+        if process.returncode != 0:
+            error_msg = stderr.decode().strip()
+            raise Exception(f"Error running disperse {args[0]}: {error_msg}")
+
+        return stdout.decode().strip()
+
+    @staticmethod
+    async def deploy_contract() -> Dict[str, str]:
+        """Deploy the disperse contract used for batched payouts."""
+        return json.loads(await DisperseDeployService._run('deploy'))
+
+    @staticmethod
+    async def verify_deployment(contract_address: str) -> bool:
+        """Check that `contract_address` holds the disperse contract code."""
+        result = json.loads(await DisperseDeployService._run('verify', contract_address))
+        return result.get('isValid', False)
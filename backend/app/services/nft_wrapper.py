@@ -1,45 +1,24 @@
 import asyncio
-import json
 import os
-from typing import Dict, Any
+from typing import Any, Dict, Optional
+
+from ..metrics import track_call
+
+# keccak256("Transfer(address,address,uint256)"), emitted by ERC-721 mints with from = 0
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+
+
+def minted_token_id(receipt: Dict[str, Any], contract: str) -> Optional[str]:
+    """Token id of the NFT minted by `contract` in a transaction receipt, if any."""
+    for log in receipt.get("logs", []):
+        topics = log.get("topics", [])
+        if (log.get("address", "").lower() == contract.lower() and len(topics) == 4
+                and topics[0] == TRANSFER_TOPIC and int(topics[1], 16) == 0):
+            return str(int(topics[3], 16))
+    return None
+
 
 class NFTService:
-    @staticmethod
-    async def mint_nft(recipient_address: str, metadata: Dict[str, Any]) -> Dict[str, Any]:
-        """Mint NFT using the TypeScript NFT service."""
-        # Get the directory containing this file
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        # Construct path to the CLI script
-        cli_path = os.path.join(current_dir, 'nft_cli.js')
-        
-        # Prepare the command
-        cmd = [
-            'node',
-            cli_path,
-            'mint',
-            recipient_address,
-            json.dumps(metadata)
-        ]
-        
-        # Create subprocess
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        
-        # Wait for the process to complete
-        stdout, stderr = await process.communicate()
-        
-        if process.returncode != 0:
-            error_msg = stderr.decode().strip()
-            raise Exception(f"Error minting NFT: {error_msg}")
-            
-        # Parse the JSON response
-        result = json.loads(stdout.decode().strip())
-        return result
-        
     @staticmethod
     async def get_token_uri(token_id: int) -> str:
         """Get token URI using the TypeScript NFT service."""
@@ -57,15 +36,14 @@ class NFTService:
             str(token_id)
         ]
         
-        # Create subprocess
-        process = await asyncio.create_subprocess_exec(
-            *cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        
-        # Wait for the process to complete
-        stdout, stderr = await process.communicate()
+        # Create subprocess and wait for it to complete
+        with track_call("nft_cli", cmd[2]):
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, stderr = await process.communicate()
         
         if process.returncode != 0:
             error_msg = stderr.decode().strip()
@@ -0,0 +1,230 @@
+"""Local nonce allocation for the backend wallet."""
+import asyncio
+import heapq
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from ..config import get_settings
+from .wallet_wrapper import never_broadcast
+
+logger = logging.getLogger(__name__)
+
+# Substrings of node/viem errors that mean our view of the account nonce is wrong
+NONCE_ERRORS = ("nonce", "replacement transaction underpriced", "already known")
+
+
+def is_nonce_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in NONCE_ERRORS)
+
+
+class NonceManager:
+    """Hands out nonces for one account without a chain round trip per send.
+
+    The pending nonce is fetched once; after that, concurrent senders get
+    consecutive nonces under a lock, so many transactions can be broadcast
+    in the same block. Every allocation ends in mark_sent(), release() or
+    maybe_sent(). Nonces whose transaction certainly never reached the
+    node are released and reused first; a send that failed ambiguously,
+    e.g. by timing out, keeps its nonce. A background check compares the allocator with the chain:
+    an unfilled gap is plugged with a zero-value self-transfer, and if a
+    nonce stays unmined for `stuck_after` seconds because the node dropped
+    our transactions, the allocator starts over from the node's view.
+    """
+
+    def __init__(self, address: str,
+                 get_nonce: Callable[[str], Awaitable[int]],
+                 fill_gap: Callable[[int], Awaitable[str]],
+                 check_interval: float, stuck_after: float):
+        self.address = address
+        self._get_nonce = get_nonce  # block tag -> transaction count
+        self._fill_gap = fill_gap  # nonce -> tx hash
+        self.check_interval = check_interval
+        self.stuck_after = stuck_after
+        self._lock = asyncio.Lock()
+        self._next: Optional[int] = None
+        self._released: List[int] = []  # min-heap of allocated-but-unsent nonces
+        self._in_flight: Set[int] = set()  # Allocated, send not finished yet
+        self._idle = asyncio.Event()  # Set while nothing is in flight
+        self._idle.set()
+        self._sent: Dict[int, float] = {}  # nonce -> monotonic time it was broadcast
+        self._check_task: Optional[asyncio.Task] = None
+        self.allocated = 0
+        self.resyncs = 0
+        self.gaps_filled = 0
+
+    async def allocate(self) -> int:
+        async with self._lock:
+            if self._next is None:
+                self._next = await self._get_nonce("pending")
+                logger.info(f"Nonce manager for {self.address} synced at nonce {self._next}")
+            if self._check_task is None:
+                self._check_task = asyncio.create_task(self._check_loop())
+
+            if self._released:
+                nonce = heapq.heappop(self._released)
+            else:
+                nonce = self._next
+                self._next += 1
+            self.allocated += 1
+            self._in_flight.add(nonce)
+            self._idle.clear()
+            return nonce
+
+    def _settle(self, nonce: int):
+        self._in_flight.discard(nonce)
+        if not self._in_flight:
+            self._idle.set()
+
+    def mark_sent(self, nonce: int):
+        """Record that the transaction using `nonce` was accepted by the node."""
+        self._settle(nonce)
+        self._sent[nonce] = time.monotonic()
+
+    async def maybe_sent(self, nonce: int):
+        """The send using `nonce` failed, possibly after it was broadcast.
+
+        The nonce is not reused: it is watched like a sent one, so if it
+        never reaches the chain the stuck check starts over from the node's
+        pending nonce. Meanwhile we catch up with the node's view.
+        """
+        self.mark_sent(nonce)
+        await self.resync()
+
+    def discard(self, nonce: int):
+        """Forget an allocated nonce the node says is already used by another transaction."""
+        self._settle(nonce)
+
+    def release(self, nonce: int):
+        """Return a nonce whose transaction certainly never reached the node."""
+        self._settle(nonce)
+        if self._next is not None and nonce == self._next - 1:
+            self._next -= 1
+        elif self._next is not None and nonce < self._next:
+            heapq.heappush(self._released, nonce)
+
+    async def resync(self):
+        """Catch up after the account was used outside this manager.
+
+        Only moves forward: nonces already handed to concurrent senders stay
+        valid, so they are never given out twice.
+        """
+        async with self._lock:
+            pending = await self._get_nonce("pending")
+            if self._next is None or pending > self._next:
+                self._next = pending
+            self._released = [nonce for nonce in self._released if nonce >= pending]
+            heapq.heapify(self._released)
+            self.resyncs += 1
+        logger.warning(f"Nonce manager for {self.address} resynced at nonce {self._next}")
+
+    async def reset(self):
+        """Drop local state; the next allocation refetches the pending nonce.
+
+        Waits for in-flight sends first: until they finish the node's
+        pending nonce does not include them, so refetching it could hand
+        out their nonces again. No allocation happens in the meantime.
+        """
+        async with self._lock:
+            await self._idle.wait()
+            self._next = None
+            self._released = []
+            self.resyncs += 1
+        logger.warning(f"Nonce manager for {self.address} reset")
+
+    async def _check_loop(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"Nonce check for {self.address} failed: {e}")
+
+    async def check(self):
+        """Fill gaps and detect stuck transactions below the allocator."""
+        mined = await self._get_nonce("latest")
+        for nonce in [n for n in self._sent if n < mined]:
+            del self._sent[nonce]
+
+        now = time.monotonic()
+        async with self._lock:
+            # Released nonces below the next one block every later transaction
+            while self._released and self._released[0] < mined:
+                heapq.heappop(self._released)
+            gaps = list(self._released)
+            self._released = []
+
+        for nonce in gaps:
+            try:
+                tx_hash = await self._fill_gap(nonce)
+                self._sent[nonce] = now
+                self.gaps_filled += 1
+                logger.warning(f"Filled nonce gap {nonce} for {self.address} with {tx_hash}")
+            except Exception as e:
+                logger.error(f"Could not fill nonce gap {nonce} for {self.address}: {e}")
+                if is_nonce_error(e):
+                    await self.resync()
+                    return
+                if never_broadcast(e):
+                    self.release(nonce)
+                else:
+                    self._sent[nonce] = now  # Watched by the stuck check below
+
+        oldest = self._sent.get(mined)
+        if oldest is not None and now - oldest > self.stuck_after:
+            pending = await self._get_nonce("pending")
+            logger.warning(
+                f"Nonce {mined} for {self.address} unmined after {now - oldest:.0f}s "
+                f"(pending={pending}, next={self._next})"
+            )
+            if self._next is not None and pending < self._next:
+                # The node dropped transactions we handed out; start again from its view
+                self._sent = {n: t for n, t in self._sent.items() if n < pending}
+                await self.reset()
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        return {
+            "next": self._next,
+            "allocated": self.allocated,
+            "unmined": len(self._sent),
+            "in_flight": len(self._in_flight),
+            "released": len(self._released),
+            "resyncs": self.resyncs,
+            "gaps_filled": self.gaps_filled,
+        }
+
+    async def close(self):
+        if self._check_task:
+            self._check_task.cancel()
+            self._check_task = None
+
+
+_managers: Dict[str, NonceManager] = {}
+_managers_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_nonce_manager(address: str, get_nonce: Callable[[str], Awaitable[int]],
+                      fill_gap: Callable[[int], Awaitable[str]]) -> NonceManager:
+    """Return the nonce manager for `address` on the running loop."""
+    global _managers, _managers_loop
+    loop = asyncio.get_running_loop()
+    if _managers_loop is not loop:
+        _managers = {}
+        _managers_loop = loop
+    key = address.lower()
+    if key not in _managers:
+        settings = get_settings()
+        _managers[key] = NonceManager(
+            address, get_nonce, fill_gap,
+            check_interval=settings.NONCE_CHECK_INTERVAL,
+            stuck_after=settings.NONCE_STUCK_AFTER
+        )
+    return _managers[key]
+
+
+async def shutdown_nonce_managers():
+    global _managers, _managers_loop
+    await asyncio.gather(*(manager.close() for manager in _managers.values()))
+    _managers = {}
+    _managers_loop = None
@@ -0,0 +1,365 @@
+"""Shared, rate-limited Telegram notification dispatcher.
+
+The rate limits are enforced per process. In polling mode the bot and the
+API (KYC notifications, broadcasts) each run a dispatcher, and replies sent
+by the bot's handlers go straight to the Bot API without passing through
+either. Telegram's global limit (about 30 messages per second) applies to
+all of them together, so NOTIFY_GLOBAL_RATE is a share of it: the default
+of 10 per process leaves room for handler replies. In webhook mode there is
+a single process, which can be given a larger share.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional
+
+from telegram import Bot
+from telegram.error import Forbidden, BadRequest, RetryAfter, TelegramError
+
+from ..bot.instrumentation import InstrumentedRequest
+from ..config import get_settings
+from ..db.async_session import unit_of_work
+from .scheduler import PermanentJobError, RetryPolicy, enqueue_job, job_handler, wake_job_scheduler
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4096
+COALESCE_SEPARATOR = "\n\n"
+
+NOTIFY_JOB = "notify"
+# After the dispatcher's own NOTIFY_MAX_ATTEMPTS: 30s, 1m, 2m, 4m, 8m
+NOTIFY_RETRY = RetryPolicy(max_attempts=6, base_delay=30.0, max_delay=1800.0)
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Seconds until a token is available; 0 if one is available now."""
+        self._refill(time.monotonic())
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    @property
+    def full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+    async def acquire(self):
+        while True:
+            delay = self.delay()
+            if delay <= 0:
+                self.take()
+                return
+            await asyncio.sleep(delay)
+
+
+class Notification(NamedTuple):
+    chat_id: int
+    text: str
+    parse_mode: Optional[str]
+    reply_markup: object
+    queued_at: float
+    attempts: int = 0
+    on_result: Optional[Callable[[Optional[Exception]], None]] = None  # Called with None once delivered, else the error
+
+    @property
+    def coalescable(self) -> bool:
+        return self.reply_markup is None
+
+
+class NotificationDispatcher:
+    """Sends bot messages through one long-lived Bot within Telegram's quotas.
+
+    send() only enqueues. Each chat has its own queue and token bucket, and
+    a chat is handed to a sender only when its bucket allows, so one busy
+    chat never holds up the others. Senders share a global bucket. Plain
+    messages queued for the same chat are joined into one message. A
+    RetryAfter from Telegram pauses all sending for exactly the time it asks.
+    """
+
+    def __init__(self, bot: Bot, global_rate: float, chat_rate: float, chat_burst: float,
+                 workers: int, max_attempts: int):
+        self.bot = bot
+        # No burst allowance: a full bucket plus refill would exceed the quota within one second
+        self.global_bucket = TokenBucket(global_rate, 1)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self._chats: Dict[int, Deque[Notification]] = {}
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._scheduled: set = set()  # chats waiting in _ready or for their bucket
+        self._in_flight: set = set()  # chats a sender is delivering to right now
+        self._ready: "asyncio.Queue[int]" = asyncio.Queue()
+        self._paused_until = 0.0
+        self._tasks: List[asyncio.Task] = []
+        self._queued = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.failed = 0
+        self.retry_afters = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self, drain_timeout: float = 5.0):
+        """Stop sending, giving queued messages up to `drain_timeout` seconds."""
+        deadline = time.monotonic() + drain_timeout
+        while (self._queued or self._in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._queued:
+            logger.warning(f"Dropping {self._queued} undelivered notifications on shutdown")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def send(self, chat_id: int, text: str, parse_mode: Optional[str] = None, reply_markup=None,
+             on_result: Optional[Callable[[Optional[Exception]], None]] = None):
+        """Queue a message; returns immediately."""
+        self._enqueue(Notification(
+            chat_id, text, parse_mode, reply_markup, time.monotonic(), on_result=on_result
+        ))
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def _enqueue(self, notification: Notification, front: bool = False):
+        queue = self._chats.setdefault(notification.chat_id, deque())
+        if front:
+            queue.appendleft(notification)
+        else:
+            queue.append(notification)
+        self._queued += 1
+        self._schedule(notification.chat_id)
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _schedule(self, chat_id: int):
+        """Hand the chat to a sender as soon as its bucket has a token."""
+        if chat_id in self._scheduled or chat_id in self._in_flight or not self._chats.get(chat_id):
+            return
+        self._scheduled.add(chat_id)
+        delay = self._bucket(chat_id).delay()
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, chat_id)
+        else:
+            self._ready.put_nowait(chat_id)
+
+    def _take_batch(self, chat_id: int) -> List[Notification]:
+        """Pop the next message for a chat, joined with any plain ones queued behind it."""
+        queue = self._chats[chat_id]
+        batch = [queue.popleft()]
+        if batch[0].coalescable:
+            length = len(batch[0].text)
+            while queue and queue[0].coalescable and queue[0].parse_mode == batch[0].parse_mode:
+                length += len(COALESCE_SEPARATOR) + len(queue[0].text)
+                if length > MAX_MESSAGE_LENGTH:
+                    break
+                batch.append(queue.popleft())
+        self._queued -= len(batch)
+        return batch
+
+    async def _run(self):
+        while True:
+            chat_id = await self._ready.get()
+            self._scheduled.discard(chat_id)
+            if not self._chats.get(chat_id):
+                continue
+
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self.global_bucket.acquire()
+            self._bucket(chat_id).take()
+
+            batch = self._take_batch(chat_id)
+            self._in_flight.add(chat_id)
+            try:
+                await self._deliver(chat_id, batch)
+            finally:
+                self._in_flight.discard(chat_id)
+
+            if self._chats.get(chat_id):
+                self._schedule(chat_id)
+            else:
+                self._chats.pop(chat_id, None)
+            if len(self._chat_buckets) > 2 * len(self._chats) + 1000:
+                self._prune_buckets()
+
+    def _prune_buckets(self):
+        """Forget rate state for idle chats; a full bucket is the same as a new one."""
+        for chat_id in [c for c, bucket in self._chat_buckets.items()
+                        if c not in self._chats and c not in self._in_flight and bucket.full]:
+            del self._chat_buckets[chat_id]
+
+    async def _deliver(self, chat_id: int, batch: List[Notification]):
+        first = batch[0]
+        try:
+            await self.bot.send_message(
+                chat_id=chat_id,
+                text=COALESCE_SEPARATOR.join(n.text for n in batch),
+                parse_mode=first.parse_mode,
+                reply_markup=first.reply_markup
+            )
+        except RetryAfter as e:
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, "total_seconds") else e.retry_after
+            self.retry_afters += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            logger.warning(f"Telegram asked us to wait {retry_after}s; pausing notifications")
+            for notification in reversed(batch):
+                self._enqueue(notification, front=True)
+            return
+        except (Forbidden, BadRequest) as e:
+            # Blocked bot, deleted chat, bad markup: retrying will not help
+            logger.error(f"Dropping notification to chat {chat_id}: {e}")
+            self._resolve(batch, e)
+            return
+        except TelegramError as e:
+            if first.attempts + 1 >= self.max_attempts:
+                logger.error(f"Failed to notify chat {chat_id} after {first.attempts + 1} attempts: {e}")
+                self._resolve(batch, e)
+                return
+            logger.warning(f"Retrying notification to chat {chat_id}: {e}")
+            for notification in reversed(batch):
+                self._enqueue(notification._replace(attempts=notification.attempts + 1), front=True)
+            return
+
+        now = time.monotonic()
+        self.sent += 1
+        self.coalesced += len(batch) - 1
+        for notification in batch:
+            latency = now - notification.queued_at
+            self._latency_total += latency
+            self._latency_max = max(self._latency_max, latency)
+        self._resolve(batch, None)
+
+    def _resolve(self, batch: List[Notification], error: Optional[Exception]):
+        if error is not None:
+            self.failed += len(batch)
+        for notification in batch:
+            if notification.on_result:
+                try:
+                    notification.on_result(error)
+                except Exception as e:
+                    logger.error(f"Notification result callback failed: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        delivered = self.sent + self.coalesced
+        return {
+            "queue_depth": self._queued,
+            "chats_pending": len(self._chats),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "failed": self.failed,
+            "retry_afters": self.retry_afters,
+            "latency_avg": self._latency_total / delivered if delivered else 0.0,
+            "latency_max": self._latency_max,
+        }
+
+
+_dispatcher: Optional[NotificationDispatcher] = None
+_owned_bot: Optional[Bot] = None
+
+
+def get_notification_dispatcher() -> Optional[NotificationDispatcher]:
+    return _dispatcher
+
+
+async def start_notification_dispatcher(bot: Optional[Bot] = None) -> NotificationDispatcher:
+    """Start the process-wide dispatcher.
+
+    The bot process passes its Application's bot; other processes (the API)
+    get a dedicated Bot with a pooled HTTP client.
+    """
+    global _dispatcher, _owned_bot
+    if _dispatcher is not None:
+        return _dispatcher
+
+    settings = get_settings()
+    if bot is None:
+        if not settings.TELEGRAM_BOT_TOKEN:
+            raise ValueError("TELEGRAM_BOT_TOKEN is required to send notifications")
+        bot = _owned_bot = Bot(
+            token=settings.TELEGRAM_BOT_TOKEN,
+            base_url=settings.TELEGRAM_BASE_URL,
+            request=InstrumentedRequest(connection_pool_size=settings.NOTIFY_WORKERS)
+        )
+        await bot.initialize()
+
+    _dispatcher = NotificationDispatcher(
+        bot,
+        global_rate=settings.NOTIFY_GLOBAL_RATE,
+        chat_rate=settings.NOTIFY_CHAT_RATE,
+        chat_burst=settings.NOTIFY_CHAT_BURST,
+        workers=settings.NOTIFY_WORKERS,
+        max_attempts=settings.NOTIFY_MAX_ATTEMPTS
+    )
+    await _dispatcher.start()
+    return _dispatcher
+
+
+async def stop_notification_dispatcher():
+    global _dispatcher, _owned_bot
+    if _dispatcher is not None:
+        await _dispatcher.stop()
+    if _owned_bot is not None:
+        await _owned_bot.shutdown()
+    _dispatcher = None
+    _owned_bot = None
+
+
+class NotificationNotDelivered(Exception):
+    """Raised by a notify job whose message the dispatcher gave up on."""
+
+
+@job_handler(NOTIFY_JOB)
+async def _deliver_notification_job(payload: dict):
+    dispatcher = get_notification_dispatcher()
+    if dispatcher is None:
+        raise NotificationNotDelivered("Notification dispatcher is not running")
+    result = asyncio.get_running_loop().create_future()
+    dispatcher.send(
+        payload["chat_id"], payload["text"], parse_mode=payload.get("parse_mode"),
+        on_result=lambda error: result.done() or result.set_result(error)
+    )
+    error = await result
+    if isinstance(error, (Forbidden, BadRequest)):
+        # Blocked bot, deleted chat or bad markup: the same message will be refused again
+        raise PermanentJobError(f"Telegram refused the message to chat {payload['chat_id']}: {error}")
+    if error is not None:
+        raise NotificationNotDelivered(f"Message to chat {payload['chat_id']} was not delivered: {error}")
+
+
+async def send_durably(chat_id: int, text: str, parse_mode: Optional[str] = None):
+    """Queue a message as a scheduled job.
+
+    Unlike send(), the message survives a restart and is retried with
+    backoff (NOTIFY_RETRY) after the dispatcher gives up on it. It is
+    delivered by whichever process runs the job scheduler (the bot).
+    """
+    async with unit_of_work() as db:
+        enqueue_job(db, NOTIFY_JOB, {"chat_id": chat_id, "text": text, "parse_mode": parse_mode}, retry=NOTIFY_RETRY)
+        await db.commit()
+    wake_job_scheduler()
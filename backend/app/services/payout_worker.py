@@ -0,0 +1,517 @@
+"""Background worker that drains the reward payout outbox."""
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Awaitable, Callable, List, Optional, Set
+
+from sqlalchemy import and_, func, or_, select, update
+
+from ..config import get_settings
+from ..db.async_session import unit_of_work
+from ..models.payout import (
+    Payout, PayoutBatch, ETH_REWARD, NFT_BADGE, QUEUED, SUBMITTED, CONFIRMED, FAILED
+)
+from ..models.quiz import UserQuizCompletion
+from .backend_wallet import BackendWalletService
+from .nft_wrapper import minted_token_id
+from .wallet_wrapper import never_broadcast
+
+logger = logging.getLogger(__name__)
+
+Notifier = Callable[[Payout], Awaitable[None]]
+
+RECEIPT_RETRY_MAX_DELAY = 600.0  # Seconds between receipt checks for a broadcast payout, at most
+
+
+def enqueue_quiz_rewards(db, completion_id: int, chat_id: int, recipient_address: str,
+                         eth_amount: str, nft_metadata: Optional[dict] = None) -> List[Payout]:
+    """Queue the payouts for a passing completion in the caller's transaction."""
+    now = datetime.utcnow()
+    payouts = [Payout(
+        idempotency_key=f"{ETH_REWARD}:{completion_id}",
+        completion_id=completion_id,
+        kind=ETH_REWARD,
+        chat_id=chat_id,
+        recipient_address=recipient_address,
+        amount=eth_amount,
+        status=QUEUED,
+        next_attempt_at=now
+    )]
+    if nft_metadata:
+        payouts.append(Payout(
+            idempotency_key=f"{NFT_BADGE}:{completion_id}",
+            completion_id=completion_id,
+            kind=NFT_BADGE,
+            chat_id=chat_id,
+            recipient_address=recipient_address,
+            payload=json.dumps(nft_metadata),
+            status=QUEUED,
+            next_attempt_at=now
+        ))
+    db.add_all(payouts)
+    return payouts
+
+
+class TransactionReverted(Exception):
+    """Raised when a payout's transaction was mined but failed."""
+
+
+class PayoutWorker:
+    """Claims queued payouts and sends them with bounded concurrency.
+
+    Claiming is a conditional UPDATE that leases the payout to this worker
+    for `lease_time` seconds, renewed while it is processed, so several bot
+    processes can share the outbox. A lease that lapses means its process
+    died: a payout whose transaction hash was recorded is picked up again
+    to wait for the receipt; anything else may or may not have reached the
+    chain and is marked failed for manual reconciliation.
+
+    Sends that certainly never reached the node are retried with
+    exponential backoff. Once a transaction hash is known the payout stays
+    submitted until its receipt arrives, however long the node takes.
+    `notify` is called once a payout reaches confirmed or failed.
+
+    With `batch_max_size` > 1, ETH rewards are instead collected until
+    `batch_max_size` are due or the oldest has waited `batch_window`
+    seconds, then paid in one disperse contract transaction.
+    """
+
+    def __init__(self, notify: Notifier, concurrency: int, max_attempts: int,
+                 retry_base_delay: float, poll_interval: float, lease_time: float,
+                 batch_max_size: int = 1, batch_window: float = 0.0):
+        self.notify = notify
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.poll_interval = poll_interval
+        self.lease_time = lease_time
+        self.batch_max_size = batch_max_size
+        self.batch_window = batch_window
+        self.batching = batch_max_size > 1
+        self.wallet_service = BackendWalletService()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._held: Set[int] = set()  # Payouts leased to this worker and being processed
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        if self.batching and not os.getenv('DISPERSE_CONTRACT_ADDRESS'):
+            logger.error("Payout batching is enabled but DISPERSE_CONTRACT_ADDRESS is not set; sending rewards one by one")
+            self.batching = False
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+        if self.batching:
+            self._tasks.append(asyncio.create_task(self._run_batches()))
+        self._tasks.append(asyncio.create_task(self._maintain_leases()))
+        logger.info(f"Payout worker {self.owner} started with concurrency {self.concurrency}")
+
+    async def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self):
+        """Process newly queued payouts now instead of at the next poll."""
+        self._wakeup.set()
+
+    def _lease(self) -> dict:
+        return dict(claimed_by=self.owner, claimed_until=datetime.utcnow() + timedelta(seconds=self.lease_time))
+
+    def _owned(self, payout_id: int):
+        return and_(Payout.id == payout_id, Payout.claimed_by == self.owner)
+
+    async def _maintain_leases(self):
+        while not self._stopping:
+            await asyncio.sleep(self.lease_time / 3)
+            try:
+                await self._renew_leases()
+                await self._recover()
+            except Exception as e:
+                logger.error(f"Error maintaining payout leases: {e}")
+
+    async def _renew_leases(self):
+        payout_ids = list(self._held)
+        if not payout_ids:
+            return
+        async with unit_of_work() as db:
+            await db.execute(
+                update(Payout)
+                .where(Payout.id.in_(payout_ids), Payout.claimed_by == self.owner, Payout.status == SUBMITTED)
+                .values(**self._lease())
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+
+    async def _recover(self):
+        """Fail payouts whose worker died before recording a transaction hash.
+
+        Payouts with a hash are left for _claim to resume.
+        """
+        now = datetime.utcnow()
+        lapsed = and_(
+            Payout.status == SUBMITTED,
+            or_(Payout.claimed_until.is_(None), Payout.claimed_until < now),  # No lease: claimed before leases existed
+            Payout.tx_hash.is_(None),
+        )
+        async with unit_of_work() as db:
+            payout_ids = (await db.execute(select(Payout.id).where(lapsed))).scalars().all()
+            for payout_id in payout_ids:
+                failed = await db.execute(
+                    update(Payout).where(Payout.id == payout_id, lapsed).values(
+                        status=FAILED,
+                        claimed_by=None,
+                        claimed_until=None,
+                        # We cannot tell whether the transfer or mint was broadcast; never risk sending twice
+                        last_error="Worker stopped before the transaction hash was recorded; check the backend wallet history"
+                    )
+                )
+                await db.commit()
+                if failed.rowcount == 1:
+                    logger.warning(f"Payout {payout_id} lost its worker before recording a transaction hash; marked failed")
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                payout = await self._claim()
+            except Exception as e:
+                logger.error(f"Error claiming payout: {e}")
+                payout = None
+
+            if payout is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._held.add(payout.id)
+            try:
+                await self._process(payout)
+            finally:
+                self._held.discard(payout.id)
+
+    async def _claim(self) -> Optional[Payout]:
+        now = datetime.utcnow()
+        due = and_(Payout.status == QUEUED, Payout.next_attempt_at <= now)
+        if self.batching:
+            # New ETH rewards go out in batches
+            due = and_(due, Payout.kind != ETH_REWARD)
+        # Broadcast payouts whose receipt is due to be checked again, or whose worker died
+        awaiting_receipt = and_(
+            Payout.status == SUBMITTED,
+            Payout.tx_hash.isnot(None),
+            or_(Payout.claimed_until.is_(None), Payout.claimed_until < now),
+        )
+        claimable = or_(due, awaiting_receipt)
+        async with unit_of_work() as db:
+            result = await db.execute(
+                select(Payout.id).where(claimable).order_by(Payout.next_attempt_at).limit(self.concurrency)
+            )
+            for payout_id in result.scalars().all():
+                claimed = await db.execute(
+                    update(Payout)
+                    .where(Payout.id == payout_id, claimable)
+                    .values(status=SUBMITTED, attempts=Payout.attempts + 1, **self._lease())
+                )
+                await db.commit()
+                if claimed.rowcount == 1:
+                    return await db.get(Payout, payout_id, populate_existing=True)
+        return None
+
+    async def _process(self, payout: Payout):
+        try:
+            if payout.kind == ETH_REWARD:
+                await self._send_eth(payout)
+            elif payout.kind == NFT_BADGE:
+                await self._mint_nft(payout)
+            else:
+                raise ValueError(f"Unknown payout kind: {payout.kind}")
+            await self._finish(payout, CONFIRMED)
+        except TransactionReverted as e:
+            logger.error(f"Payout {payout.id} ({payout.kind}) failed: {e}")
+            await self._finish(payout, FAILED, error=str(e))
+        except Exception as e:
+            logger.error(f"Payout {payout.id} ({payout.kind}) attempt {payout.attempts} failed: {e}")
+            if payout.tx_hash:
+                # Broadcast, outcome unknown: never send again, keep polling for the receipt
+                await self._check_receipt_later(payout, str(e))
+            elif not never_broadcast(e):
+                await self._finish(
+                    payout, FAILED,
+                    error=f"May have been broadcast; check the backend wallet history before paying again: {e}"
+                )
+            elif payout.attempts >= self.max_attempts:
+                await self._finish(payout, FAILED, error=str(e))
+            else:
+                await self._requeue(payout, str(e))
+
+    def _retry_delay(self, attempts: int) -> float:
+        return self.retry_base_delay * 2 ** (attempts - 1)
+
+    async def _requeue(self, payout: Payout, error: str):
+        async with unit_of_work() as db:
+            await db.execute(
+                update(Payout).where(self._owned(payout.id)).values(
+                    status=QUEUED,
+                    batch_id=None,
+                    claimed_by=None,
+                    claimed_until=None,
+                    next_attempt_at=datetime.utcnow() + timedelta(seconds=self._retry_delay(payout.attempts)),
+                    last_error=error
+                )
+            )
+            await db.commit()
+
+    async def _check_receipt_later(self, payout: Payout, error: str):
+        """Release a broadcast payout; _claim picks it up again once the lease lapses."""
+        delay = min(self._retry_delay(payout.attempts), RECEIPT_RETRY_MAX_DELAY)
+        retry_at = datetime.utcnow() + timedelta(seconds=delay)
+        async with unit_of_work() as db:
+            await db.execute(
+                update(Payout).where(self._owned(payout.id)).values(
+                    claimed_by=None,
+                    claimed_until=retry_at,
+                    next_attempt_at=retry_at,
+                    last_error=error
+                )
+            )
+            await db.commit()
+        logger.warning(f"Payout {payout.id} sent as {payout.tx_hash}; checking its receipt again in {delay:.0f}s")
+
+    async def _send_eth(self, payout: Payout):
+        if not payout.tx_hash:
+            wallet_info = self.wallet_service.get_wallet_info()
+            logger.info(f"Sending {payout.amount} ETH to {payout.recipient_address} for payout {payout.id}")
+            tx_hash = await self.wallet_service.sendTransaction(
+                wallet_info['private_key'],
+                payout.recipient_address,
+                payout.amount
+            )
+            await self._record_tx_hash(payout, tx_hash)
+
+        receipt = await self.wallet_service.wallet_service.wait_for_receipt(payout.tx_hash)
+        if receipt.get('status') != 'success':
+            raise TransactionReverted(f"Transaction {payout.tx_hash} reverted")
+        await self._record_reward_hash([payout.completion_id], payout.tx_hash)
+        if payout.batch_id is not None:
+            async with unit_of_work() as db:
+                await db.execute(
+                    update(PayoutBatch)
+                    .where(PayoutBatch.id == payout.batch_id, PayoutBatch.status == SUBMITTED)
+                    .values(status=CONFIRMED)
+                )
+                await db.commit()
+
+    async def _record_tx_hash(self, payout: Payout, tx_hash: str):
+        """Record the hash before waiting so a crash never leads to a second send."""
+        payout.tx_hash = tx_hash
+        async with unit_of_work() as db:
+            await db.execute(update(Payout).where(self._owned(payout.id)).values(tx_hash=tx_hash))
+            await db.commit()
+
+    async def _record_reward_hash(self, completion_ids: List[int], tx_hash: str):
+        async with unit_of_work() as db:
+            await db.execute(
+                update(UserQuizCompletion)
+                .where(UserQuizCompletion.id.in_(completion_ids))
+                .values(reward_transaction_hash=tx_hash)
+            )
+            await db.commit()
+
+    async def _run_batches(self):
+        while not self._stopping:
+            try:
+                batch = await self._claim_batch()
+            except Exception as e:
+                logger.error(f"Error claiming payout batch: {e}")
+                batch = None
+
+            if not batch:
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            batch, payouts = batch
+            self._held.update(payout.id for payout in payouts)
+            try:
+                await self._process_batch(batch, payouts)
+            finally:
+                self._held.difference_update(payout.id for payout in payouts)
+
+    async def _claim_batch(self):
+        """Claim up to batch_max_size due ETH rewards once the batch is full or old enough."""
+        now = datetime.utcnow()
+        due = (
+            Payout.status == QUEUED,
+            Payout.kind == ETH_REWARD,
+            Payout.tx_hash.is_(None),
+            Payout.next_attempt_at <= now,
+        )
+        async with unit_of_work() as db:
+            count, oldest = (await db.execute(
+                select(func.count(Payout.id), func.min(Payout.next_attempt_at)).where(*due)
+            )).one()
+            if not count:
+                return None
+            if count < self.batch_max_size and now - oldest < timedelta(seconds=self.batch_window):
+                return None
+
+            result = await db.execute(
+                select(Payout.id).where(*due).order_by(Payout.next_attempt_at).limit(self.batch_max_size)
+            )
+            candidate_ids = result.scalars().all()
+            batch = PayoutBatch(size=0, total_amount="0", status=SUBMITTED)
+            db.add(batch)
+            await db.flush()
+
+            claimed = await db.execute(
+                update(Payout)
+                .where(Payout.id.in_(candidate_ids), Payout.status == QUEUED)
+                .values(status=SUBMITTED, attempts=Payout.attempts + 1, batch_id=batch.id, **self._lease())
+                .execution_options(synchronize_session=False)
+            )
+            if claimed.rowcount == 0:
+                await db.rollback()
+                return None
+
+            payouts = (await db.execute(
+                select(Payout).where(Payout.batch_id == batch.id, Payout.status == SUBMITTED)
+            )).scalars().all()
+            batch.size = len(payouts)
+            batch.total_amount = str(sum(Decimal(payout.amount) for payout in payouts))
+            await db.commit()
+        return batch, payouts
+
+    async def _process_batch(self, batch: PayoutBatch, payouts: List[Payout]):
+        logger.info(f"Sending payout batch {batch.id}: {batch.size} rewards, {batch.total_amount} ETH")
+        try:
+            tx_hash = await self.wallet_service.disperse(
+                [(payout.recipient_address, payout.amount) for payout in payouts]
+            )
+        except Exception as e:
+            logger.error(f"Payout batch {batch.id} failed to send: {e}")
+            await self._fail_batch(batch, str(e))
+            for payout in payouts:
+                if not never_broadcast(e):
+                    await self._finish(
+                        payout, FAILED,
+                        error=f"Batch may have been broadcast; check the backend wallet history before paying again: {e}"
+                    )
+                elif payout.attempts >= self.max_attempts:
+                    await self._finish(payout, FAILED, error=str(e))
+                else:
+                    # Nothing was broadcast: put the reward back in the queue
+                    await self._requeue(payout, str(e))
+            return
+
+        # Record the hash before waiting so a crash never leads to a second send
+        async with unit_of_work() as db:
+            await db.execute(update(PayoutBatch).where(PayoutBatch.id == batch.id).values(tx_hash=tx_hash))
+            await db.execute(update(Payout).where(Payout.batch_id == batch.id).values(tx_hash=tx_hash))
+            await db.commit()
+
+        for payout in payouts:
+            payout.tx_hash = tx_hash
+        try:
+            receipt = await self.wallet_service.wallet_service.wait_for_receipt(tx_hash)
+            if receipt.get('status') != 'success':
+                raise TransactionReverted(f"Transaction {tx_hash} reverted")
+        except TransactionReverted as e:
+            logger.error(f"Payout batch {batch.id} failed: {e}")
+            await self._fail_batch(batch, str(e), tx_hash)
+            for payout in payouts:
+                await self._finish(payout, FAILED, error=str(e))
+            return
+        except Exception as e:
+            # Each reward now waits for the batch's receipt on its own (see _send_eth)
+            logger.error(f"Waiting for payout batch {batch.id} failed: {e}")
+            for payout in payouts:
+                await self._check_receipt_later(payout, str(e))
+            return
+
+        async with unit_of_work() as db:
+            await db.execute(
+                update(PayoutBatch).where(PayoutBatch.id == batch.id).values(status=CONFIRMED)
+            )
+            await db.commit()
+        await self._record_reward_hash([payout.completion_id for payout in payouts], tx_hash)
+        for payout in payouts:
+            await self._finish(payout, CONFIRMED)
+
+    async def _fail_batch(self, batch: PayoutBatch, error: str, tx_hash: Optional[str] = None):
+        async with unit_of_work() as db:
+            await db.execute(
+                update(PayoutBatch).where(PayoutBatch.id == batch.id).values(
+                    status=FAILED, tx_hash=tx_hash, last_error=error
+                )
+            )
+            await db.commit()
+
+    async def _mint_nft(self, payout: Payout):
+        if not payout.tx_hash:
+            metadata = json.loads(payout.payload)
+            logger.info(f"Minting NFT for {payout.recipient_address} with metadata: {metadata['name']}")
+            tx_hash = await self.wallet_service.mint_nft(payout.recipient_address, metadata)
+            await self._record_tx_hash(payout, tx_hash)
+
+        receipt = await self.wallet_service.wallet_service.wait_for_receipt(payout.tx_hash)
+        if receipt.get('status') != 'success':
+            raise TransactionReverted(f"Transaction {payout.tx_hash} reverted")
+        token_id = minted_token_id(receipt, os.getenv('NFT_CONTRACT_ADDRESS', ''))
+        if token_id is None:
+            raise TransactionReverted(f"Transaction {payout.tx_hash} minted no token")
+        payout.result = json.dumps({"tokenId": token_id})
+
+        async with unit_of_work() as db:
+            await db.execute(
+                update(UserQuizCompletion)
+                .where(UserQuizCompletion.id == payout.completion_id)
+                .values(nft_token_id=token_id, nft_transaction_hash=payout.tx_hash)
+            )
+            await db.commit()
+
+    async def _finish(self, payout: Payout, status: str, error: Optional[str] = None):
+        payout.status = status
+        payout.last_error = error
+        async with unit_of_work() as db:
+            finished = await db.execute(
+                update(Payout).where(self._owned(payout.id)).values(
+                    status=status,
+                    tx_hash=payout.tx_hash,
+                    result=payout.result,
+                    last_error=error,
+                    claimed_by=None,
+                    claimed_until=None
+                )
+            )
+            await db.commit()
+        if finished.rowcount == 0:
+            # The lease lapsed and another worker has taken over; it reports the result
+            logger.warning(f"Payout {payout.id} ({payout.kind}) {status} after this worker lost its lease")
+            return
+        logger.info(f"Payout {payout.id} ({payout.kind}) {status}, tx_hash: {payout.tx_hash}")
+
+        try:
+            await self.notify(payout)
+        except Exception as e:
+            logger.error(f"Failed to report payout {payout.id} to chat {payout.chat_id}: {e}")
+
+
+def create_payout_worker(notify: Notifier) -> PayoutWorker:
+    settings = get_settings()
+    return PayoutWorker(
+        notify,
+        concurrency=settings.PAYOUT_WORKER_CONCURRENCY,
+        max_attempts=settings.PAYOUT_MAX_ATTEMPTS,
+        retry_base_delay=settings.PAYOUT_RETRY_BASE_DELAY,
+        poll_interval=settings.PAYOUT_POLL_INTERVAL,
+        lease_time=settings.PAYOUT_LEASE_TIME,
+        batch_max_size=settings.PAYOUT_BATCH_MAX_SIZE if settings.PAYOUT_BATCH_ENABLED else 1,
+        batch_window=settings.PAYOUT_BATCH_WINDOW
+    )
@@ -0,0 +1,360 @@
+"""Durable delayed jobs, shared by every process through the database.
+
+enqueue_job() adds a row to scheduled_jobs in the caller's transaction, to
+run now or at a later time. JobScheduler workers claim due jobs by taking a
+lease: a conditional UPDATE records the worker and when its claim lapses,
+so any number of processes can work the same table without running a job
+twice at once. The lease is renewed while the handler runs; if the process
+dies it lapses and another worker takes the job over.
+
+A failed job is queued again after its RetryPolicy's exponential backoff
+and kept as failed once it runs out of attempts, or at once if its handler
+raised PermanentJobError. A job whose worker died counts that attempt too.
+Jobs that succeed are deleted. A pending retry is a row, not a sleeping
+coroutine.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import and_, delete, or_, select, update
+
+from ..config import get_settings
+from ..db.async_session import unit_of_work
+from ..models.scheduled_job import ScheduledJob, QUEUED, RUNNING, FAILED
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[dict], Awaitable[Any]]
+
+# kind -> handler; see job_handler()
+JOB_HANDLERS: Dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str):
+    """Register the coroutine function that runs jobs of `kind` with their payload.
+
+        @job_handler("notify")
+        async def deliver(payload: dict): ...
+
+    Raising retries the job, unless it is a PermanentJobError; returning
+    completes it.
+    """
+    def register(handler: JobHandler) -> JobHandler:
+        JOB_HANDLERS[kind] = handler
+        return handler
+    return register
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying cannot help; the job fails without further attempts."""
+
+
+class RetryPolicy(NamedTuple):
+    max_attempts: int = 5
+    base_delay: float = 10.0  # Seconds before the second attempt, doubled for each one after
+    max_delay: float = 3600.0
+
+
+def enqueue_job(db, kind: str, payload: dict, run_at: Optional[datetime] = None, delay: float = 0.0,
+                retry: RetryPolicy = RetryPolicy(), idempotency_key: Optional[str] = None) -> ScheduledJob:
+    """Add a job in the caller's transaction; it runs at `run_at` (UTC) or `delay` seconds from now.
+
+    Works with both sync and async sessions. Call wake_job_scheduler() after
+    committing to start a due job in this process without waiting for a poll.
+    """
+    job = ScheduledJob(
+        kind=kind,
+        payload=json.dumps(payload),
+        idempotency_key=idempotency_key,
+        status=QUEUED,
+        run_at=run_at or datetime.utcnow() + timedelta(seconds=delay),
+        attempts=0,
+        max_attempts=retry.max_attempts,
+        retry_base_delay=retry.base_delay,
+        retry_max_delay=retry.max_delay
+    )
+    db.add(job)
+    return job
+
+
+def _lapsed(now: datetime):
+    # A worker that died mid-job; the attempt it was making counts
+    return and_(ScheduledJob.status == RUNNING, ScheduledJob.lease_expires_at < now)
+
+
+def _claimable(now: datetime):
+    return or_(
+        and_(ScheduledJob.status == QUEUED, ScheduledJob.run_at <= now),
+        and_(_lapsed(now), ScheduledJob.attempts < ScheduledJob.max_attempts),
+    )
+
+
+class JobScheduler:
+    """Runs due jobs in this process, at most `concurrency` at a time.
+
+    One loop claims as many due jobs as there are free slots in a single
+    UPDATE and starts a task for each; another renews the leases of all
+    running jobs in one statement every lease_time / 3 seconds.
+    """
+
+    def __init__(self, handlers: Dict[str, JobHandler], concurrency: int, lease_time: float,
+                 poll_interval: float, drain_timeout: float):
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.lease_time = lease_time
+        self.poll_interval = poll_interval
+        self.drain_timeout = drain_timeout
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[int, asyncio.Task] = {}  # job id -> task running it
+        self.succeeded = 0
+        self.retried = 0
+        self.failed = 0
+        self.lost_leases = 0
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._run()), asyncio.create_task(self._renew_leases())]
+        logger.info(f"Job scheduler {self.owner} started with {self.concurrency} workers")
+
+    async def stop(self):
+        """Stop claiming jobs and give running ones drain_timeout seconds.
+
+        Jobs still running after that are cancelled and their leases
+        released, so the next process to start runs them straight away.
+        """
+        self._stopping = True
+        self._wakeup.set()
+        if self._tasks:
+            await self._tasks[0]
+        running = list(self._running.values())
+        if running:
+            _, pending = await asyncio.wait(running, timeout=self.drain_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+        for task in self._tasks[1:]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self):
+        """Look for due jobs now instead of at the next poll."""
+        self._wakeup.set()
+
+    async def _run(self):
+        while not self._stopping:
+            # Cleared before claiming so a job finishing meanwhile still wakes us
+            self._wakeup.clear()
+            free = self.concurrency - len(self._running)
+            if free > 0:
+                try:
+                    jobs = await self._claim(free)
+                except Exception as e:
+                    logger.error(f"Error claiming jobs: {e}")
+                    jobs = []
+                for job in jobs:
+                    self._start_job(job)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self, limit: int) -> List[ScheduledJob]:
+        now = datetime.utcnow()
+        async with unit_of_work() as db:
+            # A job that keeps killing its worker must not be retried forever
+            exhausted = await db.execute(
+                update(ScheduledJob)
+                .where(_lapsed(now), ScheduledJob.attempts >= ScheduledJob.max_attempts)
+                .values(
+                    status=FAILED, lease_owner=None, lease_expires_at=None,
+                    last_error="Worker stopped during the last attempt"
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            if exhausted.rowcount:
+                self.failed += exhausted.rowcount
+                logger.error(f"{exhausted.rowcount} jobs failed after their worker stopped during the last attempt")
+            # SKIP LOCKED keeps PostgreSQL claimers off each other's rows; SQLite has one writer anyway
+            job_ids = (await db.execute(
+                select(ScheduledJob.id).where(_claimable(now)).order_by(ScheduledJob.run_at).limit(limit)
+                .with_for_update(skip_locked=True)
+            )).scalars().all()
+            if not job_ids:
+                return []
+            await db.execute(
+                update(ScheduledJob)
+                .where(ScheduledJob.id.in_(job_ids), _claimable(now))
+                .values(
+                    status=RUNNING,
+                    lease_owner=self.owner,
+                    lease_expires_at=now + timedelta(seconds=self.lease_time),
+                    attempts=ScheduledJob.attempts + 1
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            # Another process may have claimed some of them first
+            jobs = (await db.execute(
+                select(ScheduledJob).where(
+                    ScheduledJob.id.in_(job_ids), ScheduledJob.status == RUNNING, ScheduledJob.lease_owner == self.owner
+                )
+            )).scalars().all()
+        return [job for job in jobs if job.id not in self._running]
+
+    def _start_job(self, job: ScheduledJob):
+        task = asyncio.create_task(self._process(job))
+        self._running[job.id] = task
+
+        def done(_):
+            del self._running[job.id]
+            self._wakeup.set()  # A slot is free
+        task.add_done_callback(done)
+
+    async def _process(self, job: ScheduledJob):
+        handler = self.handlers.get(job.kind)
+        try:
+            if handler is None:
+                raise LookupError(f"No handler for job kind {job.kind!r}")
+            await handler(json.loads(job.payload))
+        except asyncio.CancelledError:
+            # Drain timed out: hand the job back without counting this attempt
+            await self._release(job)
+            raise
+        except PermanentJobError as e:
+            await self._fail(job, f"{type(e).__name__}: {e}", permanent=True)
+        except Exception as e:
+            await self._fail(job, f"{type(e).__name__}: {e}")
+        else:
+            await self._finish(job)
+
+    async def _renew_leases(self):
+        while True:
+            await asyncio.sleep(self.lease_time / 3)
+            job_ids = list(self._running)
+            if not job_ids:
+                continue
+            try:
+                async with unit_of_work() as db:
+                    result = await db.execute(
+                        update(ScheduledJob)
+                        .where(ScheduledJob.id.in_(job_ids), ScheduledJob.status == RUNNING,
+                               ScheduledJob.lease_owner == self.owner)
+                        .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=self.lease_time))
+                        .execution_options(synchronize_session=False)
+                    )
+                    await db.commit()
+            except Exception as e:
+                logger.error(f"Error renewing {len(job_ids)} job leases: {e}")
+                continue
+            # Jobs that finished in the meantime were deleted rather than renewed
+            lost = sum(1 for job_id in job_ids if job_id in self._running) - result.rowcount
+            if lost > 0:
+                # Held up so long that another worker took over
+                self.lost_leases += lost
+                logger.warning(f"{lost} of {len(job_ids)} job leases were not renewed")
+
+    async def _owned_update(self, db, job: ScheduledJob, **values) -> bool:
+        """Update the job if this worker still holds its lease."""
+        result = await db.execute(
+            update(ScheduledJob)
+            .where(ScheduledJob.id == job.id, ScheduledJob.status == RUNNING, ScheduledJob.lease_owner == self.owner)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount == 1
+
+    async def _finish(self, job: ScheduledJob):
+        async with unit_of_work() as db:
+            await db.execute(
+                delete(ScheduledJob).where(ScheduledJob.id == job.id, ScheduledJob.lease_owner == self.owner)
+            )
+            await db.commit()
+        self.succeeded += 1
+
+    async def _fail(self, job: ScheduledJob, error: str, permanent: bool = False):
+        if permanent or job.attempts >= job.max_attempts:
+            logger.error(f"Job {job.id} ({job.kind}) failed after {job.attempts} attempts: {error}")
+            values = dict(status=FAILED, lease_owner=None, lease_expires_at=None, last_error=error)
+            self.failed += 1
+        else:
+            delay = min(job.retry_max_delay, job.retry_base_delay * 2 ** (job.attempts - 1))
+            logger.warning(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed, retrying in {delay}s: {error}")
+            values = dict(
+                status=QUEUED, lease_owner=None, lease_expires_at=None, last_error=error,
+                run_at=datetime.utcnow() + timedelta(seconds=delay)
+            )
+            self.retried += 1
+        async with unit_of_work() as db:
+            await self._owned_update(db, job, **values)
+            await db.commit()
+
+    async def _release(self, job: ScheduledJob):
+        try:
+            async with unit_of_work() as db:
+                await self._owned_update(
+                    db, job, status=QUEUED, lease_owner=None, lease_expires_at=None,
+                    attempts=ScheduledJob.attempts - 1, run_at=datetime.utcnow()
+                )
+                await db.commit()
+            logger.warning(f"Released job {job.id} ({job.kind}) unfinished at shutdown")
+        except Exception as e:
+            # The lease lapses on its own; another worker picks the job up then
+            logger.error(f"Could not release job {job.id}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "concurrency": self.concurrency,
+            "running": len(self._running),
+            "succeeded": self.succeeded,
+            "retried": self.retried,
+            "failed": self.failed,
+            "lost_leases": self.lost_leases,
+        }
+
+
+_scheduler: Optional[JobScheduler] = None
+
+
+def get_job_scheduler() -> Optional[JobScheduler]:
+    return _scheduler
+
+
+def wake_job_scheduler():
+    """Start due jobs now, if this process runs a scheduler; others find them at their next poll."""
+    if _scheduler is not None:
+        _scheduler.wake()
+
+
+async def start_job_scheduler() -> JobScheduler:
+    """Start the process-wide scheduler with every handler registered so far."""
+    global _scheduler
+    if _scheduler is not None:
+        return _scheduler
+
+    settings = get_settings()
+    _scheduler = JobScheduler(
+        JOB_HANDLERS,
+        concurrency=settings.JOB_WORKERS,
+        lease_time=settings.JOB_LEASE_TIME,
+        poll_interval=settings.JOB_POLL_INTERVAL,
+        drain_timeout=settings.JOB_DRAIN_TIMEOUT
+    )
+    await _scheduler.start()
+    return _scheduler
+
+
+async def stop_job_scheduler():
+    global _scheduler
+    if _scheduler is not None:
+        await _scheduler.stop()
+    _scheduler = None
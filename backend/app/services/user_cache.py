@@ -0,0 +1,177 @@
+"""Read-through cache of user profiles for menu rendering and KYC gating."""
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+
+from ..config import get_settings
+from ..db.async_session import unit_of_work
+from ..models.user import User, UserCacheInvalidation
+
+logger = logging.getLogger(__name__)
+
+# Invalidation rows only need to outlive the slowest poller
+INVALIDATION_RETENTION = timedelta(hours=1)
+# Rows are re-read this far behind the newest one seen: ids and created_at are
+# assigned before commit, so a slow transaction's row can appear after newer ones
+INVALIDATION_LOOKBACK = timedelta(minutes=1)
+PRUNE_EVERY_POLLS = 600
+
+
+class UserProfile(NamedTuple):
+    """The user fields the bot needs to gate features; never the private key."""
+    id: int
+    telegram_id: int
+    username: Optional[str]
+    kyc: bool
+    wallet_address: Optional[str]
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserProfile":
+        return cls(user.id, user.telegram_id, user.username, bool(user.kyc), user.wallet_address)
+
+
+def record_user_change(db, telegram_id: int):
+    """Publish a change to other processes; commit it with the user update.
+
+    Works with both sync (API, admin CLI) and async (bot) sessions.
+    """
+    db.add(UserCacheInvalidation(telegram_id=telegram_id))
+
+
+class UserProfileCache:
+    """TTL + LRU cache keyed by telegram_id.
+
+    Entries are dropped explicitly via invalidate() in this process and by
+    polling the user_cache_invalidations log for changes made elsewhere.
+    A read that was in flight when its key was invalidated returns what it
+    read but does not cache it, as it may predate the change.
+
+    The log is polled by created_at with a lookback window rather than by
+    id, since on PostgreSQL ids can commit out of order; rows already
+    applied are skipped by id.
+    """
+
+    def __init__(self, max_size: int, ttl: float, poll_interval: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self._entries: "OrderedDict[int, Tuple[float, Optional[UserProfile]]]" = OrderedDict()
+        # Bumped by invalidate() and clear(); only needed while reads are in flight
+        self._generations: Dict[int, int] = {}
+        self._epoch = 0
+        self._reads_in_flight = 0
+        # Newest created_at applied, in the database's clock, and the ids applied since it minus the lookback
+        self._watermark: Optional[datetime] = None
+        self._applied: Dict[int, datetime] = {}
+        self._next_poll = 0.0
+        self._polls = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    async def get(self, telegram_id: int) -> Optional[UserProfile]:
+        """Profile for `telegram_id`, or None if the user is not registered."""
+        now = time.monotonic()
+        if now >= self._next_poll:
+            await self._poll_invalidations(now)
+
+        entry = self._entries.get(telegram_id)
+        if entry is not None and entry[0] > now:
+            self._entries.move_to_end(telegram_id)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        generation = self._generation(telegram_id)
+        self._reads_in_flight += 1
+        try:
+            async with unit_of_work() as db:
+                result = await db.execute(select(User).where(User.telegram_id == telegram_id))
+                user = result.scalars().first()
+        finally:
+            self._reads_in_flight -= 1
+        profile = UserProfile.from_user(user) if user else None
+        if generation == self._generation(telegram_id):
+            self._store(telegram_id, profile, now)
+        if not self._reads_in_flight:
+            self._generations.clear()
+        return profile
+
+    def _generation(self, telegram_id: int) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(telegram_id, 0)
+
+    def _store(self, telegram_id: int, profile: Optional[UserProfile], now: float):
+        self._entries[telegram_id] = (now + self.ttl, profile)
+        self._entries.move_to_end(telegram_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, telegram_id: int):
+        if self._reads_in_flight:
+            self._generations[telegram_id] = self._generations.get(telegram_id, 0) + 1
+        if self._entries.pop(telegram_id, None) is not None:
+            self.invalidations += 1
+
+    def clear(self):
+        self._epoch += 1
+        self._entries.clear()
+
+    async def _poll_invalidations(self, now: float):
+        self._next_poll = now + self.poll_interval
+        try:
+            async with unit_of_work() as db:
+                if self._watermark is None:
+                    # Start from the database's current time; older changes predate our cache
+                    self._watermark = (await db.execute(select(func.now()))).scalar()
+                    return
+
+                since = self._watermark - INVALIDATION_LOOKBACK
+                result = await db.execute(
+                    select(UserCacheInvalidation.id, UserCacheInvalidation.telegram_id, UserCacheInvalidation.created_at)
+                    .where(UserCacheInvalidation.created_at >= since)
+                    .order_by(UserCacheInvalidation.created_at)
+                )
+                for invalidation_id, telegram_id, created_at in result:
+                    if invalidation_id in self._applied:
+                        continue
+                    self.invalidate(telegram_id)
+                    self._applied[invalidation_id] = created_at
+                    self._watermark = max(self._watermark, created_at)
+                since = self._watermark - INVALIDATION_LOOKBACK
+                self._applied = {id_: at for id_, at in self._applied.items() if at >= since}
+
+                self._polls += 1
+                if self._polls % PRUNE_EVERY_POLLS == 0:
+                    await db.execute(delete(UserCacheInvalidation).where(
+                        UserCacheInvalidation.created_at < datetime.utcnow() - INVALIDATION_RETENTION
+                    ))
+                    await db.commit()
+        except Exception as e:
+            # Without the log we cannot trust cached entries from before the failure
+            logger.error(f"Error polling user cache invalidations: {e}")
+            self.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+_settings = get_settings()
+user_cache = UserProfileCache(
+    max_size=_settings.USER_CACHE_MAX_SIZE,
+    ttl=_settings.USER_CACHE_TTL,
+    poll_interval=_settings.USER_CACHE_POLL_INTERVAL
+)
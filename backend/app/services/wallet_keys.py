@@ -0,0 +1,138 @@
+"""In-process wallet key generation and BIP-32/44 address derivation."""
+import hashlib
+import hmac
+import secrets
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from coincurve import PrivateKey
+from Crypto.Hash import keccak
+
+from ..config import get_settings
+
+SECP256K1_ORDER = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+HARDENED_OFFSET = 0x80000000
+DEFAULT_DERIVATION_PATH = "m/44'/60'/0'/0"
+
+
+def keccak256(data: bytes) -> bytes:
+    return keccak.new(digest_bits=256, data=data).digest()
+
+
+def to_checksum_address(address: bytes) -> str:
+    """Format a 20-byte address with its EIP-55 checksum."""
+    hex_address = address.hex()
+    digest = keccak256(hex_address.encode()).hex()
+    return "0x" + "".join(
+        char.upper() if int(digest[i], 16) >= 8 else char
+        for i, char in enumerate(hex_address)
+    )
+
+
+def address_from_private_key(private_key: bytes) -> str:
+    """Derive the checksummed Ethereum address for a raw private key."""
+    public_key = PrivateKey(private_key).public_key.format(compressed=False)
+    return to_checksum_address(keccak256(public_key[1:])[-20:])
+
+
+def _wallet(private_key: bytes) -> Dict[str, str]:
+    # Same shape as wallet.ts createWallet(): hex key without 0x prefix
+    return {
+        'address': address_from_private_key(private_key),
+        'privateKey': private_key.hex()
+    }
+
+
+def generate_wallet() -> Dict[str, str]:
+    """Create a wallet from a fresh random private key."""
+    while True:
+        private_key = secrets.token_bytes(32)
+        if 0 < int.from_bytes(private_key, 'big') < SECP256K1_ORDER:
+            return _wallet(private_key)
+
+
+def generate_wallets(count: int) -> List[Dict[str, str]]:
+    """Create `count` random wallets in one call."""
+    return [generate_wallet() for _ in range(count)]
+
+
+def seed_from_mnemonic(mnemonic: str, passphrase: str = "") -> bytes:
+    """BIP-39 seed from a mnemonic sentence (the wordlist is not validated)."""
+    normalized = " ".join(mnemonic.split())
+    return hashlib.pbkdf2_hmac(
+        'sha512', normalized.encode(), ("mnemonic" + passphrase).encode(), 2048
+    )
+
+
+def parse_derivation_path(path: str) -> List[int]:
+    parts = path.split("/")
+    if parts[0] != "m":
+        raise ValueError(f"Derivation path must start with 'm': {path}")
+    indices = []
+    for part in parts[1:]:
+        if part.endswith("'") or part.endswith("h"):
+            indices.append(int(part[:-1]) + HARDENED_OFFSET)
+        else:
+            indices.append(int(part))
+    return indices
+
+
+def _child_key(key: int, chain_code: bytes, index: int,
+               public_key: Optional[bytes] = None) -> Tuple[int, bytes]:
+    """BIP-32 private parent -> private child derivation."""
+    if index >= HARDENED_OFFSET:
+        data = b"\x00" + key.to_bytes(32, 'big')
+    else:
+        if public_key is None:
+            public_key = PrivateKey(key.to_bytes(32, 'big')).public_key.format(compressed=True)
+        data = public_key
+    digest = hmac.new(chain_code, data + index.to_bytes(4, 'big'), hashlib.sha512).digest()
+    tweak = int.from_bytes(digest[:32], 'big')
+    child = (tweak + key) % SECP256K1_ORDER
+    if tweak >= SECP256K1_ORDER or child == 0:
+        raise ValueError(f"Invalid child key at index {index}, use the next index")
+    return child, digest[32:]
+
+
+class HDWallet:
+    """Derives user wallets from a master seed plus an index (BIP-32/44)."""
+
+    def __init__(self, seed: bytes, path: str = DEFAULT_DERIVATION_PATH):
+        digest = hmac.new(b"Bitcoin seed", seed, hashlib.sha512).digest()
+        key, chain_code = int.from_bytes(digest[:32], 'big'), digest[32:]
+        for index in parse_derivation_path(path):
+            key, chain_code = _child_key(key, chain_code, index)
+
+        # Account-level node; every user wallet is one non-hardened step below it
+        self.path = path
+        self._key = key
+        self._chain_code = chain_code
+        self._public_key = PrivateKey(key.to_bytes(32, 'big')).public_key.format(compressed=True)
+
+    @classmethod
+    def from_settings(cls) -> Optional["HDWallet"]:
+        settings = get_settings()
+        if settings.WALLET_HD_MNEMONIC:
+            seed = seed_from_mnemonic(settings.WALLET_HD_MNEMONIC)
+        elif settings.WALLET_HD_SEED:
+            seed = bytes.fromhex(settings.WALLET_HD_SEED.removeprefix("0x"))
+        else:
+            return None
+        return cls(seed, settings.WALLET_HD_PATH)
+
+    def derive(self, index: int) -> Dict[str, str]:
+        """Wallet at `<path>/<index>`."""
+        if not 0 <= index < HARDENED_OFFSET:
+            raise ValueError(f"Wallet index out of range: {index}")
+        key, _ = _child_key(self._key, self._chain_code, index, self._public_key)
+        return _wallet(key.to_bytes(32, 'big'))
+
+    def derive_many(self, indices: Iterable[int]) -> List[Dict[str, str]]:
+        """Derive a batch of wallets; the account node is reused for each."""
+        return [self.derive(index) for index in indices]
+
+
+@lru_cache()
+def get_hd_wallet() -> Optional[HDWallet]:
+    """HD wallet configured through WALLET_HD_SEED/WALLET_HD_MNEMONIC, if any."""
+    return HDWallet.from_settings()
@@ -0,0 +1,164 @@
+import * as readline from 'readline'
+import {
+  createPublicClient, createWalletClient, custom, formatEther, http, parseEther,
+  type Hash, type NonceManager, type WalletClient
+} from 'viem'
+import { privateKeyToAccount } from 'viem/accounts'
+import { baseSepolia } from 'viem/chains'
+import { Agent } from 'agentkit'
+import { WalletService } from './wallet.js'
+
+// stdout carries the JSON-RPC stream, so anything logged by dependencies goes to stderr
+console.log = console.error
+
+const transport = http(process.env.BASE_SEPOLIA_RPC_URL)
+const publicClient = createPublicClient({ chain: baseSepolia, transport })
+const walletService = new WalletService()
+
+// Keep account setup warm for wallets we see repeatedly (backend wallet, active users)
+const MAX_CACHED_CLIENTS = 256
+const clients = new Map<string, WalletClient>()
+
+function clientFor(privateKey: string): WalletClient {
+  let client = clients.get(privateKey)
+  if (client) {
+    clients.delete(privateKey)
+  } else {
+    client = createWalletClient({
+      account: privateKeyToAccount(`0x${privateKey}`),
+      chain: baseSepolia,
+      transport
+    })
+    if (clients.size >= MAX_CACHED_CLIENTS) {
+      clients.delete(clients.keys().next().value as string)
+    }
+  }
+  clients.set(privateKey, client)
+  return client
+}
+
+// Makes viem use the nonce allocated by the Python nonce manager instead of asking the node
+function fixedNonce(nonce: number): NonceManager {
+  return {
+    consume: async () => nonce,
+    get: async () => nonce,
+    increment: () => {},
+    reset: () => {}
+  }
+}
+
+const handlers: Record<string, (...params: string[]) => Promise<unknown>> = {
+  ping: async () => 'pong',
+
+  createWallet: () => walletService.createWallet(),
+
+  getWalletClient: async (privateKey) => {
+    const address = clientFor(privateKey).account!.address
+    const balance = await publicClient.getBalance({ address })
+    return { address, balance: formatEther(balance) }
+  },
+
+  sendTransaction: async (privateKey, to, amount, nonce): Promise<Hash> => {
+    const client = clientFor(privateKey)
+    return client.sendTransaction({
+      account: client.account!,
+      chain: baseSepolia,
+      to: to as `0x${string}`,
+      value: parseEther(amount),
+      // Allocated by the Python nonce manager for the backend wallet
+      nonce: nonce === undefined ? undefined : Number(nonce),
+      kzg: undefined // Required by viem v2 but not needed for Base
+    })
+  },
+
+  sendContractCall: async (privateKey, to, valueWei, data, nonce): Promise<Hash> => {
+    const client = clientFor(privateKey)
+    return client.sendTransaction({
+      account: client.account!,
+      chain: baseSepolia,
+      to: to as `0x${string}`,
+      value: BigInt(valueWei),
+      data: data as `0x${string}`,
+      nonce: nonce === undefined ? undefined : Number(nonce),
+      kzg: undefined
+    })
+  },
+
+  // Resolves with the hash as soon as the node accepts the mint; the caller polls for the receipt
+  mintNFT: (privateKey, contract, to, metadata, nonce) => new Promise<Hash>((resolve, reject) => {
+    const { name, description, image_url, attributes } = JSON.parse(metadata)
+    const client = createWalletClient({
+      account: privateKeyToAccount(`0x${privateKey}`, { nonceManager: fixedNonce(Number(nonce)) }),
+      chain: baseSepolia,
+      transport: custom({
+        async request({ method, params }) {
+          const result = await publicClient.request({ method, params } as any)
+          if (method === 'eth_sendRawTransaction') {
+            resolve(result as Hash)
+          }
+          return result
+        }
+      })
+    })
+    new Agent({ client, chain: baseSepolia }).mintNFT({
+      to,
+      metadata: { name, description, image: image_url, attributes: JSON.parse(attributes) },
+      contractAddress: contract as `0x${string}`
+    }).then(
+      () => reject(new Error('agentkit finished the mint without broadcasting it')),
+      reject // A no-op once the hash was returned
+    )
+  }),
+
+  getTransactionCount: async (address, blockTag) => {
+    return publicClient.getTransactionCount({
+      address: address as `0x${string}`,
+      blockTag: blockTag as 'latest' | 'pending'
+    })
+  }
+}
+
+interface Request {
+  jsonrpc: '2.0'
+  id: number
+  method: string
+  params?: string[]
+}
+
+function reply(message: object) {
+  process.stdout.write(JSON.stringify(message) + '\n')
+}
+
+async function handle(line: string) {
+  let request: Request
+  try {
+    request = JSON.parse(line)
+  } catch (error) {
+    reply({ jsonrpc: '2.0', id: null, error: { code: -32700, message: 'Parse error' } })
+    return
+  }
+
+  const handler = handlers[request.method]
+  if (!handler) {
+    reply({ jsonrpc: '2.0', id: request.id, error: { code: -32601, message: `Unknown method: ${request.method}` } })
+    return
+  }
+
+  try {
+    const result = await handler(...(request.params ?? []))
+    reply({ jsonrpc: '2.0', id: request.id, result })
+  } catch (error) {
+    const message = error instanceof Error ? error.message : String(error)
+    reply({ jsonrpc: '2.0', id: request.id, error: { code: -32000, message } })
+  }
+}
+
+// Requests are handled concurrently; responses are matched back by id
+const rl = readline.createInterface({ input: process.stdin, terminal: false })
+rl.on('line', (line) => {
+  if (line.trim()) {
+    void handle(line)
+  }
+})
+// Parent closed our stdin: exit so we never outlive the Python process
+rl.on('close', () => process.exit(0))
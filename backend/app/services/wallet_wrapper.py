@@ -1,43 +1,372 @@
 import asyncio
+import itertools
 import json
+import logging
 import os
+import signal
+from typing import Any, Dict, List, Optional
+
+from ..config import get_settings
+from ..metrics import track_call
+from .balances import RPCError, format_eth, get_balance_service, invalidate_balances
+from .wallet_keys import address_from_private_key, generate_wallet, get_hd_wallet
+
+logger = logging.getLogger(__name__)
+
+
+class SidecarError(Exception):
+    """Raised when the Node.js sidecar fails a call or dies while it is in flight."""
+
+
+class SidecarUnavailable(SidecarError):
+    """Raised when a call could not be handed to the sidecar at all."""
+
+
+class ReceiptTimeout(Exception):
+    """Raised when a transaction is still not mined at the receipt deadline."""
+
+
+# Substrings of node (geth) and viem errors for transactions the node refused to accept
+REJECTED_SEND_ERRORS = (
+    "insufficient funds", "exceeds the balance of the account",
+    "nonce too low", "lower than the current nonce", "nonce too high", "higher than the next one expected",
+    "intrinsic gas too low", "gas provided for the transaction is too low", "exceeds block gas limit",
+    "transaction underpriced", "less than block base fee", "lower than the block base fee",
+    "gas required exceeds", "execution reverted",
+)
+
+
+def never_broadcast(error: Exception) -> bool:
+    """Whether a failed send certainly did not reach the network.
+
+    Timeouts, a sidecar dying mid-call and unrecognised errors may come
+    after the transaction was broadcast, so they count as "maybe sent".
+    """
+    if isinstance(error, SidecarUnavailable):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in REJECTED_SEND_ERRORS)
+
+
+class NodeWorker:
+    """A warm Node.js process answering newline-delimited JSON-RPC on stdin/stdout."""
+
+    def __init__(self, script_path: str, timeout: float):
+        self.script_path = script_path
+        self.timeout = timeout
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.returncode is None
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    async def start(self):
+        self._proc = await asyncio.create_subprocess_exec(
+            'node', self.script_path,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            limit=1024 * 1024
+        )
+        self._tasks = [
+            asyncio.create_task(self._read_responses()),
+            asyncio.create_task(self._drain_stderr()),
+        ]
+        logger.info(f"Started wallet sidecar worker pid={self._proc.pid}")
+
+    async def call(self, method: str, params: List[str], timeout: Optional[float] = None) -> Any:
+        if not self.alive:
+            raise SidecarUnavailable("Node.js sidecar is not running")
+
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            message = {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+            self._proc.stdin.write((json.dumps(message) + "\n").encode())
+            await self._proc.stdin.drain()
+            return await asyncio.wait_for(future, timeout or self.timeout)
+        except (BrokenPipeError, ConnectionResetError) as e:
+            raise SidecarUnavailable(f"Node.js sidecar pipe closed: {e}")
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _read_responses(self):
+        try:
+            while True:
+                line = await self._proc.stdout.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Ignoring non-JSON sidecar output: {line[:200]!r}")
+                    continue
+
+                future = self._pending.get(message.get("id"))
+                if future is None or future.done():
+                    continue
+                if "error" in message:
+                    future.set_exception(SidecarError(f"Node.js error: {message['error'].get('message')}"))
+                else:
+                    future.set_result(message.get("result"))
+        finally:
+            self._fail_pending(SidecarError("Node.js sidecar exited"))
+
+    async def _drain_stderr(self):
+        while True:
+            line = await self._proc.stderr.readline()
+            if not line:
+                break
+            logger.debug(f"Node.js stderr: {line.decode(errors='replace').rstrip()}")
+
+    def _fail_pending(self, error: Exception):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending.clear()
+
+    async def stop(self):
+        if self.alive:
+            self._proc.stdin.close()
+            try:
+                await asyncio.wait_for(self._proc.wait(), 5)
+            except asyncio.TimeoutError:
+                self._proc.kill()
+                await self._proc.wait()
+        for task in self._tasks:
+            task.cancel()
+        self._fail_pending(SidecarError("Node.js sidecar stopped"))
+
+    def kill(self):
+        """Stop the process without its event loop, which may already be closed."""
+        if self._proc is None:
+            return
+        try:
+            os.kill(self._proc.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+class NodeWorkerPool:
+    """Bounded pool of sidecar workers with health checks and automatic restart."""
+
+    def __init__(self, script_path: str, size: int, max_in_flight: int,
+                 timeout: float, health_interval: float):
+        self.script_path = script_path
+        self.size = size
+        self.timeout = timeout
+        self.health_interval = health_interval
+        self._workers: List[NodeWorker] = []
+        self._slots = asyncio.Semaphore(size * max_in_flight)
+        self._start_lock = asyncio.Lock()
+        self._health_task: Optional[asyncio.Task] = None
+        self.restarts = 0
+
+    async def _ensure_started(self):
+        if self._workers:
+            return
+        async with self._start_lock:
+            if self._workers:
+                return
+            workers = [NodeWorker(self.script_path, self.timeout) for _ in range(self.size)]
+            await asyncio.gather(*(worker.start() for worker in workers))
+            self._workers = workers
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def _restart(self, index: int, stale: NodeWorker):
+        async with self._start_lock:
+            # Another caller may have replaced this worker while we waited
+            if self._workers[index] is not stale:
+                return
+            await stale.stop()
+            worker = NodeWorker(self.script_path, self.timeout)
+            await worker.start()
+            self._workers[index] = worker
+            self.restarts += 1
+            logger.warning(f"Restarted wallet sidecar worker {index}")
+
+    async def _pick(self) -> NodeWorker:
+        for index, worker in enumerate(list(self._workers)):
+            if not worker.alive:
+                await self._restart(index, worker)
+        return min(self._workers, key=lambda worker: worker.in_flight)
+
+    async def call(self, method: str, *args) -> Any:
+        await self._ensure_started()
+        async with self._slots:
+            worker = await self._pick()
+            return await worker.call(method, [str(arg) for arg in args])
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for index, worker in enumerate(list(self._workers)):
+                try:
+                    await worker.call("ping", [], timeout=5)
+                except (SidecarError, asyncio.TimeoutError) as e:
+                    logger.error(f"Wallet sidecar worker {index} failed health check: {e}")
+                    try:
+                        await self._restart(index, worker)
+                    except Exception as restart_error:
+                        logger.error(f"Could not restart wallet sidecar worker {index}: {restart_error}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": len(self._workers),
+            "alive": sum(1 for worker in self._workers if worker.alive),
+            "in_flight": sum(worker.in_flight for worker in self._workers),
+            "restarts": self.restarts,
+        }
+
+    async def close(self):
+        if self._health_task:
+            self._health_task.cancel()
+        await asyncio.gather(*(worker.stop() for worker in self._workers))
+        self._workers = []
+
+    def kill(self):
+        """Stop the workers of a pool whose event loop is gone."""
+        for worker in self._workers:
+            worker.kill()
+        self._workers = []
+
+
+_pool: Optional[NodeWorkerPool] = None
+_pool_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_sidecar_pool(script_path: str) -> NodeWorkerPool:
+    """Return the sidecar pool shared by every WalletService on the running loop.
+
+    Processes stop it with shutdown_sidecar_pool(). A pool left behind by
+    an earlier event loop (asyncio.run() called again) is stopped here.
+    """
+    global _pool, _pool_loop
+    loop = asyncio.get_running_loop()
+    if _pool is not None and _pool_loop is not loop:
+        if _pool_loop.is_running():
+            asyncio.run_coroutine_threadsafe(_pool.close(), _pool_loop)
+        else:
+            _pool.kill()
+        _pool = None
+    if _pool is None:
+        settings = get_settings()
+        _pool = NodeWorkerPool(
+            script_path,
+            size=settings.WALLET_SIDECAR_WORKERS,
+            max_in_flight=settings.WALLET_SIDECAR_MAX_IN_FLIGHT,
+            timeout=settings.WALLET_SIDECAR_TIMEOUT,
+            health_interval=settings.WALLET_SIDECAR_HEALTH_INTERVAL
+        )
+        _pool_loop = loop
+    return _pool
+
+
+async def shutdown_sidecar_pool():
+    """Stop the shared sidecar workers, if any were started."""
+    global _pool, _pool_loop
+    if _pool is not None:
+        await _pool.close()
+    _pool = None
+    _pool_loop = None
+
 
 class WalletService:
     def __init__(self):
-        self.node_path = os.path.join(os.path.dirname(__file__), 'wallet_cli.js')
+        self.sidecar_path = os.path.join(os.path.dirname(__file__), 'wallet_sidecar.js')
 
     async def _call_node(self, method: str, *args) -> dict:
-        try:
-            # Call Node.js script with method and arguments
-            cmd = ['node', self.node_path, method] + list(map(str, args))
-            proc = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            stdout, stderr = await proc.communicate()
-            
-            stderr_output = stderr.decode() if stderr else None
-            stdout_output = stdout.decode() if stdout else None
-            
-            if proc.returncode != 0:
-                print(f"Node.js stderr: {stderr_output}")
-                print(f"Node.js stdout: {stdout_output}")
-                raise Exception(f"Node.js error: {stderr_output}")
-            
-            try:
-                return json.loads(stdout_output)
-            except json.JSONDecodeError as e:
-                print(f"JSON decode error. Raw output: {stdout_output}")
-                raise
-        except json.JSONDecodeError:
-            raise Exception("Invalid JSON response from Node.js")
+        with track_call("wallet_sidecar", method):
+            return await get_sidecar_pool(self.sidecar_path).call(method, *args)
 
-    async def create_wallet(self):
-        return await self._call_node('createWallet')
+    async def create_wallet(self, index: Optional[int] = None):
+        """Create a wallet in-process.
+
+        With an HD seed configured and an `index` given, the wallet is derived
+        from the seed; otherwise a random key is generated.
+        """
+        hd_wallet = get_hd_wallet()
+        if hd_wallet is not None and index is not None:
+            return hd_wallet.derive(index)
+        return generate_wallet()
+
+    async def create_wallets(self, indices: List[int]) -> List[Dict[str, str]]:
+        """Create one wallet per index in a single call."""
+        hd_wallet = get_hd_wallet()
+        if hd_wallet is not None:
+            return hd_wallet.derive_many(indices)
+        return [generate_wallet() for _ in indices]
 
     async def get_wallet_client(self, private_key: str):
-        return await self._call_node('getWalletClient', private_key)
+        """Address and ETH balance for a private key; the balance comes from the balance service."""
+        address = self.address_of(private_key)
+        balance = await get_balance_service().get_balance(address)
+        return {'address': address, 'balance': format_eth(balance)}
+
+    async def send_transaction(self, private_key: str, to: str, amount: str, nonce: Optional[int] = None):
+        try:
+            if nonce is None:
+                return await self._call_node('sendTransaction', private_key, to, amount)
+            return await self._call_node('sendTransaction', private_key, to, amount, nonce)
+        finally:
+            # Also on errors: a timed-out send may still have been broadcast
+            invalidate_balances(self.address_of(private_key), to)
 
-    async def send_transaction(self, private_key: str, to: str, amount: str):
-        return await self._call_node('sendTransaction', private_key, to, amount)
+    async def send_contract_call(self, private_key: str, to: str, value_wei: int, data: str,
+                                 nonce: Optional[int] = None):
+        try:
+            if nonce is None:
+                return await self._call_node('sendContractCall', private_key, to, value_wei, data)
+            return await self._call_node('sendContractCall', private_key, to, value_wei, data, nonce)
+        finally:
+            invalidate_balances(self.address_of(private_key), to)
+
+    async def mint_nft(self, private_key: str, contract: str, to: str, metadata: Dict[str, Any], nonce: int) -> str:
+        """Broadcast an NFT mint through agentkit; returns the transaction hash without waiting for it."""
+        try:
+            return await self._call_node('mintNFT', private_key, contract, to, json.dumps(metadata), nonce)
+        finally:
+            invalidate_balances(self.address_of(private_key))  # Pays the gas
+
+    @staticmethod
+    def address_of(private_key: str) -> str:
+        return address_from_private_key(bytes.fromhex(private_key.removeprefix('0x')))
+
+    async def get_transaction_count(self, address: str, block_tag: str = "pending") -> int:
+        return int(await self._call_node('getTransactionCount', address, block_tag))
+
+    async def wait_for_receipt(self, tx_hash: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Poll the node until `tx_hash` is mined; returns its status, block number and logs.
+
+        Raises ReceiptTimeout after `timeout` (RECEIPT_TIMEOUT) seconds. The
+        transaction may still be mined later, so callers check again rather
+        than treating that as a failed send.
+        """
+        settings = get_settings()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or settings.RECEIPT_TIMEOUT)
+        rpc = get_balance_service()
+        while True:
+            try:
+                receipt = await rpc.rpc("eth_getTransactionReceipt", [tx_hash])
+            except RPCError as e:
+                # A flaky node should not end the wait early
+                logger.warning(f"Receipt lookup for {tx_hash} failed: {e}")
+                receipt = None
+            if receipt:
+                return {
+                    "status": "success" if int(receipt["status"], 16) == 1 else "reverted",
+                    "blockNumber": str(int(receipt["blockNumber"], 16)),
+                    "logs": receipt.get("logs", []),
+                }
+            if loop.time() >= deadline:
+                raise ReceiptTimeout(f"Transaction {tx_hash} not mined after {timeout or settings.RECEIPT_TIMEOUT:g}s")
+            await asyncio.sleep(settings.RECEIPT_POLL_INTERVAL)
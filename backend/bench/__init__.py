@@ -0,0 +1 @@
+"""Benchmarks that run the real application against stubbed Telegram and chain calls."""
@@ -0,0 +1,266 @@
+"""Load test for the users API.
+
+Seeds a scratch database with a synthetic population, then runs many
+concurrent clients against /api/v1/users with a weighted mix of:
+
+    create   POST /                 a new user
+    get      GET /{telegram_id}     a random existing user
+    list     GET /?after_id=...     one page from a random cursor
+    approve  PATCH /{telegram_id}   KYC approval of a pending user: read,
+                                    wallet creation, commit, notification
+
+By default the FastAPI app runs in-process. Wallet creation is replaced by
+a stub with --wallet-latency, and KYC notifications go through the real
+dispatcher to an in-process Telegram with --telegram-latency.
+
+With --url the clients target a server you started yourself
+(`python run.py`), which runs its real wallet service and notifier. Point
+--database-url at that server's database so the seeded users are visible.
+
+    python bench/api_load.py --clients 50 --duration 30 --users 20000 --mix get=10,list=2,approve=2,create=1
+
+Results are appended to bench/results/api_load.jsonl and compared with the
+last run that used the same parameters.
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import random
+import secrets
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.common import (  # noqa: E402
+    FakeTelegram, latency_summary, print_comparison, record_result, use_scratch_database
+)
+
+OPERATIONS = ("create", "get", "list", "approve")
+SEED_BATCH_SIZE = 1000
+FIRST_TELEGRAM_ID = 3_000_000
+
+
+def parse_mix(text: str) -> Dict[str, int]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {name!r}; expected one of {', '.join(OPERATIONS)}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def seed(users: int, pending_ratio: float) -> List[int]:
+    """Insert `users` users, the first `pending_ratio` of them awaiting KYC; returns their telegram ids."""
+    from app.db.session import SessionLocal
+    from app.models.user import User
+
+    pending = int(users * pending_ratio)
+    db = SessionLocal()
+    try:
+        for start in range(0, users, SEED_BATCH_SIZE):
+            rows = []
+            for i in range(start, min(users, start + SEED_BATCH_SIZE)):
+                approved = i >= pending
+                rows.append({
+                    "telegram_id": FIRST_TELEGRAM_ID + i,
+                    "username": f"load{i}",
+                    "full_name": "Load Test",
+                    "kyc": approved,
+                    # Never used on chain, so random values stand in for real keys
+                    "wallet_address": "0x" + secrets.token_hex(20) if approved else None,
+                    "private_key": secrets.token_hex(32) if approved else None,
+                })
+            db.execute(User.__table__.insert(), rows)
+        db.commit()
+    finally:
+        db.close()
+    return [FIRST_TELEGRAM_ID + i for i in range(users)]
+
+
+class Workload:
+    """Picks requests by weight and tracks which users exist and which await KYC."""
+
+    def __init__(self, mix: Dict[str, int], telegram_ids: List[int], pending: int, page_size: int):
+        self.operations = list(mix)
+        self.weights = [mix[name] for name in self.operations]
+        self.known = list(telegram_ids)
+        self.pending = telegram_ids[:pending]
+        random.shuffle(self.pending)
+        self.page_size = page_size
+        self._new_ids = itertools.count(FIRST_TELEGRAM_ID + len(telegram_ids))
+
+    def next_request(self):
+        """(operation, method, path, json body) for the next request."""
+        operation = random.choices(self.operations, self.weights)[0]
+        if operation == "approve" and not self.pending:
+            operation = "get"  # Everyone has been approved
+        if operation == "create":
+            telegram_id = next(self._new_ids)
+            return operation, "POST", "/api/v1/users/", {"telegram_id": telegram_id, "username": f"load{telegram_id}"}
+        if operation == "approve":
+            return operation, "PATCH", f"/api/v1/users/{self.pending.pop()}", {"kyc": True}
+        if operation == "list":
+            after_id = random.randrange(len(self.known))
+            return operation, "GET", f"/api/v1/users/?after_id={after_id}&limit={self.page_size}", None
+        return operation, "GET", f"/api/v1/users/{random.choice(self.known)}", None
+
+    def completed(self, operation: str, body: dict, status: int):
+        if operation == "create" and status == 200:
+            # Only now can other clients look the user up or approve it
+            self.known.append(body["telegram_id"])
+            self.pending.append(body["telegram_id"])
+
+
+class Results:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.exceptions: Dict[str, int] = defaultdict(int)
+
+    def summary(self, elapsed: float) -> Dict[str, dict]:
+        report = {}
+        for operation in sorted(self.latencies):
+            statuses = self.statuses[operation]
+            total = len(self.latencies[operation])
+            errors = sum(count for status, count in statuses.items() if status >= 500) + self.exceptions[operation]
+            report[operation] = {
+                **latency_summary(self.latencies[operation]),
+                "per_s": round(total / elapsed, 1),
+                "errors": errors,
+                "error_rate": round(errors / total, 4) if total else 0.0,
+                "statuses": {str(status): count for status, count in sorted(statuses.items())},
+            }
+        return report
+
+
+async def client_loop(http, workload: Workload, results: Results, deadline: float, remaining: List[int]):
+    while time.monotonic() < deadline and remaining[0] > 0:
+        remaining[0] -= 1
+        operation, method, path, body = workload.next_request()
+        start = time.perf_counter()
+        try:
+            response = await http.request(method, path, json=body)
+            results.statuses[operation][response.status_code] += 1
+            workload.completed(operation, body, response.status_code)
+        except Exception as e:
+            results.exceptions[operation] += 1
+            logging.getLogger(__name__).warning(f"{method} {path} failed: {e}")
+        results.latencies[operation].append(time.perf_counter() - start)
+
+
+def install_stubs(wallet_latency: float):
+    from app.api.v1 import users
+    from app.services.wallet_keys import generate_wallet
+
+    async def create_wallet(index=None):
+        await asyncio.sleep(wallet_latency)
+        return generate_wallet()
+
+    users.wallet_service.create_wallet = create_wallet
+
+
+async def run(args, telegram_ids: List[int]) -> dict:
+    import httpx
+
+    telegram = None
+    if args.url:
+        http = httpx.AsyncClient(base_url=args.url, timeout=args.timeout,
+                                 limits=httpx.Limits(max_connections=args.clients))
+    else:
+        from telegram import Bot
+        from app.db.async_session import dispose_async_engine
+        from app.main import app
+        from app.services.notifications import start_notification_dispatcher, stop_notification_dispatcher
+
+        install_stubs(args.wallet_latency)
+        telegram = FakeTelegram(args.telegram_latency)
+        bot = Bot(token=os.environ["TELEGRAM_BOT_TOKEN"], request=telegram.request)
+        await bot.initialize()
+        await start_notification_dispatcher(bot)
+        http = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=args.timeout)
+
+    pending = int(args.users * args.pending_ratio)
+    workload = Workload(args.mix, telegram_ids, pending, args.page_size)
+    results = Results()
+    remaining = [args.requests or float("inf")]
+    start = time.perf_counter()
+    deadline = time.monotonic() + args.duration
+    try:
+        await asyncio.gather(*(
+            client_loop(http, workload, results, deadline, remaining) for _ in range(args.clients)
+        ))
+    finally:
+        elapsed = time.perf_counter() - start
+        await http.aclose()
+        if telegram is not None:
+            await stop_notification_dispatcher()
+            await dispose_async_engine()
+
+    by_operation = results.summary(elapsed)
+    total = sum(len(latencies) for latencies in results.latencies.values())
+    errors = sum(summary["errors"] for summary in by_operation.values())
+    return {
+        "requests": total,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(total / elapsed, 1),
+        "error_rate": round(errors / total, 4) if total else 0.0,
+        **{f"{op}_p99_ms": summary["p99_ms"] for op, summary in by_operation.items()},
+        **{f"{op}_per_s": summary["per_s"] for op, summary in by_operation.items()},
+        "telegram_calls": sum(telegram.calls.values()) if telegram else None,
+        "by_operation": by_operation,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", type=int, default=20, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+    parser.add_argument("--requests", type=int, default=0, help="Stop after this many requests (0: no limit)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("get=10,list=2,approve=2,create=1"),
+                        help="Weighted operations, e.g. get=10,list=2,approve=2,create=1")
+    parser.add_argument("--users", type=int, default=10000, help="Users to seed")
+    parser.add_argument("--pending-ratio", type=float, default=0.5, help="Share of seeded users awaiting KYC")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--wallet-latency", type=float, default=0.0, help="Seconds per stubbed wallet creation")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="Seconds per stubbed Bot API call")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout")
+    parser.add_argument("--url", help="Target a running server instead of the in-process app")
+    parser.add_argument("--database-url", help="Defaults to a scratch SQLite file")
+    parser.add_argument("--results", help="JSON lines file to append to")
+    args = parser.parse_args()
+    if args.url and not args.database_url:
+        parser.error("--url needs --database-url pointing at the server's database")
+
+    # In-process, only the stubs and the scratch database are ever talked to
+    os.environ["TELEGRAM_BOT_TOKEN"] = "1000000:bench"
+    use_scratch_database(args.database_url)
+    logging.disable(logging.INFO)
+    telegram_ids = seed(args.users, args.pending_ratio)
+
+    metrics = asyncio.run(run(args, telegram_ids))
+    params = {key: value for key, value in vars(args).items() if key not in ("database_url", "results", "url")}
+    params["target"] = "server" if args.url else "in-process"
+    params["database"] = "sqlite" if not args.database_url else args.database_url.split(":", 1)[0]
+
+    print(f"\n{metrics['requests']} requests in {metrics['elapsed_s']}s: {metrics['requests_per_s']} req/s, "
+          f"error rate {metrics['error_rate']:.2%}")
+    print(f"\n  {'operation':<10} {'n':>7} {'req/s':>8} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9} {'errors':>7}  statuses")
+    for operation, summary in metrics["by_operation"].items():
+        print(f"  {operation:<10} {summary['count']:>7} {summary['per_s']:>8} {summary['p50_ms']:>7}ms "
+              f"{summary['p90_ms']:>7}ms {summary['p99_ms']:>7}ms {summary['max_ms']:>7}ms {summary['errors']:>7}  "
+              f"{summary['statuses']}")
+
+    previous = record_result("api_load", params, metrics, args.results)
+    print_comparison(metrics, previous, ["requests_per_s", "error_rate"] + [
+        f"{op}_p99_ms" for op in metrics["by_operation"]
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""Bot throughput benchmark.
+
+Drives synthetic Updates through the real Application from
+create_application(): /start, the KYC conversation, the quiz (passed, so
+rewards are queued and paid by the payout worker) and Send ETH through the
+recipient picker. Telegram is replaced by an in-process Bot API transport
+and the Node.js wallet/NFT calls by stubs, each with a configurable
+latency. Everything else, including the database, is real.
+
+Each simulated user waits for its previous update to be handled before
+sending the next, as a person tapping buttons would. Updates go through the
+Application's update queue, so the numbers include however PTB schedules
+them.
+
+    python bench/bot_throughput.py --users 200 --wallet-latency 0.3
+
+Results are appended to bench/results/bot_throughput.jsonl and compared
+with the last run that used the same parameters.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.common import (  # noqa: E402
+    BOT_USER, FakeTelegram, latency_summary, print_comparison, record_result, use_scratch_database
+)
+
+
+NFT_CONTRACT = "0x" + "42" * 20
+
+
+class FakeChain:
+    """Stands in for the Node.js wallet sidecar, the NFT service and the RPC node."""
+
+    def __init__(self, wallet_latency: float, nft_latency: float):
+        self.wallet_latency = wallet_latency
+        self.nft_latency = nft_latency
+        self.calls: Counter = Counter()
+        self._nonces: Dict[str, int] = {}
+        self._tx_ids = itertools.count(1)
+        self._minted: Dict[str, int] = {}  # mint tx hash -> token id
+
+    def install(self):
+        from app.services.balances import BalanceService
+        from app.services.wallet_wrapper import NodeWorkerPool
+
+        chain = self
+
+        async def pool_call(pool, method, *args):
+            return await chain.wallet_call(method, *args)
+
+        async def rpc(service, method, params):
+            return await chain.rpc(method, params)
+
+        # Patched below _call_node so the wallet_sidecar call metrics still apply; no workers start
+        NodeWorkerPool.call = pool_call
+        BalanceService.rpc = rpc
+
+    def _tx_hash(self) -> str:
+        return f"0x{next(self._tx_ids):064x}"
+
+    async def wallet_call(self, method: str, *args):
+        from app.services.wallet_wrapper import WalletService
+
+        await asyncio.sleep(self.nft_latency if method == "mintNFT" else self.wallet_latency)
+        self.calls[method] += 1
+        if method in ("sendTransaction", "sendContractCall", "mintNFT"):
+            address = WalletService.address_of(args[0]).lower()
+            nonce_index = 3 if method == "sendTransaction" else 4
+            nonce = int(args[nonce_index]) if len(args) > nonce_index else self._nonces.get(address, 0)
+            self._nonces[address] = max(self._nonces.get(address, 0), nonce + 1)
+            tx_hash = self._tx_hash()
+            if method == "mintNFT":
+                self._minted[tx_hash] = len(self._minted) + 1
+            return tx_hash
+        if method == "getTransactionCount":
+            return self._nonces.get(args[0].lower(), 0)  # Every transaction is mined at once
+        raise ValueError(f"Unexpected wallet call {method}")
+
+    async def rpc(self, method: str, params: list):
+        self.calls[method] += 1
+        if method == "eth_getTransactionReceipt":
+            from app.services.nft_wrapper import TRANSFER_TOPIC
+
+            logs = []
+            token_id = self._minted.get(params[0])
+            if token_id is not None:
+                logs.append({
+                    "address": NFT_CONTRACT,
+                    "topics": [TRANSFER_TOPIC, "0x" + "0" * 64, "0x" + "0" * 64, f"0x{token_id:064x}"],
+                })
+            return {"status": "0x1", "blockNumber": "0x1", "logs": logs}  # Mined at once
+        raise ValueError(f"Unexpected RPC call {method}")
+
+
+class UpdateFactory:
+    def __init__(self, bot):
+        self.bot = bot
+        self._ids = itertools.count(1)
+
+    def _user(self, telegram_id: int) -> dict:
+        return {"id": telegram_id, "is_bot": False, "first_name": "User", "username": f"bench{telegram_id}"}
+
+    def message(self, telegram_id: int, text: str):
+        from telegram import Update
+
+        message = {
+            "message_id": next(self._ids),
+            "date": int(time.time()),
+            "chat": {"id": telegram_id, "type": "private"},
+            "from": self._user(telegram_id),
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return Update.de_json({"update_id": next(self._ids), "message": message}, self.bot)
+
+    def callback(self, telegram_id: int, data: str):
+        from telegram import Update
+
+        return Update.de_json({
+            "update_id": next(self._ids),
+            "callback_query": {
+                "id": str(next(self._ids)),
+                "chat_instance": str(telegram_id),
+                "from": self._user(telegram_id),
+                "data": data,
+                "message": {
+                    "message_id": next(self._ids),
+                    "date": int(time.time()),
+                    "chat": {"id": telegram_id, "type": "private"},
+                    "from": BOT_USER,
+                    "text": "menu",
+                },
+            },
+        }, self.bot)
+
+
+class Driver:
+    """Feeds updates to the Application and times them."""
+
+    def __init__(self, application):
+        from app.bot.instrumentation import update_label
+
+        self.application = application
+        self.updates = UpdateFactory(application.bot)
+        self.handler_times: Dict[str, List[float]] = {}
+        self.response_times: List[float] = []
+        self._done: Dict[int, asyncio.Future] = {}
+
+        process_update = application.process_update
+
+        async def timed_process_update(update):
+            start = time.perf_counter()
+            try:
+                await process_update(update)
+            finally:
+                self.handler_times.setdefault(update_label(update), []).append(time.perf_counter() - start)
+                future = self._done.pop(getattr(update, "update_id", None), None)
+                if future is not None and not future.done():
+                    future.set_result(None)
+
+        application.process_update = timed_process_update
+
+    async def send(self, update):
+        """Queue `update` and wait until the Application has handled it."""
+        future = asyncio.get_running_loop().create_future()
+        self._done[update.update_id] = future
+        start = time.perf_counter()
+        await self.application.update_queue.put(update)
+        await future
+        self.response_times.append(time.perf_counter() - start)
+
+    async def text(self, telegram_id: int, text: str):
+        await self.send(self.updates.message(telegram_id, text))
+
+    async def tap(self, telegram_id: int, data: str):
+        await self.send(self.updates.callback(telegram_id, data))
+
+    @property
+    def update_count(self) -> int:
+        return sum(len(times) for times in self.handler_times.values())
+
+
+async def kyc_flow(driver: Driver, telegram_id: int):
+    await driver.text(telegram_id, "/start")
+    await driver.tap(telegram_id, "kyc")
+    for answer in ("Bench User", "1990-01-01", "+10000000000", f"bench{telegram_id}@example.com"):
+        await driver.text(telegram_id, answer)
+
+
+async def quiz_flow(driver: Driver, telegram_id: int, quiz):
+    await driver.tap(telegram_id, "quiz")
+    await driver.tap(telegram_id, f"qs:{quiz.id}")
+    for question in quiz.questions:
+        await driver.tap(telegram_id, f"qa:{quiz.id}:{question.index}:{question.correct_option}")
+
+
+async def send_eth_flow(driver: Driver, telegram_id: int, recipient_id: int):
+    await driver.tap(telegram_id, "send_eth")
+    await driver.tap(telegram_id, "rp:next")
+    await driver.text(telegram_id, "bench")  # Search by username prefix
+    await driver.tap(telegram_id, f"select_user_{recipient_id}")
+    await driver.text(telegram_id, "0.0001")
+
+
+def seed(users: int, questions: int) -> List[tuple]:
+    """KYC-approved users with wallets and one quiz; returns (users.id, telegram_id) pairs."""
+    from app.db.session import SessionLocal
+    from app.models.quiz import Quiz, QuizQuestion
+    from app.models.user import User
+    from app.services.wallet_keys import generate_wallets
+
+    db = SessionLocal()
+    try:
+        wallets = generate_wallets(users)
+        db.add_all([
+            User(telegram_id=1_000_000 + i, username=f"bench{1_000_000 + i}", full_name="Bench User",
+                 kyc=True, wallet_address=wallet["address"], private_key=wallet["privateKey"])
+            for i, wallet in enumerate(wallets)
+        ])
+        quiz = Quiz(name="Bench Quiz", reward_amount="1", eth_reward_amount="0.00001",
+                    training_text="Synthetic training text.")
+        db.add(quiz)
+        db.flush()
+        db.add_all([
+            QuizQuestion(quiz_id=quiz.id, position=i, text=f"Question {i + 1}?",
+                         options=json.dumps(["A", "B", "C"]), correct_option=i % 3)
+            for i in range(questions)
+        ])
+        db.commit()
+        return [(user.id, user.telegram_id) for user in db.query(User).order_by(User.id)]
+    finally:
+        db.close()
+
+
+async def run(args) -> dict:
+    from app.bot.bot import create_application
+    from app.bot.quiz_engine import quiz_catalog
+    from app.db.async_session import dispose_async_engine
+    from app.db.engine import get_db_stats
+
+    seeded = seed(args.users, args.questions)
+    chain = FakeChain(args.wallet_latency, args.nft_latency)
+    chain.install()
+    telegram = FakeTelegram(args.telegram_latency)
+
+    application = create_application(update_queue=asyncio.Queue(), request=telegram.request)
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+    driver = Driver(application)
+    quiz = (await quiz_catalog.quizzes())[0]
+
+    async def approved_user(index: int):
+        _, telegram_id = seeded[index]
+        recipient_id = seeded[(index + 1) % len(seeded)][0]
+        await driver.text(telegram_id, "/start")
+        await quiz_flow(driver, telegram_id, quiz)
+        await send_eth_flow(driver, telegram_id, recipient_id)
+
+    statements_before = get_db_stats()["bot"]["statements"]
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(approved_user(i) for i in range(args.users)),
+        *(kyc_flow(driver, 2_000_000 + i) for i in range(args.kyc_users))
+    )
+    elapsed = time.perf_counter() - start
+    statements = get_db_stats()["bot"]["statements"] - statements_before
+
+    await application.stop()
+    await application.shutdown()
+    await application.post_shutdown(application)
+    await dispose_async_engine()
+
+    updates = driver.update_count
+    all_handler_times = [t for times in driver.handler_times.values() for t in times]
+    handler = latency_summary(all_handler_times)
+    response = latency_summary(driver.response_times)
+    return {
+        "updates": updates,
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(updates / elapsed, 1),
+        "handler_p50_ms": handler["p50_ms"],
+        "handler_p99_ms": handler["p99_ms"],
+        "response_p50_ms": response["p50_ms"],
+        "response_p99_ms": response["p99_ms"],
+        # Includes the payout worker and notification sends running alongside
+        "db_statements_per_update": round(statements / updates, 2) if updates else 0.0,
+        "telegram_calls": sum(telegram.calls.values()),
+        "wallet_calls": dict(chain.calls),
+        "by_update": {label: latency_summary(times) for label, times in sorted(driver.handler_times.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--users", type=int, default=50, help="KYC-approved users taking the quiz and sending ETH")
+    parser.add_argument("--kyc-users", type=int, default=50, help="New users going through KYC")
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="Seconds per Bot API call")
+    parser.add_argument("--wallet-latency", type=float, default=0.2, help="Seconds per wallet call")
+    parser.add_argument("--nft-latency", type=float, default=1.0, help="Seconds per NFT mint")
+    parser.add_argument("--database-url", help="Defaults to a scratch SQLite file")
+    parser.add_argument("--results", help="JSON lines file to append to")
+    args = parser.parse_args()
+
+    # Only the stubs and the scratch database are ever talked to
+    os.environ["TELEGRAM_BOT_TOKEN"] = "1000000:bench"
+    use_scratch_database(args.database_url)
+    from app.services.wallet_keys import generate_wallet
+    backend_wallet = generate_wallet()
+    os.environ["BACKEND_WALLET_ADDRESS"] = backend_wallet["address"]
+    os.environ["BACKEND_WALLET_PRIVATE_KEY"] = backend_wallet["privateKey"]
+    os.environ["NFT_CONTRACT_ADDRESS"] = NFT_CONTRACT
+    logging.disable(logging.INFO)  # The bot logs every callback at INFO
+
+    metrics = asyncio.run(run(args))
+    params = {key: value for key, value in vars(args).items() if key not in ("database_url", "results")}
+    params["database"] = "sqlite" if not args.database_url else args.database_url.split(":", 1)[0]
+
+    print(f"\n{metrics['updates']} updates in {metrics['elapsed_s']}s: {metrics['updates_per_s']} updates/s")
+    print(f"Handler latency   p50 {metrics['handler_p50_ms']}ms  p99 {metrics['handler_p99_ms']}ms")
+    print(f"Response latency  p50 {metrics['response_p50_ms']}ms  p99 {metrics['response_p99_ms']}ms (incl. queueing)")
+    print(f"DB statements per update: {metrics['db_statements_per_update']}")
+    print("\nBy update type:")
+    for label, summary in metrics["by_update"].items():
+        print(f"  {label:<24} n={summary['count']:<6} p50 {summary['p50_ms']:>8}ms  p99 {summary['p99_ms']:>8}ms")
+
+    previous = record_result("bot_throughput", params, metrics, args.results)
+    print_comparison(metrics, previous, [
+        "updates_per_s", "handler_p50_ms", "handler_p99_ms", "response_p99_ms", "db_statements_per_update"
+    ])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Shared setup and reporting for the benchmarks in this directory.
+
+Benchmarks run against a scratch database, never DATABASE_URL from .env:
+use_scratch_database() must be called before anything from `app` is
+imported, because settings and engines are created at import time.
+"""
+import asyncio
+import itertools
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Sequence
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "bench", "results")
+
+if BACKEND_DIR not in sys.path:
+    sys.path.append(BACKEND_DIR)
+
+
+def use_scratch_database(url: Optional[str] = None) -> str:
+    """Point the app at `url`, or a fresh SQLite file, and apply migrations."""
+    if url is None:
+        url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+    os.environ["DATABASE_URL"] = url
+
+    from app.db.migrations import upgrade
+    upgrade()
+    return url
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    """Count and p50/p90/p99/max of `samples` (seconds), reported in milliseconds."""
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p90_ms": round(percentile(samples, 90) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "max_ms": round(max(samples, default=0.0) * 1000, 2),
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def record_result(name: str, params: dict, metrics: dict, path: Optional[str] = None) -> Optional[dict]:
+    """Append a run to results/<name>.jsonl; returns the previous run with the same params."""
+    path = path or os.path.join(RESULTS_DIR, f"{name}.jsonl")
+    previous = None
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                run = json.loads(line)
+                if run.get("params") == params:
+                    previous = run
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    run = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": git_revision(),
+        "params": params,
+        "metrics": metrics,
+    }
+    with open(path, "a") as f:
+        f.write(json.dumps(run) + "\n")
+    return previous
+
+
+def print_comparison(metrics: Dict[str, float], previous: Optional[dict], keys: Sequence[str]):
+    """Print `keys` of `metrics` next to the previous run's values."""
+    if previous is None:
+        print("\nNo previous run with these parameters to compare against.")
+        return
+    print(f"\nCompared with {previous['time']} ({previous.get('revision') or 'unknown revision'}):")
+    for key in keys:
+        old, new = previous["metrics"].get(key), metrics.get(key)
+        if not old or new is None:
+            continue
+        print(f"  {key:<28} {old:>10} -> {new:<10} ({(new - old) / old * 100:+.1f}%)")
+
+
+BOT_USER = {"id": 1000000, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+
+class FakeTelegram:
+    """Answers Bot API calls in-process after `latency` seconds."""
+
+    def __init__(self, latency: float):
+        from telegram.request import BaseRequest
+
+        fake = self
+
+        class Request(BaseRequest):
+            @property
+            def read_timeout(self):
+                return None
+
+            async def initialize(self):
+                pass
+
+            async def shutdown(self):
+                pass
+
+            async def do_request(self, url, method, request_data=None, **kwargs):
+                return await fake.answer(url.rsplit("/", 1)[-1], request_data.parameters if request_data else {})
+
+        self.latency = latency
+        self.request = Request()
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(1)
+
+    async def answer(self, api_method: str, params: dict):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.calls[api_method] += 1
+        result = True
+        if api_method == "getMe":
+            result = BOT_USER
+        elif api_method in ("sendMessage", "editMessageText"):
+            result = {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": int(params["chat_id"]), "type": "private"},
+                "from": BOT_USER,
+                "text": params.get("text", ""),
+            }
+        return 200, json.dumps({"ok": True, "result": result}).encode()
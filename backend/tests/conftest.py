@@ -0,0 +1,28 @@
+"""Tests run against a scratch database and the in-process fake Bot API.
+
+    pip install -r requirements-dev.txt
+    python -m pytest tests
+
+The database is a fresh SQLite file unless TEST_DATABASE_URL names another,
+e.g. an empty PostgreSQL database on a locally started server:
+
+    createdb hackathon_test
+    TEST_DATABASE_URL=postgresql://localhost/hackathon_test python -m pytest tests
+
+Settings and engines are created at import time, so the environment is set
+up here, before any test module imports `app`.
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.append(BACKEND_DIR)
+
+os.environ["TELEGRAM_BOT_TOKEN"] = "123456:test-token"
+os.environ["TELEGRAM_WEBHOOK_URL"] = "https://bot.example.com"
+os.environ["TELEGRAM_WEBHOOK_SECRET"] = "test-secret"
+
+from bench.common import use_scratch_database  # noqa: E402
+
+use_scratch_database(os.environ.get("TEST_DATABASE_URL"))
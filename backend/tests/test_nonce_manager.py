@@ -0,0 +1,127 @@
+"""Nonce allocation for the backend wallet, against a fake account."""
+import asyncio
+from typing import List
+
+from app.services.backend_wallet import BackendWalletService
+from app.services.nonce_manager import NonceManager
+
+
+class FakeAccount:
+    """Transaction counts of one account; `pending` follows what was broadcast."""
+
+    def __init__(self, mined: int = 0):
+        self.mined = mined
+        self.pending = mined
+        self.lookups = 0
+        self.gap_fills: List[int] = []
+
+    async def get_nonce(self, block_tag: str) -> int:
+        self.lookups += 1
+        return self.pending if block_tag == "pending" else self.mined
+
+    async def fill_gap(self, nonce: int) -> str:
+        self.gap_fills.append(nonce)
+        return f"0xgap{nonce}"
+
+
+def manager(account: FakeAccount) -> NonceManager:
+    return NonceManager("0x" + "11" * 20, account.get_nonce, account.fill_gap, check_interval=3600, stuck_after=3600)
+
+
+def run(nonces: NonceManager, coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await nonces.close()
+    return asyncio.run(main())
+
+
+def test_concurrent_allocations_are_consecutive():
+    account = FakeAccount(mined=7)
+    nonces = manager(account)
+
+    async def scenario():
+        return await asyncio.gather(*(nonces.allocate() for _ in range(10)))
+
+    allocated = run(nonces, scenario())
+    assert sorted(allocated) == list(range(7, 17))
+    assert account.lookups == 1
+
+
+def test_released_nonce_is_reused_first():
+    nonces = manager(FakeAccount())
+
+    async def scenario():
+        first, second, third = [await nonces.allocate() for _ in range(3)]
+        nonces.mark_sent(first)
+        nonces.mark_sent(third)
+        nonces.release(second)
+        return second, await nonces.allocate(), await nonces.allocate()
+
+    released, reused, fresh = run(nonces, scenario())
+    assert reused == released == 1
+    assert fresh == 3
+
+
+def test_maybe_sent_nonce_is_never_reused():
+    account = FakeAccount()
+    nonces = manager(account)
+
+    async def scenario():
+        first = await nonces.allocate()
+        # The node did get it before the call timed out
+        account.pending = 1
+        await nonces.maybe_sent(first)
+        return first, await nonces.allocate(), nonces.stats()
+
+    first, second, stats = run(nonces, scenario())
+    assert (first, second) == (0, 1)
+    assert stats["unmined"] == 1 and stats["resyncs"] == 1
+
+
+def test_released_gap_below_the_chain_is_filled():
+    account = FakeAccount()
+    nonces = manager(account)
+
+    async def scenario():
+        allocated = [await nonces.allocate() for _ in range(3)]
+        nonces.mark_sent(allocated[0])
+        nonces.mark_sent(allocated[2])
+        nonces.release(allocated[1])
+        await nonces.check()
+        return nonces.stats()
+
+    stats = run(nonces, scenario())
+    assert account.gap_fills == [1]
+    assert stats["released"] == 0 and stats["gaps_filled"] == 1
+
+
+def test_send_errors_release_or_keep_the_nonce():
+    account = FakeAccount()
+    nonces = manager(account)
+    service = BackendWalletService()
+    service.get_nonce_manager = lambda: nonces
+    used: List[int] = []
+
+    async def send(nonce: int, error: Exception = None) -> str:
+        used.append(nonce)
+        if error is not None:
+            raise error
+        account.pending = max(account.pending, nonce + 1)
+        return f"0x{nonce}"
+
+    async def attempt(error: Exception = None):
+        try:
+            await service._send_with_nonce(lambda nonce: send(nonce, error))
+        except Exception:
+            pass
+
+    async def scenario():
+        await attempt(ValueError("insufficient funds for gas * price + value"))  # Refused: nonce 0 comes back
+        await attempt()
+        await attempt(asyncio.TimeoutError())  # Maybe broadcast: nonce 1 is kept
+        await attempt()
+
+    run(nonces, scenario())
+    assert used == [0, 0, 1, 2]
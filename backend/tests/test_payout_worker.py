@@ -0,0 +1,180 @@
+"""Payout claiming, lease takeover and sends that may have gone out, against a fake wallet."""
+import asyncio
+from datetime import datetime, timedelta
+from typing import List
+
+from sqlalchemy import delete, select, update
+
+from app.db.async_session import async_engine, unit_of_work
+from app.models.payout import Payout, PayoutBatch, CONFIRMED, FAILED, QUEUED, SUBMITTED
+from app.models.quiz import Quiz, UserQuizCompletion
+from app.models.user import User
+from app.services.payout_worker import PayoutWorker, enqueue_quiz_rewards
+from app.services.wallet_wrapper import ReceiptTimeout
+
+RECIPIENT = "0x" + "ab" * 20
+
+
+class FakeWallet:
+    """Stands in for BackendWalletService; `send_errors` and `receipt_errors` are raised in turn."""
+
+    def __init__(self, send_errors=(), receipt_errors=()):
+        self.wallet_service = self
+        self.send_errors = list(send_errors)
+        self.receipt_errors = list(receipt_errors)
+        self.sends: List[str] = []
+
+    def get_wallet_info(self):
+        return {"address": "0x" + "11" * 20, "private_key": "22" * 32}
+
+    async def sendTransaction(self, private_key, to, amount):
+        self.sends.append(to)
+        if self.send_errors:
+            raise self.send_errors.pop(0)
+        return "0x" + f"{len(self.sends):064x}"
+
+    async def wait_for_receipt(self, tx_hash):
+        if self.receipt_errors:
+            raise self.receipt_errors.pop(0)
+        return {"status": "success", "blockNumber": "1", "logs": []}
+
+
+def worker(wallet: FakeWallet = None) -> PayoutWorker:
+    async def notify(payout):
+        pass
+    payout_worker = PayoutWorker(notify, concurrency=1, max_attempts=3, retry_base_delay=0,
+                                 poll_interval=1, lease_time=60)
+    payout_worker.wallet_service = wallet or FakeWallet()
+    return payout_worker
+
+
+async def clear_payouts():
+    async with unit_of_work() as db:
+        await db.execute(delete(Payout))
+        await db.execute(delete(PayoutBatch))
+        await db.commit()
+
+
+def run(coro):
+    """Run a scenario on an empty outbox; leftovers would be paid by the bot in later tests."""
+    async def main():
+        try:
+            await clear_payouts()
+            return await coro
+        finally:
+            await clear_payouts()
+            await async_engine.dispose()
+    return asyncio.run(main())
+
+
+async def enqueue(count: int):
+    async with unit_of_work() as db:
+        user = User(telegram_id=int(datetime.utcnow().timestamp() * 1e6), username="payee")
+        quiz = Quiz(name="Payout test", reward_amount="0", eth_reward_amount="0.001")
+        db.add_all([user, quiz])
+        await db.flush()
+        for _ in range(count):
+            completion = UserQuizCompletion(user_id=user.id, quiz_id=quiz.id, score=3, passed=True)
+            db.add(completion)
+            await db.flush()
+            enqueue_quiz_rewards(db, completion.id, user.telegram_id, RECIPIENT, "0.001")
+        await db.commit()
+
+
+async def lapse_leases():
+    """Make every submitted payout look as if its worker died."""
+    async with unit_of_work() as db:
+        await db.execute(
+            update(Payout).where(Payout.status == SUBMITTED)
+            .values(claimed_until=datetime.utcnow() - timedelta(seconds=1))
+        )
+        await db.commit()
+
+
+async def payout_rows():
+    async with unit_of_work() as db:
+        return (await db.execute(select(Payout).order_by(Payout.id))).scalars().all()
+
+
+def test_concurrent_claims_never_share_a_payout():
+    async def claim_all(payout_worker: PayoutWorker) -> List[int]:
+        claimed = []
+        while (payout := await payout_worker._claim()) is not None:
+            claimed.append(payout.id)
+        return claimed
+
+    async def scenario():
+        await enqueue(20)
+        return await asyncio.gather(*(claim_all(worker()) for _ in range(5)))
+
+    claims = run(scenario())
+    claimed = [payout_id for ids in claims for payout_id in ids]
+    assert len(claimed) == len(set(claimed)) == 20
+
+
+def test_lapsed_lease_resumes_at_the_receipt():
+    async def scenario():
+        await enqueue(2)
+        wallet = FakeWallet()
+        dead, alive = worker(wallet), worker(wallet)
+        # The first payout's worker dies after recording the hash, the second's before
+        sent, unsent = await dead._claim(), await dead._claim()
+        await dead._record_tx_hash(sent, await wallet.sendTransaction(None, RECIPIENT, sent.amount))
+
+        before = await alive._claim()
+        await lapse_leases()
+        await alive._recover()
+        resumed = await alive._claim()
+        await alive._process(resumed)
+        return before, resumed.id, sent.id, unsent.id, wallet.sends, await payout_rows()
+
+    before, resumed_id, sent_id, unsent_id, sends, rows = run(scenario())
+    rows = {row.id: row for row in rows}
+    assert before is None
+    assert resumed_id == sent_id and len(sends) == 1
+    assert rows[sent_id].status == CONFIRMED and rows[sent_id].attempts == 2
+    # No hash was recorded, so it may or may not have gone out: never sent again
+    assert rows[unsent_id].status == FAILED and rows[unsent_id].tx_hash is None
+
+
+def test_timed_out_send_is_never_retried():
+    async def scenario():
+        await enqueue(1)
+        wallet = FakeWallet(send_errors=[asyncio.TimeoutError()])
+        payout_worker = worker(wallet)
+        await payout_worker._process(await payout_worker._claim())
+        await lapse_leases()
+        return await payout_worker._claim(), wallet.sends, await payout_rows()
+
+    again, sends, [row] = run(scenario())
+    assert again is None and len(sends) == 1
+    assert row.status == FAILED and "May have been broadcast" in row.last_error
+
+
+def test_receipt_timeout_keeps_polling_without_resending():
+    async def scenario():
+        await enqueue(1)
+        wallet = FakeWallet(receipt_errors=[ReceiptTimeout("not mined yet")])
+        payout_worker = worker(wallet)
+        await payout_worker._process(await payout_worker._claim())
+        waiting = await payout_rows()
+        await lapse_leases()
+        await payout_worker._process(await payout_worker._claim())
+        return waiting, wallet.sends, await payout_rows()
+
+    [waiting], sends, [row] = run(scenario())
+    assert waiting.status == SUBMITTED and waiting.tx_hash
+    assert len(sends) == 1
+    assert row.status == CONFIRMED and row.tx_hash == waiting.tx_hash
+
+
+def test_refused_send_is_queued_again():
+    async def scenario():
+        await enqueue(1)
+        wallet = FakeWallet(send_errors=[ValueError("insufficient funds for gas * price + value")])
+        payout_worker = worker(wallet)
+        await payout_worker._process(await payout_worker._claim())
+        return await payout_rows()
+
+    [row] = run(scenario())
+    assert row.status == QUEUED and row.tx_hash is None and row.claimed_by is None
@@ -0,0 +1,112 @@
+"""Job claiming and lease takeover, with schedulers driven by hand rather than started."""
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select, update
+
+from app.db.async_session import async_engine, unit_of_work
+from app.models.scheduled_job import ScheduledJob, FAILED, QUEUED, RUNNING
+from app.services.scheduler import JobScheduler, RetryPolicy, enqueue_job
+
+
+def scheduler() -> JobScheduler:
+    return JobScheduler({}, concurrency=10, lease_time=60, poll_interval=1, drain_timeout=1)
+
+
+async def clear_jobs():
+    async with unit_of_work() as db:
+        await db.execute(delete(ScheduledJob))
+        await db.commit()
+
+
+def run(coro):
+    """Run a scenario on an empty job table; leftovers would be run by the bot in later tests."""
+    async def main():
+        try:
+            await clear_jobs()
+            return await coro
+        finally:
+            await clear_jobs()
+            await async_engine.dispose()
+    return asyncio.run(main())
+
+
+async def enqueue(count: int, retry: RetryPolicy = RetryPolicy()):
+    async with unit_of_work() as db:
+        for i in range(count):
+            enqueue_job(db, "test", {"i": i}, retry=retry)
+        await db.commit()
+
+
+async def lapse_leases():
+    """Make every running job look as if its worker died."""
+    async with unit_of_work() as db:
+        await db.execute(
+            update(ScheduledJob).where(ScheduledJob.status == RUNNING)
+            .values(lease_expires_at=datetime.utcnow() - timedelta(seconds=1))
+        )
+        await db.commit()
+
+
+async def job_rows():
+    async with unit_of_work() as db:
+        return (await db.execute(select(ScheduledJob).order_by(ScheduledJob.id))).scalars().all()
+
+
+def test_concurrent_claims_never_share_a_job():
+    async def scenario():
+        await enqueue(30)
+        # One claim at a time per scheduler, as its _run loop does; six processes at once
+        claims = await asyncio.gather(*(scheduler()._claim(10) for _ in range(6)))
+        return [[job.id for job in jobs] for jobs in claims], await job_rows()
+
+    claims, rows = run(scenario())
+    claimed = [job_id for jobs in claims for job_id in jobs]
+    assert len(claimed) == len(set(claimed)) == 30
+    assert all(row.status == RUNNING and row.attempts == 1 for row in rows)
+
+
+def test_lapsed_lease_is_taken_over():
+    async def scenario():
+        await enqueue(1)
+        dead, alive = scheduler(), scheduler()
+        [job] = await dead._claim(1)
+        before = await alive._claim(1)
+        await lapse_leases()
+        after = await alive._claim(1)
+        # The old worker's late result must not overwrite the new attempt
+        await dead._fail(job, "late")
+        return before, after, await job_rows(), alive.owner
+
+    before, after, [row], owner = run(scenario())
+    assert before == []
+    assert [job.id for job in after] == [row.id]
+    assert row.status == RUNNING and row.lease_owner == owner
+    assert row.attempts == 2 and row.last_error is None
+
+
+def test_job_that_keeps_killing_its_worker_fails():
+    async def scenario():
+        await enqueue(1, RetryPolicy(max_attempts=2))
+        claims = []
+        for _ in range(3):
+            claims.append(len(await scheduler()._claim(1)))
+            await lapse_leases()
+        return claims, await job_rows()
+
+    claims, [row] = run(scenario())
+    assert claims == [1, 1, 0]
+    assert row.status == FAILED and row.attempts == 2
+    assert row.lease_owner is None
+
+
+def test_released_job_does_not_use_up_an_attempt():
+    async def scenario():
+        await enqueue(1, RetryPolicy(max_attempts=1))
+        worker = scheduler()
+        [job] = await worker._claim(1)
+        await worker._release(job)
+        return await job_rows()
+
+    [row] = run(scenario())
+    assert row.status == QUEUED and row.attempts == 0
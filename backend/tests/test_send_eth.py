@@ -0,0 +1,76 @@
+"""The send ETH flow's recipient buttons, processed by the Application against FakeTelegram."""
+import asyncio
+import time
+
+from sqlalchemy import delete
+from telegram import Update
+
+from app.bot.bot import create_application
+from app.db.async_session import async_engine, unit_of_work
+from app.models.user import User
+from bench.common import BOT_USER, FakeTelegram
+
+SENDER = {"id": 7001, "is_bot": False, "first_name": "Sender", "username": "sender"}
+
+
+class RecordingTelegram(FakeTelegram):
+    def __init__(self):
+        super().__init__(latency=0)
+        self.texts = []
+
+    async def answer(self, api_method: str, params: dict):
+        if api_method == "sendMessage":
+            self.texts.append(params["text"])
+        return await super().answer(api_method, params)
+
+
+def button_update(update_id: int, data: str) -> dict:
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": str(update_id),
+            "from": SENDER,
+            "chat_instance": "1",
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": SENDER["id"], "type": "private"},
+                "from": BOT_USER,
+                "text": "Select a user to send ETH to, or type a username to search:",
+            },
+        },
+    }
+
+
+def test_stale_recipient_button_shows_the_picker_again():
+    telegram = RecordingTelegram()
+
+    async def run():
+        async with unit_of_work() as db:
+            await db.execute(delete(User).where(User.telegram_id.in_([7001, 7002, 7003])))
+            no_kyc = User(telegram_id=7002, username="pending", kyc=False)
+            ready = User(telegram_id=7003, username="ready", kyc=True, wallet_address="0x" + "cd" * 20)
+            db.add_all([User(telegram_id=7001, username="sender", kyc=True), no_kyc, ready])
+            await db.commit()
+
+        application = create_application(request=telegram.request)
+        await application.initialize()
+        try:
+            for update_id, user_id in enumerate([10 ** 9, no_kyc.id, ready.id], 1):
+                update = Update.de_json(button_update(update_id, f"select_user_{user_id}"), application.bot)
+                await application.process_update(update)
+            return ready.id, application.user_data[SENDER["id"]].get("recipient_id")
+        finally:
+            await application.shutdown()
+            async with unit_of_work() as db:
+                await db.execute(delete(User).where(User.telegram_id.in_([7001, 7002, 7003])))
+                await db.commit()
+            await async_engine.dispose()
+
+    ready_id, recipient_id = asyncio.run(run())
+    deleted, not_verified, picked = telegram.texts
+    assert deleted.startswith("That user can no longer receive ETH.")
+    assert not_verified.startswith("That user can no longer receive ETH.")
+    assert picked.startswith("How much ETH would you like to send to @ready?")
+    assert recipient_id == ready_id
@@ -0,0 +1,52 @@
+"""Cross-process invalidation of the user profile cache through its change log."""
+import asyncio
+from datetime import timedelta
+
+from sqlalchemy import delete, func, select
+
+from app.db.async_session import async_engine, unit_of_work
+from app.models.user import User, UserCacheInvalidation
+from app.services.user_cache import UserProfileCache
+
+
+async def log_change(telegram_id: int, invalidation_id: int, age: timedelta = timedelta(0)):
+    """Insert a log row as another process would, with an explicit id and backdated created_at."""
+    async with unit_of_work() as db:
+        now = (await db.execute(select(func.now()))).scalar()
+        db.add(UserCacheInvalidation(id=invalidation_id, telegram_id=telegram_id, created_at=now - age))
+        await db.commit()
+
+
+def test_invalidation_committed_out_of_id_order_is_applied():
+    async def run():
+        async with unit_of_work() as db:
+            await db.execute(delete(UserCacheInvalidation))
+            await db.execute(delete(User).where(User.telegram_id.in_([9101, 9102])))
+            db.add_all([User(telegram_id=9101, username="a"), User(telegram_id=9102, username="b")])
+            await db.commit()
+
+        cache = UserProfileCache(max_size=100, ttl=300, poll_interval=0)
+        await cache.get(9101)  # First poll only records where the log ends
+        await cache.get(9102)
+
+        # Row 20 commits first; row 10 was allocated earlier by a slower transaction
+        await log_change(9101, 20)
+        await cache.get(9101)
+        first = cache.invalidations
+        await log_change(9102, 10, age=timedelta(seconds=5))
+        await cache.get(9101)
+        second = cache.invalidations
+        await cache.get(9101)
+        again = cache.invalidations
+        return first, second, again
+
+    async def main():
+        try:
+            return await run()
+        finally:
+            await async_engine.dispose()
+
+    first, second, again = asyncio.run(main())
+    assert first == 1
+    assert second == 2, "the late row with the lower id must still invalidate"
+    assert again == 2, "rows already applied are not applied again"
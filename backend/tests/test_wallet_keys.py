@@ -0,0 +1,33 @@
+"""HD derivation checked against published BIP-32, BIP-39 and BIP-44 vectors."""
+from app.services.wallet_keys import HDWallet, address_from_private_key, seed_from_mnemonic
+
+ABANDON = " ".join(["abandon"] * 11 + ["about"])
+
+
+def test_bip39_seed():
+    # BIP-39 reference vectors (trezor/python-mnemonic vectors.json), passphrase "TREZOR"
+    assert seed_from_mnemonic(ABANDON, "TREZOR").hex() == (
+        "c55257c360c07c72029aebc1b53c05ed0362ada38ead3e3e9efa3708e53495531f"
+        "09a6987599d18264c1e1c92f2cf141630c7a3c4ab7c81b2f001698e7463b04"
+    )
+
+
+def test_bip32_test_vector_1():
+    # BIP-32 test vector 1, chain m/0'/1/2'/2/1000000000
+    wallet = HDWallet(bytes.fromhex("000102030405060708090a0b0c0d0e0f"), "m/0'/1/2'/2")
+    assert wallet.derive(1000000000)["privateKey"] == (
+        "471b76e389e528d6de6d816857e012c5455051cad6660850e58372a6c3e6e7c8"
+    )
+
+
+def test_bip44_ethereum_addresses():
+    # m/44'/60'/0'/0/0 as derived by MetaMask, ethers and Hardhat for these mnemonics
+    assert HDWallet(seed_from_mnemonic(ABANDON)).derive(0)["address"] == (
+        "0x9858EfFD232B4033E47d90003D41EC34EcaEda94"
+    )
+    hardhat = HDWallet(seed_from_mnemonic(" ".join(["test"] * 11 + ["junk"])))
+    first, second = hardhat.derive_many([0, 1])
+    assert first["address"] == "0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266"
+    assert first["privateKey"] == "ac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"
+    assert second["address"] == "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+    assert address_from_private_key(bytes.fromhex(first["privateKey"])) == first["address"]
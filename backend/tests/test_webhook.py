@@ -0,0 +1,133 @@
+"""The webhook endpoint, driven over ASGI with Telegram replaced by FakeTelegram."""
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from app.api.v1 import telegram
+from app.bot import webhook
+from app.bot.bot import create_application
+from bench.common import FakeTelegram
+
+SECRET = {"X-Telegram-Bot-Api-Secret-Token": "test-secret"}
+
+
+def message_update(update_id: int, text: str = "/start") -> dict:
+    user = {"id": 5000 + update_id, "is_bot": False, "first_name": "Test", "username": f"user{update_id}"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user["id"], "type": "private"},
+            "from": user,
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len(text)}] if text.startswith("/") else [],
+        },
+    }
+
+
+async def post(ingress: webhook.WebhookIngress, body, headers=SECRET) -> httpx.Response:
+    api = FastAPI()
+    api.include_router(telegram.router, prefix="/api/v1/telegram")
+    webhook._ingress = ingress
+    try:
+        transport = httpx.ASGITransport(app=api)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(webhook.WEBHOOK_PATH, json=body, headers=headers)
+    finally:
+        webhook._ingress = None
+
+
+def unstarted_ingress(queue_size: int) -> webhook.WebhookIngress:
+    """An ingress whose Application is built but not draining the queue."""
+    ingress = webhook.WebhookIngress(queue_size, request=FakeTelegram(latency=0).request)
+    ingress.application = create_application(update_queue=ingress.queue, request=ingress.request)
+    return ingress
+
+
+def test_secret_token_is_required():
+    async def run():
+        ingress = unstarted_ingress(10)
+        missing = await post(ingress, message_update(1), headers={})
+        wrong = await post(ingress, message_update(2), headers={"X-Telegram-Bot-Api-Secret-Token": "nope"})
+        right = await post(ingress, message_update(3))
+        return ingress, missing, wrong, right
+
+    ingress, missing, wrong, right = asyncio.run(run())
+    assert missing.status_code == 403
+    assert wrong.status_code == 403
+    assert right.status_code == 200
+    assert ingress.queue.qsize() == 1
+    assert ingress.queue.get_nowait().update_id == 3
+
+
+def test_no_secret_configured_refuses_everything(monkeypatch):
+    from app.config import get_settings
+
+    monkeypatch.setattr(get_settings(), "TELEGRAM_WEBHOOK_SECRET", None)
+
+    async def run():
+        ingress = unstarted_ingress(10)
+        with_header = await post(ingress, message_update(1))
+        without_header = await post(ingress, message_update(2), headers={})
+        try:
+            await webhook.WebhookIngress(10, request=FakeTelegram(latency=0).request).start()
+        except ValueError as e:
+            start_error = e
+        else:
+            start_error = None
+        return ingress, with_header, without_header, start_error
+
+    ingress, with_header, without_header, start_error = asyncio.run(run())
+    assert with_header.status_code == 403
+    assert without_header.status_code == 403
+    assert ingress.queue.empty()
+    assert "TELEGRAM_WEBHOOK_SECRET" in str(start_error)
+
+
+def test_full_queue_asks_telegram_to_retry():
+    async def run():
+        ingress = unstarted_ingress(2)
+        return ingress, [await post(ingress, message_update(i)) for i in range(1, 4)]
+
+    ingress, responses = asyncio.run(run())
+    assert [r.status_code for r in responses] == [200, 200, 503]
+    assert responses[2].headers["Retry-After"] == "1"
+    assert ingress.stats()["accepted"] == 2
+    assert ingress.stats()["rejected"] == 1
+
+
+def test_malformed_update_is_acknowledged_and_dropped():
+    async def run():
+        ingress = unstarted_ingress(10)
+        return ingress, [await post(ingress, body) for body in ({"message": {}}, [1, 2], "text")]
+
+    ingress, responses = asyncio.run(run())
+    assert [r.status_code for r in responses] == [200, 200, 200]
+    assert ingress.queue.empty()
+    assert ingress.stats()["invalid"] == 3
+
+
+def test_update_reaches_the_application():
+    fake = FakeTelegram(latency=0)
+
+    async def run():
+        ingress = webhook.WebhookIngress(10, request=fake.request)
+        await ingress.start()
+        try:
+            response = await post(ingress, message_update(1))
+            # /start replies with the menu through the fake Bot API
+            for _ in range(200):
+                if fake.calls["sendMessage"]:
+                    break
+                await asyncio.sleep(0.025)
+        finally:
+            await ingress.stop()
+        return response
+
+    response = asyncio.run(run())
+    assert response.status_code == 200
+    assert fake.calls["setWebhook"] == 1
+    assert fake.calls["sendMessage"] == 1
@@ -0,0 +1,9 @@
+"""Apply pending database migrations (see backend/app/db/migrations.py)."""
+import logging
+
+from backend.app.db.migrations import upgrade, LATEST_VERSION
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    version = upgrade()
+    print(f"Database schema is at version {version} (latest {LATEST_VERSION})")